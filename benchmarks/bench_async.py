@@ -0,0 +1,70 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Benchmark of concurrent queries from threads and from coroutines
+
+Runs the same number of ``SELECT SLEEP()`` queries one after another, on
+a bounded thread pool with ``query_parallel`` and from asyncio coroutines
+with ``query_async``, and shows the time taken and the number of threads
+running at the end.
+
+Usage: bin/zopepy benchmarks/bench_async.py "connection string" \\
+           [number of queries] [seconds per query]
+"""
+import asyncio
+import sys
+import threading
+import time
+
+from Products.ZMySQLDA.db import DB
+from Products.ZMySQLDA.db import DBPool
+
+
+def sequential(pool, queries):
+    for sql in queries:
+        pool.query(sql)
+
+
+def threaded(pool, queries):
+    results, errors = pool.query_parallel(queries)
+    if errors:
+        raise next(iter(errors.values()))
+
+
+def coroutines(pool, queries):
+    async def main():
+        await asyncio.gather(*[pool.query_async(sql) for sql in queries])
+    asyncio.run(main())
+
+
+def main(connection, count=50, seconds=0.1):
+    count = int(count)
+    queries = ['SELECT SLEEP(%s)' % seconds] * count
+    runs = (('one after another', sequential, None),
+            ('query_parallel, 4 threads', threaded, 4),
+            (f'query_parallel, {count} threads', threaded, count),
+            ('query_async', coroutines, None))
+    print(f'{count} queries of {seconds}s:')
+    for label, run, workers in runs:
+        pool = DBPool(DB, parallel_queries=workers)(connection)
+        # Open the connections first, so only the queries are measured
+        run(pool, queries)
+        started = time.perf_counter()
+        run(pool, queries)
+        elapsed = time.perf_counter() - started
+        print(f'  {label:30} {elapsed:8.3f}s '
+              f'{threading.active_count():4d} threads')
+        pool.close()
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
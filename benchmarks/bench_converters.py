@@ -0,0 +1,64 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Micro-benchmark for the DATE and DATETIME converters
+
+Usage: bin/zopepy benchmarks/bench_converters.py [number of values]
+"""
+import sys
+import time
+from datetime import datetime
+from datetime import timedelta
+
+from Products.ZMySQLDA.converters import DateTime_or_None
+from Products.ZMySQLDA.converters import datetime_or_None
+from Products.ZMySQLDA.converters import fast_DateTime_or_None
+
+
+def make_values(count, distinct):
+    """ Return ``count`` DATETIME strings with ``distinct`` different
+    values, formatted like the server sends them.
+    """
+    start = datetime(2024, 1, 1)
+    return [(start + timedelta(seconds=7919 * (i % distinct))).strftime(
+        '%Y-%m-%d %H:%M:%S') for i in range(count)]
+
+
+def run(converter, values):
+    """ Return the time in seconds for converting all ``values``.
+    """
+    if hasattr(converter, 'cache_clear'):
+        converter.cache_clear()
+    started = time.perf_counter()
+    for value in values:
+        converter(value)
+    return time.perf_counter() - started
+
+
+def main(count=100000):
+    converters = (('DateTime_or_None', DateTime_or_None),
+                  ('fast_DateTime_or_None', fast_DateTime_or_None),
+                  ('datetime_or_None', datetime_or_None))
+    for label, distinct in (('distinct values', count),
+                            ('100 repeated values', 100)):
+        values = make_values(count, distinct)
+        print(f'{count} {label}:')
+        baseline = None
+        for name, converter in converters:
+            elapsed = run(converter, values)
+            baseline = baseline or elapsed
+            print(f'  {name:24} {elapsed:8.3f}s '
+                  f'{baseline / elapsed:6.1f}x')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -27,6 +27,7 @@ from Shared.DC.ZRDB.Connection import Connection as ConnectionBase
 from .db import DB
 from .db import DBPool
 from .permissions import add_zmysql_database_connections
+from .sharding import ShardedPool
 from .utils import TableBrowser
 from .utils import table_icons
 
@@ -41,6 +42,8 @@ database_connection_pool = {}
 # pool_id -> DA -> DBPool -> thread id -> DB
 # dc_pool[pool_id] == DBPool_instance
 # DBPool_instance[thread id] == DB instance
+# With a maximum pool size set, the DBPool instead holds at most that many
+# DB instances which threads check out for the duration of a transaction.
 
 
 class Connection(ConnectionBase):
@@ -54,6 +57,27 @@ class Connection(ConnectionBase):
     use_unicode = False
     charset = None
     timeout = None
+    pool_min_size = None
+    pool_max_size = None
+    pool_timeout = None
+    idle_timeout = None
+    max_lifetime = None
+    pool_warmup = None
+    ping_interval = None
+    result_cache_ttl = None
+    result_cache_size = None
+    schema_cache_ttl = None
+    date_conversion = None
+    conv_profile = None
+    lazy_rows = False
+    batch_queries = False
+    local_infile = False
+    slow_query_time = None
+    explain_slow_queries = False
+    replica_strategy = None
+    replica_max_lag = None
+    parallel_queries = None
+    sharded = False
     _v_connected = ''
     _isAnSQLConnection = 1
     info = None
@@ -62,6 +86,10 @@ class Connection(ConnectionBase):
                               'manage_browse')
     manage_browse = HTMLFile('www/browse', globals())
 
+    security.declareProtected(view_management_screens,  # NOQA: D001
+                              'manage_statistics')
+    manage_statistics = HTMLFile('www/statistics', globals())
+
     security.declareProtected(change_database_methods,  # NOQA: D001
                               'manage_properties')
     manage_properties = HTMLFile('www/connectionEdit', globals())
@@ -69,10 +97,20 @@ class Connection(ConnectionBase):
     manage_main = manage_properties
 
     manage_options = (ConnectionBase.manage_options[1:] +
-                      ({'label': 'Browse', 'action': 'manage_browse'},))
+                      ({'label': 'Browse', 'action': 'manage_browse'},
+                       {'label': 'Statistics',
+                        'action': 'manage_statistics'}))
 
     def __init__(self, id, title, connection_string, check, use_unicode=None,
-                 charset=None, auto_create_db=None, timeout=None):
+                 charset=None, auto_create_db=None, timeout=None,
+                 pool_min_size=None, pool_max_size=None, pool_timeout=None,
+                 idle_timeout=None, max_lifetime=None, pool_warmup=None,
+                 ping_interval=None, result_cache_ttl=None,
+                 result_cache_size=None, schema_cache_ttl=None,
+                 date_conversion=None, conv_profile=None, lazy_rows=None,
+                 batch_queries=None, local_infile=None, slow_query_time=None,
+                 explain_slow_queries=None, replica_strategy=None,
+                 replica_max_lag=None, parallel_queries=None):
         """ Instance setup. Optionally opens the connection.
 
         :string: id -- The id of the ZMySQLDA Connection
@@ -105,13 +143,159 @@ class Connection(ConnectionBase):
                                  Default: False.
         :int: timeout -- The connect timeout for the connection in seconds.
                                  Default: None
+
+        :int: pool_min_size -- Number of idle connections kept open in the
+                               shared connection pool. Default: None, which
+                               means the same as ``pool_max_size``.
+
+        :int: pool_max_size -- Maximum number of connections shared by all
+                               threads. Default: None, which means one
+                               connection per thread.
+
+        :float: pool_timeout -- Maximum time in seconds to wait for a
+                                connection if the shared pool is exhausted.
+                                Default: None, which means wait forever.
+
+        :float: idle_timeout -- Connections unused for longer than this many
+                                seconds are closed or reconnected before
+                                their next use. Set it below the server's
+                                ``wait_timeout``. Default: None
+
+        :float: max_lifetime -- Connections older than this many seconds
+                                are recycled. Default: None
+
+        :int: pool_warmup -- Number of connections opened in advance when
+                             the database connection is opened, so the first
+                             requests find ready connections. Default: None
+
+        :float: ping_interval -- Only check a connection with a ping when a
+                                 transaction begins if it has been idle for
+                                 longer than this many seconds or its last
+                                 query failed. Default: None, which means
+                                 ping every time.
+
+        :float: result_cache_ttl -- Cache ``SELECT`` results for this many
+                                    seconds. Writes through this connection
+                                    invalidate the results of the tables
+                                    they change. Default: None, which means
+                                    no caching.
+
+        :float: result_cache_size -- Memory limit of the result cache in
+                                     megabytes. Default: None, which means
+                                     16 megabytes.
+
+        :float: schema_cache_ttl -- Cache table and column metadata for the
+                                    Browse tab and introspection for this
+                                    many seconds, or until the creation or
+                                    update time of a table changes.
+                                    Default: None, which means no caching.
+
+        :string: date_conversion -- How DATE and DATETIME values are
+                                    converted: ``fast`` returns the same
+                                    ``DateTime`` objects as the default
+                                    ``legacy`` parser in less time,
+                                    ``native`` returns Python ``date`` and
+                                    ``datetime`` objects. Default: None,
+                                    which means the conversion of the
+                                    ``conv_profile``.
+
+        :string: conv_profile -- The conversion of result values:
+                                 ``legacy`` returns floats for DECIMAL
+                                 and ``DateTime`` objects for dates,
+                                 ``native`` returns the ``MySQLdb``
+                                 defaults like ``Decimal`` and
+                                 ``datetime``, ``decimal`` is ``legacy``
+                                 with exact ``Decimal`` values and
+                                 ``raw`` skips all conversions.
+                                 Default: None, which means ``legacy``.
+
+        :bool: lazy_rows -- Convert result values when they are first
+                            accessed instead of when the rows are read.
+                            Default: False.
+
+        :bool: batch_queries -- Send all statements of a query to the
+                                server in one round trip instead of one
+                                at a time. Default: False.
+
+        :bool: local_infile -- Allow ``LOAD DATA LOCAL INFILE`` statements
+                               as used by ``load_data``. The server must
+                               allow them as well. Default: False.
+
+        :float: slow_query_time -- Log queries taking this many seconds or
+                                   longer and keep the most recent ones
+                                   for the Statistics tab. Default: None,
+                                   which means no slow query log.
+
+        :bool: explain_slow_queries -- Store the ``EXPLAIN`` output of the
+                                       statements of slow queries with
+                                       them. Default: False.
+
+        :string: replica_strategy -- How the read replicas listed in the
+                                     connection string are chosen:
+                                     ``round_robin`` in turn by weight,
+                                     ``least_outstanding`` by the fewest
+                                     reads in progress. Default: None,
+                                     which means ``round_robin``.
+
+        :float: replica_max_lag -- Take replicas lagging more than this
+                                   many seconds behind the primary out of
+                                   rotation. Default: None, which means
+                                   only replicas that are down or not
+                                   replicating are.
+
+        :int: parallel_queries -- Maximum number of queries run at once by
+                                  ``query_parallel``. Default: None,
+                                  which means 4.
         """
         self.use_unicode = bool(use_unicode)
         self.charset = charset
+        self.date_conversion = date_conversion or None
+        self.conv_profile = conv_profile or None
+        self.lazy_rows = bool(lazy_rows)
+        self.batch_queries = bool(batch_queries)
+        self.local_infile = bool(local_infile)
+        self.slow_query_time = (float(slow_query_time)
+                                if slow_query_time else None)
+        self.explain_slow_queries = bool(explain_slow_queries)
+        self.replica_strategy = replica_strategy or None
+        self.replica_max_lag = (float(replica_max_lag)
+                                if replica_max_lag else None)
+        self.parallel_queries = (int(parallel_queries)
+                                 if parallel_queries else None)
         self.auto_create_db = bool(auto_create_db)
         self.timeout = int(timeout) if timeout else None
+        self._setPoolOptions(pool_min_size, pool_max_size, pool_timeout,
+                             idle_timeout, max_lifetime, pool_warmup,
+                             ping_interval, result_cache_ttl,
+                             result_cache_size, schema_cache_ttl)
         return super().__init__(id, title, connection_string, check)
 
+    def _setPoolOptions(self, pool_min_size, pool_max_size, pool_timeout,
+                        idle_timeout, max_lifetime, pool_warmup,
+                        ping_interval, result_cache_ttl=None,
+                        result_cache_size=None, schema_cache_ttl=None):
+        """ Store connection pool settings from the ZMI
+        """
+        self.pool_max_size = int(pool_max_size) if pool_max_size else None
+        if pool_min_size in (None, ''):
+            self.pool_min_size = None
+        else:
+            self.pool_min_size = int(pool_min_size)
+        self.pool_timeout = float(pool_timeout) if pool_timeout else None
+        self.idle_timeout = float(idle_timeout) if idle_timeout else None
+        self.max_lifetime = float(max_lifetime) if max_lifetime else None
+        self.pool_warmup = int(pool_warmup) if pool_warmup else None
+        if ping_interval in (None, ''):
+            self.ping_interval = None
+        else:
+            self.ping_interval = float(ping_interval)
+        self.result_cache_ttl = (float(result_cache_ttl)
+                                 if result_cache_ttl else None)
+        self.result_cache_size = (float(result_cache_size)
+                                  if result_cache_size else None)
+        self.schema_cache_ttl = (float(schema_cache_ttl)
+                                 if schema_cache_ttl else None)
+
     def __setstate__(self, state):
         """ Skip super's __setstate__ as it connects which we don't want
             due to pool_key depending on acquisition.
@@ -139,6 +323,61 @@ class Connection(ConnectionBase):
             self.connect(self.connection_string)
             return self._v_database_connection
 
+    # Settings the connection pool is made with, a change of any of them
+    # replaces the pool
+    _pool_settings = ('auto_create_db', 'use_unicode', 'charset', 'timeout',
+                      'pool_min_size', 'pool_max_size', 'pool_timeout',
+                      'idle_timeout', 'max_lifetime', 'pool_warmup',
+                      'ping_interval', 'result_cache_ttl',
+                      'result_cache_size', 'schema_cache_ttl',
+                      'date_conversion', 'conv_profile', 'lazy_rows',
+                      'batch_queries', 'local_infile', 'slow_query_time',
+                      'explain_slow_queries', 'replica_strategy',
+                      'replica_max_lag', 'parallel_queries')
+
+    def _settings(self):
+        """ Return the current values of the ``_pool_settings``.
+        """
+        return tuple(getattr(self, name) for name in self._pool_settings)
+
+    def _makePool(self):
+        """ Return a new, not yet connected pool with the settings of this
+        connection.
+        """
+        return DBPool(self.factory(), create_db=self.auto_create_db,
+                      use_unicode=self.use_unicode,
+                      charset=self.charset,
+                      timeout=self.timeout,
+                      pool_min_size=self.pool_min_size,
+                      pool_max_size=self.pool_max_size,
+                      pool_timeout=self.pool_timeout,
+                      idle_timeout=self.idle_timeout,
+                      max_lifetime=self.max_lifetime,
+                      pool_warmup=self.pool_warmup,
+                      ping_interval=self.ping_interval,
+                      result_cache_ttl=self.result_cache_ttl,
+                      result_cache_size=self.result_cache_size,
+                      schema_cache_ttl=self.schema_cache_ttl,
+                      date_conversion=self.date_conversion,
+                      conv_profile=self.conv_profile,
+                      lazy_rows=self.lazy_rows,
+                      batch_queries=self.batch_queries,
+                      local_infile=self.local_infile,
+                      slow_query_time=self.slow_query_time,
+                      explain_slow_queries=self.explain_slow_queries,
+                      replica_strategy=self.replica_strategy,
+                      replica_max_lag=self.replica_max_lag,
+                      parallel_queries=self.parallel_queries)
+
+    def _dropConnection(self):
+        """ Forget the pool used by this thread, so the next query looks
+        up or opens the current one.
+        """
+        try:
+            del self._v_database_connection
+        except AttributeError:
+            pass
+
     security.declareProtected(use_database_methods, 'connect')  # NOQA: D001
 
     def connect(self, conn_string):
@@ -148,21 +387,22 @@ class Connection(ConnectionBase):
         """
         pool_key = self._pool_key()
         conn = database_connection_pool.get(pool_key)
+        settings = self._settings()
 
-        if conn is not None and conn.connection == conn_string:
+        if conn is not None and conn.connection == conn_string and \
+           conn.settings == settings:
             self._v_database_connection = conn
             self._v_connected = conn.connected_timestamp
         else:
             if conn is not None:
-                conn.closeConnection()
+                # Stops its replica checks and closes its extra connections
+                conn.close()
 
-            conn_pool = DBPool(self.factory(), create_db=self.auto_create_db,
-                               use_unicode=self.use_unicode,
-                               charset=self.charset,
-                               timeout=self.timeout)
+            conn_pool = self._makePool()
             database_connection_pool_lock.acquire()
             try:
                 conn = conn_pool(conn_string)
+                conn.settings = settings
                 database_connection_pool[pool_key] = conn
             finally:
                 database_connection_pool_lock.release()
@@ -202,12 +442,165 @@ class Connection(ConnectionBase):
         else:
             return connection.string_literal(sql_str)
 
+    security.declareProtected(use_database_methods,  # NOQA: D001
+                              'query_stream')
+
+    def query_stream(self, sql_string, chunk_size=1000):
+        """ Run a single SQL statement and stream its result.
+
+        Returns the result column descriptions and an iterator over the
+        result rows, which are fetched from the server ``chunk_size`` rows
+        at a time. Rows that have not been read when the connection is
+        used for the next query are discarded.
+
+        :string: sql_string -- The SQL statement to run.
+
+        :int: chunk_size -- Number of rows fetched from the server at once.
+                            Default: 1000
+        """
+        return self._getConnection().query_stream(sql_string, chunk_size)
+
+    security.declareProtected(use_database_methods,  # NOQA: D001
+                              'query_parallel')
+
+    def query_parallel(self, queries, max_rows=1000):
+        """ Run several independent read queries at the same time.
+
+        Each query runs on a connection of its own, outside of the current
+        transaction, so the time taken is that of the slowest query instead
+        of the sum of all. Returns the list of ``(items, rows)`` results in
+        the order of ``queries``, with None for queries that failed, and a
+        mapping of the index of each failed query to its error.
+
+        :list: queries -- The SQL strings to run. Only ``SELECT``, ``SHOW``,
+                          ``DESCRIBE`` and ``EXPLAIN`` statements can be run.
+
+        :int: max_rows -- Maximum number of rows returned by each query.
+                          Default: 1000
+        """
+        return self._getConnection().query_parallel(queries, max_rows)
+
+    security.declareProtected(use_database_methods,  # NOQA: D001
+                              'query_async')
+
+    def query_async(self, sql_string, max_rows=1000):
+        """ Run a query from an asyncio coroutine.
+
+        Returns an awaitable for the ``(items, rows)`` result, like the one
+        of ``query``. The event loop can run other tasks while the server
+        works on the query, without a thread waiting for it. The query runs
+        on a connection of its own in autocommit mode, outside of the
+        current transaction.
+
+        :string: sql_string -- The SQL statements to run, separated by null
+                               characters.
+
+        :int: max_rows -- Maximum number of rows to return. Default: 1000
+        """
+        return self._getConnection().query_async(sql_string, max_rows)
+
+    security.declareProtected(use_database_methods,  # NOQA: D001
+                              'query_columns')
+
+    def query_columns(self, sql_string, max_rows=1000):
+        """ Run a single SQL statement and return its result by column.
+
+        Returns the result column descriptions and a list of the values of
+        each column. Numeric columns are NumPy arrays if NumPy is installed
+        or else ``array`` objects, which use much less memory than one
+        Python object per value and are faster to aggregate.
+
+        :string: sql_string -- The SQL statement to run.
+
+        :int: max_rows -- Maximum number of rows to return. Default: 1000
+        """
+        return self._getConnection().query_columns(sql_string, max_rows)
+
+    security.declareProtected(use_database_methods,  # NOQA: D001
+                              'query_prepared')
+
+    def query_prepared(self, sql_string, params=(), max_rows=1000):
+        """ Run a SQL statement as a server-side prepared statement.
+
+        Values are passed separately from the statement and bound to its
+        ``?`` placeholders, so they don't need quoting with ``sql_quote__``.
+        Each connection keeps its most recently used statements prepared.
+
+        :string: sql_string -- The SQL statement with ``?`` placeholders.
+
+        :tuple: params -- The values for the placeholders, in order.
+
+        :int: max_rows -- Maximum number of rows to return. Default: 1000
+        """
+        return self._getConnection().query_prepared(sql_string, params,
+                                                    max_rows)
+
+    security.declareProtected(use_database_methods,  # NOQA: D001
+                              'bulk_insert')
+
+    def bulk_insert(self, table, columns, rows):
+        """ Insert many rows into a table with few statements.
+
+        The rows are sent as multi-row ``INSERT`` statements, each as large
+        as the server's ``max_allowed_packet`` allows, within the current
+        transaction. Returns a dictionary with the number of ``rows`` and
+        ``statements``, the ``seconds`` taken and the ``rows_per_second``.
+
+        :string: table -- The name of the table.
+
+        :list: columns -- The names of the columns to insert values into.
+
+        :iterable: rows -- Tuples of values, one for each column.
+        """
+        return self._getConnection().bulk_insert(table, columns, rows)
+
+    security.declareProtected(use_database_methods,  # NOQA: D001
+                              'load_data')
+
+    def load_data(self, table, source, columns=None, format='tsv',
+                  duplicates=None, ignore_lines=0):
+        """ Load rows into a table with ``LOAD DATA LOCAL INFILE``.
+
+        The data is streamed to the server while it is read, within the
+        current transaction. The connection must allow ``LOAD DATA LOCAL
+        INFILE``. Returns a dictionary with the number of ``records``
+        read, rows ``loaded``, ``skipped`` and ``deleted``, the number of
+        ``warnings`` and the ``seconds`` taken.
+
+        :string: table -- The name of the table.
+
+        :iterable: source -- Tuples of values or a file object.
+
+        :list: columns -- The columns to load values into. Default: all
+
+        :string: format -- ``tsv`` or ``csv``, the format of a file
+                           object. Default: ``tsv``
+
+        :string: duplicates -- ``ignore`` or ``replace`` rows with
+                               duplicate keys. Default: None (ignore)
+
+        :int: ignore_lines -- Lines to skip at the start of a file object.
+                              Default: 0
+        """
+        return self._getConnection().load_data(
+            table, source, columns=columns, format=format,
+            duplicates=duplicates, ignore_lines=ignore_lines)
+
     security.declareProtected(change_database_methods,  # NOQA: D001
                               'manage_edit')
 
     def manage_edit(self, title, connection_string, check=None,
                     use_unicode=None, charset=None, auto_create_db=None,
-                    timeout=None, REQUEST=None):
+                    timeout=None, pool_min_size=None, pool_max_size=None,
+                    pool_timeout=None, idle_timeout=None, max_lifetime=None,
+                    pool_warmup=None, ping_interval=None,
+                    result_cache_ttl=None, result_cache_size=None,
+                    schema_cache_ttl=None, date_conversion=None,
+                    conv_profile=None, lazy_rows=None, batch_queries=None,
+                    local_infile=None, slow_query_time=None,
+                    explain_slow_queries=None, replica_strategy=None,
+                    replica_max_lag=None, parallel_queries=None,
+                    REQUEST=None):
         """ Edit the connection attributes through the Zope ZMI.
 
         :string: title -- The title of the ZMySQLDA Connection
@@ -234,12 +627,97 @@ class Connection(ConnectionBase):
         :int: timeout -- The connect timeout for the connection in seconds.
                                  Default: None
 
+        :int: pool_min_size -- Number of idle connections kept open in the
+                               shared connection pool. Default: None
+
+        :int: pool_max_size -- Maximum number of connections shared by all
+                               threads. Default: None (one per thread)
+
+        :float: pool_timeout -- Maximum time in seconds to wait for a
+                                pooled connection. Default: None
+
+        :float: idle_timeout -- Recycle connections unused for longer than
+                                this many seconds. Default: None
+
+        :float: max_lifetime -- Recycle connections older than this many
+                                seconds. Default: None
+
+        :int: pool_warmup -- Number of connections opened in advance.
+                             Default: None
+
+        :float: ping_interval -- Ping connections idle for longer than this
+                                 many seconds when a transaction begins.
+                                 Default: None (always ping)
+
+        :float: result_cache_ttl -- Cache ``SELECT`` results for this many
+                                    seconds. Default: None (no caching)
+
+        :float: result_cache_size -- Memory limit of the result cache in
+                                     megabytes. Default: None (16 MB)
+
+        :float: schema_cache_ttl -- Cache table and column metadata for this
+                                    many seconds. Default: None (no caching)
+
+        :string: date_conversion -- ``legacy``, ``fast`` or ``native``
+                                    conversion of DATE and DATETIME values.
+                                    Default: None (see ``conv_profile``)
+
+        :string: conv_profile -- ``legacy``, ``native``, ``decimal`` or
+                                 ``raw`` conversion of result values.
+                                 Default: None (legacy)
+
+        :bool: lazy_rows -- Convert result values on first access.
+                            Default: False.
+
+        :bool: batch_queries -- Send all statements of a query in one
+                                round trip. Default: False.
+
+        :bool: local_infile -- Allow ``LOAD DATA LOCAL INFILE``.
+                               Default: False.
+
+        :float: slow_query_time -- Log queries taking this many seconds or
+                                   longer. Default: None (no logging)
+
+        :bool: explain_slow_queries -- Store the ``EXPLAIN`` output of slow
+                                       queries. Default: False.
+
+        :string: replica_strategy -- ``round_robin`` or
+                                     ``least_outstanding`` choice of read
+                                     replicas. Default: None (round_robin)
+
+        :float: replica_max_lag -- Maximum replication lag of replicas in
+                                   rotation in seconds. Default: None
+
+        :int: parallel_queries -- Maximum number of queries run at once by
+                                  ``query_parallel``. Default: None (4)
+
         :request: REQUEST -- A Zope REQUEST object
         """
+        settings = self._settings()
         self.use_unicode = bool(use_unicode)
         self.charset = charset
+        self.date_conversion = date_conversion or None
+        self.conv_profile = conv_profile or None
+        self.lazy_rows = bool(lazy_rows)
+        self.batch_queries = bool(batch_queries)
+        self.local_infile = bool(local_infile)
+        self.slow_query_time = (float(slow_query_time)
+                                if slow_query_time else None)
+        self.explain_slow_queries = bool(explain_slow_queries)
+        self.replica_strategy = replica_strategy or None
+        self.replica_max_lag = (float(replica_max_lag)
+                                if replica_max_lag else None)
+        self.parallel_queries = (int(parallel_queries)
+                                 if parallel_queries else None)
         self.auto_create_db = bool(auto_create_db)
         self.timeout = int(timeout) if timeout else None
+        self._setPoolOptions(pool_min_size, pool_max_size, pool_timeout,
+                             idle_timeout, max_lifetime, pool_warmup,
+                             ping_interval, result_cache_ttl,
+                             result_cache_size, schema_cache_ttl)
+        if self._settings() != settings:
+            # The next query opens a pool with the new settings
+            self._dropConnection()
 
         try:
             result = super().manage_edit(title, connection_string, check=check)
@@ -255,18 +733,126 @@ class Connection(ConnectionBase):
             url = '%s/manage_properties?manage_tabs_message=%s'
             REQUEST.RESPONSE.redirect(url % (self.absolute_url(), msg))
 
+    security.declareProtected(view_management_screens,  # NOQA: D001
+                              'pool_stats')
+
+    def pool_stats(self):
+        """ Return connection pool size, wait time and health check statistics
+        """
+        return self._getConnection().pool_stats()
+
+    security.declareProtected(view_management_screens,  # NOQA: D001
+                              'cache_stats')
+
+    def cache_stats(self):
+        """ Return query result cache hit, miss and size statistics
+        """
+        return self._getConnection().cache_stats()
+
+    security.declareProtected(view_management_screens,  # NOQA: D001
+                              'schema_cache_stats')
+
+    def schema_cache_stats(self):
+        """ Return schema metadata cache hit, miss and invalidation statistics
+        """
+        return self._getConnection().schema_cache_stats()
+
+    security.declareProtected(view_management_screens,  # NOQA: D001
+                              'query_stats')
+
+    def query_stats(self):
+        """ Return query timing, row and byte statistics with histograms
+        """
+        return self._getConnection().query_stats()
+
+    security.declareProtected(view_management_screens,  # NOQA: D001
+                              'top_queries')
+
+    def top_queries(self, limit=20, order='total'):
+        """ Return time, row and error statistics of the query fingerprints
+        with the most total time or the highest ``order`` value
+        """
+        return self._getConnection().top_queries(int(limit), order)
+
+    security.declareProtected(change_database_methods,  # NOQA: D001
+                              'manage_resetQueryStats')
+
+    def manage_resetQueryStats(self, REQUEST=None):
+        """ Forget the recorded query statistics
+        """
+        self._getConnection().reset_query_stats()
+
+        if REQUEST is not None:
+            msg = 'Statistics reset.'
+            url = '%s/manage_statistics?manage_tabs_message=%s'
+            REQUEST.RESPONSE.redirect(url % (self.absolute_url(), msg))
+
+    security.declareProtected(view_management_screens,  # NOQA: D001
+                              'replica_stats')
+
+    def replica_stats(self):
+        """ Return reads, connections, replication lag and health of each
+        read replica
+        """
+        return self._getConnection().replica_stats()
+
+    security.declareProtected(view_management_screens,  # NOQA: D001
+                              'writer_stats')
+
+    def writer_stats(self):
+        """ Return the current primary server, its candidates and how
+        often it changed
+        """
+        return self._getConnection().writer_stats()
+
+    security.declareProtected(view_management_screens,  # NOQA: D001
+                              'slow_queries')
+
+    def slow_queries(self):
+        """ Return the most recent slow queries with time, rows, thread
+        and plans
+        """
+        return self._getConnection().slow_queries()
+
+    security.declareProtected(change_database_methods,  # NOQA: D001
+                              'manage_clearSlowQueries')
+
+    def manage_clearSlowQueries(self, REQUEST=None):
+        """ Empty the slow query log
+        """
+        self._getConnection().clear_slow_queries()
+
+        if REQUEST is not None:
+            msg = 'Slow query log cleared.'
+            url = '%s/manage_statistics?manage_tabs_message=%s'
+            REQUEST.RESPONSE.redirect(url % (self.absolute_url(), msg))
+
+    security.declareProtected(change_database_methods,  # NOQA: D001
+                              'manage_clearCache')
+
+    def manage_clearCache(self, REQUEST=None):
+        """ Drop all cached query results and schema metadata
+        """
+        self._getConnection().clear_cache()
+
+        if REQUEST is not None:
+            msg = 'Caches cleared.'
+            url = '%s/manage_properties?manage_tabs_message=%s'
+            REQUEST.RESPONSE.redirect(url % (self.absolute_url(), msg))
+
     security.declareProtected(view_management_screens,  # NOQA: D001
                               'tpValues')
 
     def tpValues(self):
         """ Support the DTML ``tree`` tag
 
-        Used in the Zope ZMI ``Browse`` tab
+        Used in the Zope ZMI ``Browse`` tab. All tables and columns are
+        read at once, so expanding a table needs no further queries.
         """
         t_list = []
         connection = self._getConnection()
 
-        for t_info in connection.tables(rdb=0):
+        for t_info in connection.schema():
             try:
                 t_browser = TableBrowser()
                 t_browser.__name__ = t_info['table_name']
@@ -283,6 +869,151 @@ class Connection(ConnectionBase):
 InitializeClass(Connection)
 
 
+class ShardedConnection(Connection):
+    """ Zope database adapter for data split over several MySQL/MariaDB
+    databases by a shard key
+    """
+    meta_type = 'Z MySQL Sharded Database Connection'
+    security = ClassSecurityInfo()
+
+    sharded = True
+    shard_map = 'hash'
+    shard_ranges = ''
+    _pool_settings = Connection._pool_settings + ('shard_map', 'shard_ranges')
+
+    security.declareProtected(change_database_methods,  # NOQA: D001
+                              'manage_sharding')
+    manage_sharding = HTMLFile('www/sharding', globals())
+
+    manage_options = (Connection.manage_options[:1] +
+                      ({'label': 'Sharding', 'action': 'manage_sharding'},) +
+                      Connection.manage_options[1:])
+
+    def __init__(self, id, title, connection_string, check, shard_map=None,
+                 shard_ranges=None, **kw):
+        """ Instance setup. Optionally opens the connection.
+
+        :string: connection_string -- One line for each shard with the
+                                      shard name and the connection string
+                                      of its database.
+
+        :string: shard_map -- How shard keys are mapped to shards: ``hash``
+                              spreads them evenly, ``range`` by the
+                              ``shard_ranges``. Default: None (hash)
+
+        :string: shard_ranges -- For the ``range`` map, one line for each
+                                 range with its lowest key and shard name.
+
+        The other arguments are those of ``Connection``.
+        """
+        self._setShardOptions(shard_map, shard_ranges)
+        return super().__init__(id, title, connection_string, check, **kw)
+
+    def _setShardOptions(self, shard_map, shard_ranges):
+        """ Store sharding settings from the ZMI
+        """
+        shard_map = shard_map or 'hash'
+        if shard_map not in ShardedPool.shard_maps:
+            raise ValueError('Unknown shard map %s' % shard_map)
+        self.shard_map = shard_map
+        self.shard_ranges = shard_ranges or ''
+
+    def _makePool(self):
+        """ Return a new, not yet connected pool for all shards.
+        """
+        return ShardedPool(super()._makePool, self.shard_map,
+                           self.shard_ranges)
+
+    security.declareProtected(change_database_methods,  # NOQA: D001
+                              'manage_editSharding')
+
+    def manage_editSharding(self, shard_map=None, shard_ranges=None,
+                            REQUEST=None):
+        """ Change how shard keys are mapped to shards.
+
+        An open connection is reopened with the new settings.
+
+        :string: shard_map -- ``hash`` or ``range``. Default: None (hash)
+
+        :string: shard_ranges -- For the ``range`` map, one line for each
+                                 range with its lowest key and shard name.
+
+        :request: REQUEST -- A Zope REQUEST object
+        """
+        try:
+            self._setShardOptions(shard_map, shard_ranges)
+            self._dropConnection()
+            if self.connected():
+                self.connect(self.connection_string)
+            msg = 'Changes applied.'
+        except Exception as exc:
+            msg = 'ERROR: %s' % str(exc)
+            if REQUEST is None:
+                raise
+
+        if REQUEST is not None:
+            url = '%s/manage_sharding?manage_tabs_message=%s'
+            REQUEST.RESPONSE.redirect(url % (self.absolute_url(), msg))
+
+    security.declareProtected(view_management_screens,  # NOQA: D001
+                              'shard_name')
+
+    def shard_name(self, shard_key):
+        """ Return the name of the shard holding ``shard_key``.
+        """
+        return self._getConnection().shard_name(shard_key)
+
+    security.declareProtected(view_management_screens,  # NOQA: D001
+                              'shard_stats')
+
+    def shard_stats(self):
+        """ Return the name, server and database of each shard
+        """
+        return self._getConnection().shard_stats()
+
+    security.declareProtected(use_database_methods,  # NOQA: D001
+                              'query_shard')
+
+    def query_shard(self, sql_string, shard_key, max_rows=1000):
+        """ Run SQL statements on the shard holding ``shard_key``.
+
+        Returns the ``(items, rows)`` result like a Z SQL method's
+        database connection, within the current transaction.
+
+        :string: sql_string -- The SQL statements to run, separated by null
+                               characters.
+
+        :string: shard_key -- The key choosing the shard.
+
+        :int: max_rows -- Maximum number of rows to return. Default: 1000
+        """
+        return self._getConnection().query(sql_string, max_rows,
+                                           shard_key=shard_key)
+
+    security.declareProtected(use_database_methods,  # NOQA: D001
+                              'query_shards')
+
+    def query_shards(self, sql_string, max_rows=1000):
+        """ Run a read query on all shards at the same time.
+
+        Each shard runs the query on a connection of its own, outside of
+        the current transaction. Returns a mapping of shard names to the
+        ``(items, rows)`` results of the shards and a mapping of shard
+        names to the errors of shards where the query failed.
+
+        :string: sql_string -- The SQL statements to run. Only ``SELECT``,
+                               ``SHOW``, ``DESCRIBE`` and ``EXPLAIN``
+                               statements can be run.
+
+        :int: max_rows -- Maximum number of rows returned by each shard.
+                          Default: 1000
+        """
+        return self._getConnection().query_shards(sql_string, max_rows)
+
+
+InitializeClass(ShardedConnection)
+
+
 mod_security = ModuleSecurityInfo('Products.ZMySQLDA.DA')
 mod_security.declareProtected(add_zmysql_database_connections,  # NOQA
                               'manage_addZMySQLConnectionForm')
@@ -294,7 +1025,18 @@ mod_security.declareProtected(add_zmysql_database_connections,  # NOQA
 
 def manage_addZMySQLConnection(self, id, title, connection_string, check=None,
                                use_unicode=None, auto_create_db=None,
-                               charset=None, timeout=None, REQUEST=None):
+                               charset=None, timeout=None, pool_min_size=None,
+                               pool_max_size=None, pool_timeout=None,
+                               idle_timeout=None, max_lifetime=None,
+                               pool_warmup=None, ping_interval=None,
+                               result_cache_ttl=None, result_cache_size=None,
+                               schema_cache_ttl=None, date_conversion=None,
+                               conv_profile=None, lazy_rows=None,
+                               batch_queries=None, local_infile=None,
+                               slow_query_time=None,
+                               explain_slow_queries=None,
+                               replica_strategy=None, replica_max_lag=None,
+                               parallel_queries=None, REQUEST=None):
     """Factory function to add a connection object from the Zope ZMI.
 
     :string: id -- The id of the ZMySQLDA Connection
@@ -329,13 +1071,146 @@ def manage_addZMySQLConnection(self, id, title, connection_string, check=None,
     :int: timeout -- The connect timeout for the connection in seconds.
                              Default: None
 
+    :int: pool_min_size -- Number of idle connections kept open in the
+                           shared connection pool. Default: None
+
+    :int: pool_max_size -- Maximum number of connections shared by all
+                           threads. Default: None (one per thread)
+
+    :float: pool_timeout -- Maximum time in seconds to wait for a pooled
+                            connection. Default: None
+
+    :float: idle_timeout -- Recycle connections unused for longer than this
+                            many seconds. Default: None
+
+    :float: max_lifetime -- Recycle connections older than this many
+                            seconds. Default: None
+
+    :int: pool_warmup -- Number of connections opened in advance.
+                         Default: None
+
+    :float: ping_interval -- Ping connections idle for longer than this many
+                             seconds when a transaction begins.
+                             Default: None (always ping)
+
+    :float: result_cache_ttl -- Cache ``SELECT`` results for this many
+                                seconds. Default: None (no caching)
+
+    :float: result_cache_size -- Memory limit of the result cache in
+                                 megabytes. Default: None (16 MB)
+
+    :float: schema_cache_ttl -- Cache table and column metadata for this
+                                many seconds. Default: None (no caching)
+
+    :string: date_conversion -- ``legacy``, ``fast`` or ``native``
+                                conversion of DATE and DATETIME values.
+                                Default: None (see ``conv_profile``)
+
+    :string: conv_profile -- ``legacy``, ``native``, ``decimal`` or ``raw``
+                             conversion of result values.
+                             Default: None (legacy)
+
+    :bool: lazy_rows -- Convert result values on first access.
+                        Default: False.
+
+    :bool: batch_queries -- Send all statements of a query in one round
+                            trip. Default: False.
+
+    :bool: local_infile -- Allow ``LOAD DATA LOCAL INFILE``.
+                           Default: False.
+
+    :float: slow_query_time -- Log queries taking this many seconds or
+                               longer. Default: None (no logging)
+
+    :bool: explain_slow_queries -- Store the ``EXPLAIN`` output of slow
+                                   queries. Default: False.
+
+    :string: replica_strategy -- ``round_robin`` or ``least_outstanding``
+                                 choice of read replicas.
+                                 Default: None (round_robin)
+
+    :float: replica_max_lag -- Maximum replication lag of replicas in
+                               rotation in seconds. Default: None
+
+    :int: parallel_queries -- Maximum number of queries run at once by
+                              ``query_parallel``. Default: None (4)
+
     :object: REQUEST -- The currently active Zope request object.
                         Default: None.
     """
     self._setObject(id,
                     Connection(id, title, connection_string, check,
                                use_unicode=use_unicode, charset=charset,
-                               auto_create_db=auto_create_db, timeout=timeout))
+                               auto_create_db=auto_create_db, timeout=timeout,
+                               pool_min_size=pool_min_size,
+                               pool_max_size=pool_max_size,
+                               pool_timeout=pool_timeout,
+                               idle_timeout=idle_timeout,
+                               max_lifetime=max_lifetime,
+                               pool_warmup=pool_warmup,
+                               ping_interval=ping_interval,
+                               result_cache_ttl=result_cache_ttl,
+                               result_cache_size=result_cache_size,
+                               schema_cache_ttl=schema_cache_ttl,
+                               date_conversion=date_conversion,
+                               conv_profile=conv_profile,
+                               lazy_rows=lazy_rows,
+                               batch_queries=batch_queries,
+                               local_infile=local_infile,
+                               slow_query_time=slow_query_time,
+                               explain_slow_queries=explain_slow_queries,
+                               replica_strategy=replica_strategy,
+                               replica_max_lag=replica_max_lag,
+                               parallel_queries=parallel_queries))
+
+    if REQUEST is not None:
+        return self.manage_main(self, REQUEST)
+
+
+mod_security.declareProtected(add_zmysql_database_connections,  # NOQA
+                              'manage_addZMySQLShardedConnectionForm')
+manage_addZMySQLShardedConnectionForm = HTMLFile('www/shardedAdd', globals())
+
+mod_security.declareProtected(add_zmysql_database_connections,  # NOQA
+                              'manage_addZMySQLShardedConnection')
+
+
+def manage_addZMySQLShardedConnection(self, id, title, connection_string,
+                                      check=None, charset=None,
+                                      shard_map=None, shard_ranges=None,
+                                      REQUEST=None):
+    """Factory function to add a sharded connection object from the Zope ZMI.
+
+    The other settings can be changed on the Properties tab afterwards.
+
+    :string: id -- The id of the ZMySQLDA Connection
+
+    :string: title -- The title of the ZMySQLDA Connection
+
+    :string: connection_string -- One line for each shard with the shard
+                                  name and the connection string of its
+                                  database.
+
+    :bool: check -- Check if the database connections can be opened after
+                    instantiation. Default: False.
+
+    :string: charset -- The character set for the connections.
+                        Default: utf8
+
+    :string: shard_map -- ``hash`` or ``range`` mapping of shard keys to
+                          shards. Default: None (hash)
+
+    :string: shard_ranges -- For the ``range`` map, one line for each range
+                             with its lowest key and shard name.
+
+    :object: REQUEST -- The currently active Zope request object.
+                        Default: None.
+    """
+    self._setObject(id,
+                    ShardedConnection(id, title, connection_string, check,
+                                      shard_map=shard_map,
+                                      shard_ranges=shard_ranges,
+                                      charset=charset))
 
     if REQUEST is not None:
         return self.manage_main(self, REQUEST)
@@ -27,6 +27,13 @@ def initialize(context):
                       DA.manage_addZMySQLConnection),
         icon='www/da.svg')
 
+    context.registerClass(
+        DA.ShardedConnection,
+        permission=add_zmysql_database_connections,
+        constructors=(DA.manage_addZMySQLShardedConnectionForm,
+                      DA.manage_addZMySQLShardedConnection),
+        icon='www/da.svg')
+
 
 misc_ = {}
 for icon in ('table', 'view', 'stable', 'what', 'field', 'text', 'bin',
@@ -0,0 +1,266 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Queries run from asyncio coroutines
+"""
+import asyncio
+import threading
+import time
+import weakref
+
+from MySQLdb import OperationalError
+
+from .cache import changed_tables
+from .cache import read_statements
+from .stats import result_bytes
+
+
+class AsyncDB:
+    """ A connection for coroutines
+
+    Statements are sent with ``send_query`` and the event loop waits until
+    the server answers before the result is read, so no thread is blocked
+    while the server works on a query. The result itself is read in one go
+    once the server starts sending it.
+
+    ``db`` is the ``db_cls`` instance whose connection is used. Connecting
+    and reconnecting are left to it and run in a worker thread.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    async def query(self, sql_string, max_rows=1000):
+        """ Execute ``sql_string`` and return at most ``max_rows``.
+
+        The statements of ``sql_string`` are separated by null characters.
+        The rows of the last statement returning a result are returned.
+        Returns the tables changed by the statements as well.
+        """
+        loop = asyncio.get_running_loop()
+        desc = None
+        rows = ()
+        tables = set()
+        for qs in filter(None, [q.strip() for q in sql_string.split('\0')]):
+            qtype = qs.split(None, 1)[0].upper()
+            if qtype not in read_statements:
+                tables.update(changed_tables(qs))
+            if qtype == 'SELECT' and max_rows:
+                qs = '%s LIMIT %d' % (qs, max_rows)
+            result = await self._query(loop, qs)
+            if result:
+                desc = result.describe()
+                rows = result.fetch_row(max_rows)
+            else:
+                desc = None
+        if desc is None:
+            return (), (), tables
+        return self.db._items(desc), rows, tables
+
+    async def _query(self, loop, qs):
+        """ Send the statement ``qs`` and return its result.
+
+        Like ``query`` of connections outside of transactions, the
+        statement is sent once more after reconnecting if the connection
+        turns out to be gone.
+        """
+        try:
+            return await self._send(loop, qs)
+        except OperationalError as exc:
+            if not await loop.run_in_executor(None, self.db._reconnect_hosed,
+                                              exc):
+                raise
+        return await self._send(loop, qs)
+
+    async def _send(self, loop, qs):
+        """ Send ``qs`` and read its result once the server has answered.
+        """
+        self.db._last_used = time.monotonic()
+        self.db._query_failed = True
+        connection = self.db.db
+        connection.send_query(qs)
+        await self._readable(loop, connection)
+        connection.read_query_result()
+        result = connection.store_result()
+        self.db._query_failed = False
+        return result
+
+    async def _readable(self, loop, connection):
+        """ Wait until the server has sent an answer.
+        """
+        fd = connection.fileno()
+        ready = loop.create_future()
+
+        def wake_up():
+            if not ready.done():
+                ready.set_result(None)
+
+        loop.add_reader(fd, wake_up)
+        try:
+            await ready
+        finally:
+            loop.remove_reader(fd)
+
+    def close(self):
+        self.db.close()
+
+
+class AsyncPool:
+    """ Connections for queries run from asyncio coroutines
+
+    Each query in progress uses a connection of its own, which is kept for
+    later queries afterwards. At most ``max_size`` queries of an event loop
+    run at once, the others wait for a connection. The connections run in
+    autocommit mode outside of any Zope transaction, with the connection
+    arguments and value conversions of ``db_flags``. Changes invalidate the
+    results cached by the pool and all queries are recorded in its
+    statistics.
+
+    Like the connections of the pool, idle connections are reconnected
+    before use if ``expired`` returns a reason for it, like an exceeded
+    idle timeout, and checked with a ping if they have been idle for longer
+    than ``ping_interval`` seconds.
+
+    If ``slots`` is given, the pool limiting the number of connections,
+    each connection takes one of its slots while a query runs and is
+    closed afterwards.
+    """
+
+    # Number of queries run at once if not configured
+    max_size = 4
+
+    def __init__(self, db_cls, db_flags, max_size=None, expired=None,
+                 ping_interval=None, slots=None):
+        if max_size:
+            self.max_size = int(max_size)
+        self._slots = slots
+        if expired is not None:
+            self._expired = expired
+        self._db_cls = db_cls
+        self._db_flags = dict(db_flags, use_TM=False, transactions=False,
+                              mysql_lock=None, ping_interval=ping_interval,
+                              result_cache=None, lazy_rows=False,
+                              query_stats=None, slow_log=None, replicas=None,
+                              kw_args=dict(db_flags['kw_args'],
+                                           autocommit=True))
+        self._result_cache = db_flags.get('result_cache')
+        self._query_stats = db_flags.get('query_stats')
+        self._lock = threading.Lock()
+        self._idle = []
+        # an asyncio semaphore only works in the event loop it is used in
+        self._semaphores = weakref.WeakKeyDictionary()  # loop -> semaphore
+
+    async def query(self, sql_string, max_rows=1000):
+        """ Execute ``sql_string`` and return ``(items, rows)`` with at
+        most ``max_rows`` rows.
+        """
+        async with self._semaphore():
+            db = await self._checkout()
+            start = time.perf_counter()
+            try:
+                items, rows, tables = await db.query(sql_string, max_rows)
+            except BaseException:
+                # The connection may still be waiting for a result
+                self._discard(db)
+                if self._query_stats is not None:
+                    self._query_stats.record_error(
+                        time.perf_counter() - start, sql_string)
+                raise
+            self._checkin(db)
+        if tables and self._result_cache is not None:
+            self._result_cache.invalidate(tables)
+        if self._query_stats is not None:
+            self._query_stats.record_query(time.perf_counter() - start,
+                                           len(rows), result_bytes(rows),
+                                           sql_string)
+        return items, rows
+
+    def _semaphore(self):
+        """ Return the semaphore limiting the queries of the running loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(
+                    self.max_size)
+            return semaphore
+
+    async def _checkout(self):
+        """ Return an idle connection or open a new one in a worker thread.
+
+        Idle connections are recycled or pinged first if they are due.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            db = self._idle.pop() if self._idle else None
+        if db is None:
+            if self._slots is not None:
+                await loop.run_in_executor(None, self._slots._reserve)
+            try:
+                db = await loop.run_in_executor(
+                    None, lambda: self._db_cls(**self._db_flags))
+            except BaseException:
+                if self._slots is not None:
+                    self._slots._release()
+                raise
+        elif self._expired(db, time.monotonic()) or db._writer_moved() or \
+                db._needs_ping():
+            try:
+                await loop.run_in_executor(None, self._check, db)
+            except BaseException:
+                db.close()
+                raise
+        return AsyncDB(db)
+
+    def _check(self, db):
+        """ Reconnect ``db`` if it is due for recycling or the primary has
+        changed, otherwise ping it.
+        """
+        reason = self._expired(db, time.monotonic())
+        if reason is None and db._writer_moved():
+            reason = 'primary changed'
+        if reason:
+            db._forceReconnection(reason=reason)
+        else:
+            db._ping()
+
+    def _checkin(self, db):
+        """ Keep the connection of ``db`` for later queries unless it has
+        expired or takes a slot of the pool.
+        """
+        if self._slots is not None or \
+           self._expired(db.db, time.monotonic()):
+            self._discard(db)
+            return
+        with self._lock:
+            self._idle.append(db.db)
+
+    def _discard(self, db):
+        """ Close the connection of ``db`` and free its slot.
+        """
+        db.close()
+        if self._slots is not None:
+            self._slots._release()
+
+    def _expired(self, db, now):
+        """ Return the reason why ``db`` is due for recycling, if it is.
+        """
+        return None
+
+    def close(self):
+        """ Close all idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for db in idle:
+            db.close()
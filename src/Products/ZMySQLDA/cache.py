@@ -0,0 +1,317 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" In-process caches shared by all threads using a database connection
+"""
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from .stats import SAMPLE_ROWS
+
+
+# Statements that never change table contents
+read_statements = frozenset(('SELECT', 'SHOW', 'DESC', 'DESCRIBE', 'EXPLAIN',
+                             'SET', 'USE', 'DO', 'BEGIN', 'START', 'COMMIT',
+                             'ROLLBACK', 'SAVEPOINT', 'RELEASE'))
+
+# Marker for "any table", used if the changed tables cannot be determined
+ALL_TABLES = '*'
+
+_name = r'(?:`[^`]+`|[\w$]+)(?:\s*\.\s*(?:`[^`]+`|[\w$]+))?'
+_table_ref = re.compile(r'\b(?:JOIN|INTO|UPDATE|TABLE|TABLES)\s+(%s)' % _name,
+                        re.IGNORECASE)
+_write_target = re.compile(
+    r'^\s*(?:INSERT|REPLACE|UPDATE|DELETE|TRUNCATE)\s+'
+    r'(?:(?:LOW_PRIORITY|DELAYED|HIGH_PRIORITY|QUICK|IGNORE|INTO|FROM|TABLE)'
+    r'\s+)*(%s)' % _name, re.IGNORECASE)
+_from = re.compile(r'\bFROM\s+', re.IGNORECASE)
+_from_end = re.compile(r'\b(?:WHERE|GROUP|ORDER|HAVING|LIMIT|UNION|WINDOW|'
+                       r'FOR|LOCK|INTO|USING)\b|[();]', re.IGNORECASE)
+_join = re.compile(r',|\b(?:STRAIGHT_)?JOIN\b', re.IGNORECASE)
+_leading_name = re.compile(r'\s*(%s)' % _name)
+_locking_read = re.compile(
+    r'\bFOR\s+(?:UPDATE|SHARE)\b|\bLOCK\s+IN\s+SHARE\s+MODE\b|\bINTO\b',
+    re.IGNORECASE)
+_literal = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+# Results depending on the state of the connection: user and system
+# variables, the last insert id or row count, locks and sequences
+_session_read = re.compile(
+    r'@|\b(?:LAST_INSERT_ID|FOUND_ROWS|ROW_COUNT|CONNECTION_ID|GET_LOCK|'
+    r'RELEASE_LOCK|RELEASE_ALL_LOCKS|IS_FREE_LOCK|IS_USED_LOCK|NEXTVAL|'
+    r'LASTVAL|SETVAL)\s*\(|\b(?:NEXT|PREVIOUS)\s+VALUE\s+FOR\b',
+    re.IGNORECASE)
+# Results changing with every call, like the time or random values
+_volatile_read = re.compile(
+    r'\b(?:NOW|SYSDATE|CURDATE|CURTIME|UNIX_TIMESTAMP|UTC_DATE|UTC_TIME|'
+    r'UTC_TIMESTAMP|RAND|UUID|UUID_SHORT|SLEEP|BENCHMARK|USER|'
+    r'CURRENT_USER|SESSION_USER|SYSTEM_USER)\s*\(|'
+    r'\b(?:CURRENT_DATE|CURRENT_TIME|CURRENT_TIMESTAMP|LOCALTIME|'
+    r'LOCALTIMESTAMP)\b', re.IGNORECASE)
+
+
+def _table_name(ref):
+    """ Normalize a possibly quoted and database qualified table name.
+    """
+    name = ref.replace('`', '').split('.')[-1].strip()
+    return name.lower()
+
+
+def statement_tables(sql):
+    """ Return the set of table names a SQL statement refers to.
+
+    This errs on the side of returning too many names, e.g. aliases.
+    """
+    refs = _table_ref.findall(sql) + _write_target.findall(sql)
+    for match in _from.finditer(sql):
+        end = _from_end.search(sql, match.end())
+        clause = sql[match.end():end.start() if end else len(sql)]
+        for part in _join.split(clause):
+            name = _leading_name.match(part)
+            if name:
+                refs.append(name.group(1))
+    return {_table_name(ref) for ref in refs}
+
+
+def changed_tables(sql):
+    """ Return the tables a data changing SQL statement may modify.
+
+    If they cannot be determined, ``ALL_TABLES`` is returned instead.
+    """
+    if sql.split(None, 1)[0].upper() == 'CALL':
+        return {ALL_TABLES}
+    return statement_tables(sql) or {ALL_TABLES}
+
+
+def plain_read(sql):
+    """ Is the SQL statement ``sql`` a ``SELECT`` that neither locks rows
+    nor depends on or changes the state of the connection?
+    """
+    if sql.split(None, 1)[0].upper() != 'SELECT':
+        return False
+    sql = _literal.sub("''", sql)
+    return not (_locking_read.search(sql) or _session_read.search(sql))
+
+
+def cacheable(sql):
+    """ Can the result of the SQL statement ``sql`` be cached?
+
+    Only plain reads of tables without functions returning a different
+    value with each call can, so writes to the tables invalidate them.
+    """
+    return plain_read(sql) and \
+        not _volatile_read.search(_literal.sub("''", sql)) and \
+        bool(statement_tables(sql))
+
+
+def result_size(result):
+    """ Estimate the memory used by a ``(items, rows)`` query result.
+
+    Only the first ``SAMPLE_ROWS`` rows are measured. Lazy rows count with
+    their unconverted values, so measuring them converts nothing.
+    """
+    items, rows = result
+    size = sys.getsizeof(rows) + sum(sys.getsizeof(i) for i in items)
+    if not rows:
+        return size
+    sample = rows[:SAMPLE_ROWS]
+    sample_size = 0
+    for row in sample:
+        sample_size += sys.getsizeof(row)
+        for value in getattr(row, '_values', row):
+            sample_size += sys.getsizeof(value)
+    return size + sample_size * len(rows) // len(sample)
+
+
+class ResultCache:
+    """ LRU cache of query results with a time to live and a memory cap
+
+    Every entry records the tables its query read, so writes to a table
+    can invalidate all results that depend on it.
+    """
+
+    def __init__(self, ttl=60, max_size=16 * 1024 * 1024):
+        self.ttl = float(ttl)
+        self.max_size = int(max_size)
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (expires, size, tables, value)
+        self._tables = {}  # table name -> set of keys
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0,
+                       'invalidations': 0}
+
+    def get(self, key):
+        """ Return the cached value for ``key`` or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[3]
+
+    def set(self, key, value, tables, size):
+        """ Cache ``value`` of ``size`` bytes, read from ``tables``.
+        """
+        if size > self.max_size:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while self._entries and self.size + size > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+            self._entries[key] = (time.monotonic() + self.ttl, size,
+                                  tables, value)
+            self.size += size
+            for table in tables:
+                self._tables.setdefault(table, set()).add(key)
+
+    def invalidate(self, tables):
+        """ Drop all entries that read one of ``tables``.
+        """
+        with self._lock:
+            if ALL_TABLES in tables:
+                count = len(self._entries)
+                self._clear()
+            else:
+                keys = set()
+                for table in tables:
+                    keys.update(self._tables.get(table, ()))
+                for key in keys:
+                    self._remove(key)
+                count = len(keys)
+            self._stats['invalidations'] += count
+
+    def clear(self):
+        """ Drop all entries.
+        """
+        with self._lock:
+            self._clear()
+
+    def stats(self):
+        """ Return hit, miss, eviction and size statistics.
+        """
+        with self._lock:
+            stats = dict(self._stats, entries=len(self._entries),
+                         size=self.size, max_size=self.max_size, ttl=self.ttl)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+    def _remove(self, key):
+        expires, size, tables, value = self._entries.pop(key)
+        self.size -= size
+        for table in tables:
+            keys = self._tables.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tables[table]
+
+    def _clear(self):
+        self._entries.clear()
+        self._tables.clear()
+        self.size = 0
+
+
+class SchemaCache:
+    """ Cache of table and column metadata with a time to live
+
+    Entries are also dropped when the creation or update time of the
+    table they describe changes. These stamps are read with the
+    ``stamps`` callable passed to ``get``, at most once every
+    ``check_interval`` seconds.
+    """
+
+    check_interval = 5.0
+
+    def __init__(self, ttl=300):
+        self.ttl = float(ttl)
+        self._entries = {}  # key -> (expires, table, value)
+        self._stamps = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0,
+                       'checks': 0}
+
+    def get(self, key, table, compute, stamps):
+        """ Return the cached value for ``key``, or the result of calling
+        ``compute``, which is cached.
+
+        ``table`` is the name of the table the value describes, or None
+        if it describes all tables.
+        """
+        self._check(stamps)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._stats['hits'] += 1
+                return entry[2]
+            self._stats['misses'] += 1
+
+        value = compute()
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl,
+                                  table and _table_name(table), value)
+        return value
+
+    def invalidate(self, table=None):
+        """ Drop the entries for ``table``, or all entries.
+        """
+        with self._lock:
+            if table is None:
+                self._stats['invalidations'] += len(self._entries)
+                self._entries.clear()
+            else:
+                self._drop({_table_name(table)})
+
+    clear = invalidate
+
+    def stats(self):
+        """ Return hit, miss and invalidation statistics.
+        """
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries),
+                        ttl=self.ttl)
+
+    def _check(self, stamps):
+        """ Drop the entries of tables whose stamps have changed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_check:
+                return
+            self._next_check = now + min(self.check_interval, self.ttl)
+            self._stats['checks'] += 1
+
+        current = stamps()
+        with self._lock:
+            if self._stamps is not None and current != self._stamps:
+                self._drop({name for name in set(current) | set(self._stamps)
+                            if current.get(name) != self._stamps.get(name)})
+            self._stamps = current
+
+    def _drop(self, tables):
+        """ Drop entries of ``tables`` and entries describing all tables.
+        """
+        for key, (expires, table, value) in list(self._entries.items()):
+            if table is None or table in tables:
+                del self._entries[key]
+                self._stats['invalidations'] += 1
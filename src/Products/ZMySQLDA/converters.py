@@ -0,0 +1,96 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Conversion functions for values returned by MySQL/MariaDB
+"""
+import re
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from functools import lru_cache
+
+from DateTime.DateTime import DateTime
+from DateTime.interfaces import DateTimeError
+
+
+# Number of distinct values remembered by the memoizing converters
+MEMO_SIZE = 4096
+
+_date_format = re.compile(r'(\d{4})-(\d\d)-(\d\d)'
+                          r'(?: (\d\d):(\d\d):(\d\d)(?:\.(\d{1,6}))?)?$')
+_epoch = datetime(1970, 1, 1)
+_microsecond = timedelta(microseconds=1)
+
+
+def DateTime_or_None(s):
+    try:
+        return DateTime(s)
+    except DateTimeError:
+        return None
+
+
+def parse_datetime(s):
+    """ Parse the MySQL ``YYYY-MM-DD[ HH:MM:SS[.ffffff]]`` format.
+
+    Returns a ``date`` or ``datetime`` object, or None if ``s`` is not in
+    this format or is not a valid date, like the zero date ``0000-00-00``.
+    """
+    if isinstance(s, bytes):
+        s = s.decode('ascii')
+    match = _date_format.match(s)
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, fraction = match.groups()
+    try:
+        if hour is None:
+            return date(int(year), int(month), int(day))
+        return datetime(int(year), int(month), int(day), int(hour),
+                        int(minute), int(second),
+                        int(fraction.ljust(6, '0')) if fraction else 0)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def datetime_or_None(s):
+    """ Convert DATE and DATETIME values to ``date`` and ``datetime``.
+    """
+    return parse_datetime(s)
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def fast_DateTime_or_None(s):
+    """ Convert DATE and DATETIME values to ``DateTime`` objects.
+
+    The result is the same as from ``DateTime_or_None``, which runs the
+    generic ``DateTime`` string parser, but built from the parsed parts.
+    """
+    value = parse_datetime(s)
+    if value is None:
+        return DateTime_or_None(s)
+    if not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+
+    # Like the ISO 8601 parser of ``DateTime``, treat the value as
+    # timezone naive UTC.
+    if 1900 <= value.year < 2100:
+        # Close to the epoch the time in microseconds is exact as float.
+        result = DateTime.__new__(DateTime)
+        result.__setstate__(((value - _epoch) // _microsecond, True,
+                             'GMT+0'))
+    else:
+        result = DateTime(value.year, value.month, value.day, value.hour,
+                          value.minute,
+                          value.second + value.microsecond / 1000000.0,
+                          'GMT+0')
+        result._timezone_naive = True
+    return result
@@ -10,10 +10,15 @@
 # FOR A PARTICULAR PURPOSE.
 #
 ##############################################################################
+import copy
 import logging
+import threading
 import time
+import weakref
 from _thread import allocate_lock
 from _thread import get_ident
+from collections import OrderedDict
+from contextlib import closing
 
 import MySQLdb
 import MySQLdb as _mysql
@@ -28,11 +33,39 @@ from MySQLdb.converters import conversions
 
 import transaction
 from DateTime.DateTime import DateTime
-from DateTime.interfaces import DateTimeError
 from Shared.DC.ZRDB.TM import TM
 from ZODB.POSException import ConflictError
 from ZODB.POSException import TransactionFailedError
 
+from .aio import AsyncPool
+from .cache import ResultCache
+from .cache import SchemaCache
+from .cache import cacheable
+from .cache import changed_tables
+from .cache import plain_read
+from .cache import read_statements
+from .cache import result_size
+from .cache import statement_tables
+from .converters import DateTime_or_None
+from .converters import datetime_or_None
+from .converters import fast_DateTime_or_None
+from .failover import Writers
+from .loaddata import CHUNK_SIZE
+from .loaddata import InfileFeeder
+from .loaddata import formats
+from .loaddata import load_info
+from .loaddata import tsv_lines
+from .parallel import ParallelQueries
+from .replicas import ReplicaPool
+from .replicas import parse_hosts
+from .results import ColumnBuilder
+from .results import lazy_rows
+from .results import split_converters
+from .stats import QueryStats
+from .stats import SlowQueryLog
+from .stats import column_bytes
+from .stats import result_bytes
+
 
 LOG = logging.getLogger('ZMySQLDA')
 
@@ -46,8 +79,15 @@ hosed_connection = {
 
 query_syntax_error = (ER.BAD_FIELD_ERROR,)
 
+# Statements whose plans are shown by ``EXPLAIN``
+explain_statements = frozenset(('SELECT', 'INSERT', 'REPLACE', 'UPDATE',
+                                'DELETE'))
+
 key_types = {'PRI': 'PRIMARY KEY', 'MUL': 'INDEX', 'UNI': 'UNIQUE'}
 
+schema_table_types = {'BASE TABLE': 'table', 'VIEW': 'view',
+                      'SYSTEM VIEW': 'system_table'}
+
 field_icons = 'bin', 'date', 'datetime', 'float', 'int', 'text', 'time'
 
 icon_xlate = {
@@ -85,11 +125,10 @@ type_xlate = {
 }
 
 
-def DateTime_or_None(s):
-    try:
-        return DateTime(s)
-    except DateTimeError:
-        return None
+def quote_identifier(name):
+    """ Quote a table or column name for use in a SQL statement.
+    """
+    return '`%s`' % name.replace('`', '``')
 
 
 class DBPool:
@@ -97,20 +136,59 @@ class DBPool:
       This class is an interface to the database connection..
       Its caracteristic is that an instance of this class interfaces multiple
       instanes of db_cls class, each one being bound to a specific thread.
+
+      If ``pool_max_size`` is set, the db_cls instances are shared instead:
+      a thread checks one out of a bounded pool when it first needs it and
+      returns it when its Zope transaction ends.
     """
 
     connected_timestamp = ''
+    # Settings of the Zope connection object the pool was made for
+    settings = None
     _create_db = False
     use_unicode = False
     charset = None
     timeout = None
+    pool_min_size = None
+    pool_max_size = None
+    pool_timeout = None
+    idle_timeout = None
+    max_lifetime = None
+    pool_warmup = 0
+    ping_interval = None
+    date_conversion = None
+    conv_profile = None
+    lazy_rows = False
+    batch_queries = False
+    local_infile = False
+    slow_query_time = None
+    explain_slow_queries = False
+    replica_strategy = None
+    replica_max_lag = None
+    parallel_queries = None
+    _result_cache = None
+    _schema_cache = None
+    _slow_log = None
+    _replicas = None
+    _writers = None
+    _parallel = None
+    _async = None
 
     def __init__(self, db_cls, create_db=False, use_unicode=False,
-                 charset=None, timeout=None):
+                 charset=None, timeout=None, pool_min_size=None,
+                 pool_max_size=None, pool_timeout=None, idle_timeout=None,
+                 max_lifetime=None, pool_warmup=None, ping_interval=None,
+                 result_cache_ttl=None, result_cache_size=None,
+                 schema_cache_ttl=None, date_conversion=None,
+                 conv_profile=None, lazy_rows=False, batch_queries=False,
+                 local_infile=False, slow_query_time=None,
+                 explain_slow_queries=False, replica_strategy=None,
+                 replica_max_lag=None, parallel_queries=None):
         """ Set transaction managed class for use in pool.
         """
         self._db_cls = db_cls
-        # pool of one db object/thread
+        # pool of one db object/thread, in shared pool mode only the
+        # db objects currently checked out, keyed by thread
         self._db_pool = {}
         self._db_lock = allocate_lock()
         # auto-create db if not present on server
@@ -118,8 +196,71 @@ class DBPool:
         # unicode settings
         self.use_unicode = use_unicode
         self.charset = charset
+        # conversion of result values
+        self.date_conversion = date_conversion or None
+        self.conv_profile = conv_profile or None
+        self.lazy_rows = bool(lazy_rows)
+        # send the statements of a query in one round trip
+        self.batch_queries = bool(batch_queries)
+        # allow LOAD DATA LOCAL INFILE
+        self.local_infile = bool(local_infile)
         # timeout setting
         self.timeout = int(timeout) if timeout else None
+        # shared pool settings, no maximum size means one db object/thread
+        self.pool_max_size = int(pool_max_size) if pool_max_size else None
+        if self.pool_max_size:
+            if pool_min_size in (None, ''):
+                pool_min_size = self.pool_max_size
+            self.pool_min_size = min(int(pool_min_size), self.pool_max_size)
+        self.pool_timeout = float(pool_timeout) if pool_timeout else None
+        # connections opened in advance when connecting
+        self.pool_warmup = int(pool_warmup) if pool_warmup else 0
+        # idle db objects, shared ones or warmed up spares
+        self._db_idle = []
+        self._db_count = 0
+        self._db_waiting = 0
+        self._db_available = threading.Condition(self._db_lock)
+        self._pool_stats = {'checkouts': 0, 'waits': 0, 'timeouts': 0,
+                            'wait_time': 0.0, 'max_wait_time': 0.0,
+                            'evicted': 0, 'recycled': 0}
+        # connection recycling settings, in seconds
+        self.idle_timeout = float(idle_timeout) if idle_timeout else None
+        self.max_lifetime = float(max_lifetime) if max_lifetime else None
+        limits = [x for x in (self.idle_timeout, self.max_lifetime) if x]
+        self._eviction_interval = max(min(limits) / 2, 1.0) if limits else 0
+        self._next_eviction = 0.0
+        # health check setting, no interval means ping on every transaction
+        if ping_interval in (None, ''):
+            self.ping_interval = None
+        else:
+            self.ping_interval = float(ping_interval)
+        # counters shared by all db objects of this pool
+        self._db_stats = {'pings': 0, 'pings_skipped': 0, 'reconnects': 0}
+        self._stats_lock = allocate_lock()
+        # query result cache shared by all db objects, size in megabytes
+        if result_cache_ttl:
+            max_size = float(result_cache_size or 16) * 1024 * 1024
+            self._result_cache = ResultCache(ttl=float(result_cache_ttl),
+                                             max_size=max_size)
+        # table and column metadata cache shared by all db objects
+        if schema_cache_ttl:
+            self._schema_cache = SchemaCache(ttl=float(schema_cache_ttl))
+        # query timing shared by all db objects
+        self._query_stats = QueryStats()
+        # log of queries slower than this many seconds
+        self.slow_query_time = (float(slow_query_time)
+                                if slow_query_time else None)
+        self.explain_slow_queries = bool(explain_slow_queries)
+        if self.slow_query_time:
+            self._slow_log = SlowQueryLog(self.slow_query_time,
+                                          explain=self.explain_slow_queries)
+        # choice of read replicas and their maximum replication lag
+        self.replica_strategy = replica_strategy or None
+        self.replica_max_lag = (float(replica_max_lag)
+                                if replica_max_lag else None)
+        # number of queries run at once by ``query_parallel``
+        self.parallel_queries = (int(parallel_queries)
+                                 if parallel_queries else None)
 
     def __call__(self, connection):
         """ Parse the connection string.
@@ -130,19 +271,28 @@ class DBPool:
             Create database if option is enabled and database doesn't exist.
         """
         self.connection = connection
-        db_flags = self._db_cls._parse_connection_string(connection,
-                                                         self.use_unicode,
-                                                         charset=self.charset,
-                                                         timeout=self.timeout)
+        db_flags = self._db_cls._parse_connection_string(
+            connection, self.use_unicode, charset=self.charset,
+            timeout=self.timeout, date_conversion=self.date_conversion,
+            conv_profile=self.conv_profile, local_infile=self.local_infile)
         self._db_flags = db_flags
+        if db_flags.get('writers'):
+            # all connections follow the primary if it changes
+            self._writers = Writers(db_flags['writers'])
+            db_flags['writers'] = self._writers
 
         # connect to server to determin tranasactional capabilities
         # can't use db_cls instance as it requires this information to work
         try:
-            connection = MySQLdb.connect(**db_flags['kw_args'])
+            if self._writers is None:
+                connection = MySQLdb.connect(**db_flags['kw_args'])
+            else:
+                connection = self._writers.connect(db_flags['kw_args'])[0]
         except OperationalError:
             if self._create_db:
                 kw_args = db_flags.get('kw_args', {}).copy()
+                if self._writers is not None:
+                    kw_args = self._writers.kw_args(kw_args)
                 db = kw_args.pop('db', None)
                 if not db:
                     raise
@@ -169,6 +319,34 @@ class DBPool:
         del db_flags['try_transactions']
         if transactional or db_flags['mysql_lock']:
             db_flags['use_TM'] = True
+        db_flags['ping_interval'] = self.ping_interval
+        db_flags['stats'] = self._db_stats
+        db_flags['stats_lock'] = self._stats_lock
+        db_flags['result_cache'] = self._result_cache
+        db_flags['lazy_rows'] = self.lazy_rows
+        db_flags['batch_queries'] = self.batch_queries
+        db_flags['query_stats'] = self._query_stats
+        db_flags['slow_log'] = self._slow_log
+        if db_flags.get('replicas'):
+            # reads outside of writing transactions go to the replicas
+            self._replicas = ReplicaPool(self._db_cls, db_flags,
+                                         db_flags['replicas'],
+                                         strategy=self.replica_strategy,
+                                         max_lag=self.replica_max_lag)
+            db_flags['replicas'] = self._replicas
+            self._replicas.start()
+        # connections outside of the shared pool count against its size
+        slots = self if self.pool_max_size else None
+        self._parallel = ParallelQueries(self._db_cls, db_flags,
+                                         self.parallel_queries, slots=slots)
+        self._async = AsyncPool(self._db_cls, db_flags,
+                                self.pool_max_size or self.parallel_queries,
+                                expired=self._expired,
+                                ping_interval=self.ping_interval,
+                                slots=slots)
+
+        if self.pool_warmup:
+            self._warm_up()
 
         # will not be 100% accurate in regard to per thread connections
         # but as close as we're going to get it.
@@ -178,6 +356,35 @@ class DBPool:
         # (assigned to _v_database_connection)
         return self
 
+    def _warm_up(self):
+        """ Open ``pool_warmup`` db objects in advance so the first requests
+            after a restart don't have to wait for a connection.
+
+            They become the idle connections of the shared pool or, in one db
+            object/thread mode, are handed to threads without a connection.
+            Warm-up stops at the first connection failure.
+        """
+        for i in range(self.pool_warmup):
+            with self._db_available:
+                if self.pool_max_size:
+                    if self._db_count >= self.pool_max_size:
+                        break
+                    self._db_count += 1
+            try:
+                db = self._db_cls(**self._db_flags)
+            except Exception:
+                LOG.warning('Connection pool warm-up stopped after %d '
+                            'connections' % i, exc_info=True)
+                if self.pool_max_size:
+                    with self._db_available:
+                        self._db_count -= 1
+                break
+            if self.pool_max_size:
+                db._pool = self
+            with self._db_available:
+                self._db_idle.append(db)
+                self._db_available.notify()
+
     def closeConnection(self):
         """ Close this threads connection. Used when DA is being reused
             but the connection string has changed. Need to close the db_cls
@@ -187,16 +394,29 @@ class DBPool:
         """
         ident = get_ident()
         try:
-            self._pool_del(ident)
+            db = self._pool_del(ident)
         except KeyError:
             pass
+        else:
+            if self.pool_max_size:
+                self._discard(db)
 
     def close(self):
         """ Used when manually closing the database. Resetting the pool
             dereferences the db_cls instances where they are then collected
             and closed.
         """
-        self._db_pool = {}
+        with self._db_available:
+            self._db_pool = {}
+            self._db_idle = []
+            self._db_count = 0
+            self._db_available.notify_all()
+        if self._replicas is not None:
+            self._replicas.close()
+        if self._parallel is not None:
+            self._parallel.close()
+        if self._async is not None:
+            self._async.close()
 
     def _pool_set(self, key, value):
         """ Add a db to pool.
@@ -217,10 +437,311 @@ class DBPool:
         """
         self._db_lock.acquire()
         try:
-            del self._db_pool[key]
+            return self._db_pool.pop(key)
         finally:
             self._db_lock.release()
 
+    def _checkout(self, ident):
+        """ Check a db out of the shared pool for thread ``ident``.
+
+            A thread keeps the same db until it is checked in again. If all
+            ``pool_max_size`` db objects are in use, wait at most
+            ``pool_timeout`` seconds for one to be returned.
+        """
+        with self._db_available:
+            db = self._db_pool.get(ident)
+            if db is not None:
+                return db
+
+            self._wait_available()
+            self._pool_stats['checkouts'] += 1
+
+            if self._db_idle:
+                db = self._db_idle.pop()
+                self._db_pool[ident] = db
+                db._pool_ident = ident
+            else:
+                # Reserve the slot before connecting outside of the lock
+                self._db_count += 1
+
+        if db is not None:
+            try:
+                self._recycle(db)
+            except Exception:
+                self._pool_del(ident)
+                self._discard(db)
+                raise
+            return db
+
+        try:
+            db = self._db_cls(**self._db_flags)
+        except Exception:
+            with self._db_available:
+                self._db_count -= 1
+                self._db_available.notify()
+            raise
+
+        db._pool = self
+        db._pool_ident = ident
+        self._pool_set(ident, db)
+        return db
+
+    def _wait_available(self):
+        """ Wait until an idle db or a free slot is available in the shared
+            pool, at most ``pool_timeout`` seconds. Called with the pool
+            lock held.
+        """
+        started = None
+        while not self._db_idle and self._db_count >= self.pool_max_size:
+            remaining = None
+            if started is None:
+                started = time.monotonic()
+                self._pool_stats['waits'] += 1
+            if self.pool_timeout:
+                remaining = self.pool_timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._pool_stats['timeouts'] += 1
+                    raise OperationalError(
+                        'Connection pool exhausted, no connection '
+                        'available after %.1f seconds' % self.pool_timeout)
+            self._db_waiting += 1
+            try:
+                self._db_available.wait(remaining)
+            finally:
+                self._db_waiting -= 1
+
+        if started is not None:
+            waited = time.monotonic() - started
+            self._pool_stats['wait_time'] += waited
+            self._pool_stats['max_wait_time'] = max(
+                waited, self._pool_stats['max_wait_time'])
+
+    def _reserve(self):
+        """ Take a slot of the shared pool for a connection opened outside
+            of it, like the ones of ``query_parallel`` and ``query_async``.
+
+            Waits for a slot like ``_checkout``. If only idle db objects are
+            left, one of them is closed to free its slot. ``_release``
+            returns the slot.
+        """
+        with self._db_available:
+            self._wait_available()
+            if self._db_count < self.pool_max_size:
+                self._db_count += 1
+                return
+            db = self._db_idle.pop()
+            self._pool_stats['evicted'] += 1
+        db._pool = None
+        db.close()
+
+    def _release(self):
+        """ Free a slot of the shared pool.
+        """
+        with self._db_available:
+            self._db_count = max(self._db_count - 1, 0)
+            self._db_available.notify()
+
+    def _checkin(self, db):
+        """ Return a db checked out with ``_checkout`` to the shared pool.
+
+            Connections beyond ``pool_min_size`` are closed unless another
+            thread is waiting for one.
+        """
+        db._close_stream()
+        with self._db_available:
+            if self._db_pool.get(db._pool_ident) is not db:
+                return  # already checked in or pool was closed
+            del self._db_pool[db._pool_ident]
+            db._pool_ident = None
+            if self._expired(db, time.monotonic()):
+                self._pool_stats['evicted'] += 1
+            elif self._db_waiting or len(self._db_idle) < self.pool_min_size:
+                self._db_idle.append(db)
+                self._db_available.notify()
+                return
+        self._discard(db)
+
+    def _discard(self, db):
+        """ Close a db from the shared pool and free its slot.
+        """
+        self._release()
+        db._pool = None
+        db.close()
+
+    def _spare(self):
+        """ Return a warmed up db object for a thread without one, if any.
+        """
+        with self._db_available:
+            if not self._db_idle:
+                return None
+            db = self._db_idle.pop()
+        if self._eviction_interval:
+            self._recycle(db)
+        return db
+
+    def _expired(self, db, now):
+        """ Return the reason why ``db`` is due for recycling, if it is.
+        """
+        if self.max_lifetime and now - db._created > self.max_lifetime:
+            return 'maximum lifetime exceeded'
+        if self.idle_timeout and now - db._last_used > self.idle_timeout:
+            return 'idle timeout exceeded'
+        return None
+
+    def _recycle(self, db):
+        """ Reconnect ``db`` before use if it went stale.
+
+            Connections that joined a Zope transaction or are reading a
+            result stream are left alone.
+        """
+        if db._registered or db._stream_ref is not None:
+            return
+        reason = self._expired(db, time.monotonic())
+        if reason:
+            db._forceReconnection(reason=reason)
+            self._pool_stats['recycled'] += 1
+
+    def _evict_expired(self):
+        """ Close connections nobody is using that have been idle for longer
+            than ``idle_timeout`` or are older than ``max_lifetime``.
+
+            These are the idle pooled or warmed up connections and, in one db
+            object/thread mode, the connections of finished threads. Runs at
+            most every ``_eviction_interval`` seconds.
+        """
+        now = time.monotonic()
+        if now < self._next_eviction:
+            return
+        self._next_eviction = now + self._eviction_interval
+
+        expired = []
+        with self._db_available:
+            idle = []
+            for db in self._db_idle:
+                if self._expired(db, now):
+                    expired.append(db)
+                else:
+                    idle.append(db)
+            self._db_idle = idle
+            if not self.pool_max_size:
+                alive = {thread.ident for thread in threading.enumerate()}
+                for ident, db in list(self._db_pool.items()):
+                    if ident not in alive and self._expired(db, now):
+                        expired.append(self._db_pool.pop(ident))
+            self._pool_stats['evicted'] += len(expired)
+
+        for db in expired:
+            if self.pool_max_size:
+                self._discard(db)
+            else:
+                db.close()
+
+    def pool_stats(self):
+        """ Return pool size, checkout wait time and health check statistics.
+        """
+        with self._stats_lock:
+            db_stats = dict(self._db_stats)
+        with self._db_available:
+            stats = dict(self._pool_stats,
+                         **db_stats,
+                         size=self._db_count if self.pool_max_size
+                         else len(self._db_pool) + len(self._db_idle),
+                         idle=len(self._db_idle),
+                         in_use=len(self._db_pool),
+                         waiting=self._db_waiting,
+                         min_size=self.pool_min_size,
+                         max_size=self.pool_max_size)
+        if stats['waits']:
+            stats['mean_wait_time'] = stats['wait_time'] / stats['waits']
+        else:
+            stats['mean_wait_time'] = 0.0
+        return stats
+
+    def replica_stats(self):
+        """ Return the number of reads, connections, replication lag and
+            health of each replica.
+
+            An empty list is returned if there are no replicas.
+        """
+        if self._replicas is None:
+            return []
+        return self._replicas.stats()
+
+    def writer_stats(self):
+        """ Return the current primary, its candidates and how often it
+            changed.
+
+            An empty mapping is returned if there is only one primary.
+        """
+        if self._writers is None:
+            return {}
+        return self._writers.stats()
+
+    def cache_stats(self):
+        """ Return result cache hit, miss and size statistics.
+
+            An empty mapping is returned if the result cache is disabled.
+        """
+        if self._result_cache is None:
+            return {}
+        return self._result_cache.stats()
+
+    def schema_cache_stats(self):
+        """ Return schema metadata cache hit, miss and invalidation
+            statistics.
+
+            An empty mapping is returned if the schema cache is disabled.
+        """
+        if self._schema_cache is None:
+            return {}
+        return self._schema_cache.stats()
+
+    def query_stats(self):
+        """ Return query and statement timing, row and byte statistics.
+        """
+        return self._query_stats.stats()
+
+    def top_queries(self, limit=20, order='total'):
+        """ Return the statistics of the ``limit`` query fingerprints with
+        the most total time, or the highest ``count``, ``mean``, ``p95``,
+        ``max``, ``rows`` or ``errors``.
+        """
+        return self._query_stats.top(limit, order)
+
+    def reset_query_stats(self):
+        """ Forget the recorded query statistics.
+        """
+        self._query_stats.reset()
+
+    def slow_queries(self):
+        """ Return the most recent slow queries, the latest first.
+
+            An empty list is returned if the slow query log is disabled.
+        """
+        if self._slow_log is None:
+            return []
+        return self._slow_log.entries()
+
+    def clear_slow_queries(self):
+        """ Empty the slow query log.
+        """
+        if self._slow_log is not None:
+            self._slow_log.clear()
+
+    def clear_cache(self):
+        """ Drop all cached query results and schema metadata.
+        """
+        if self._result_cache is not None:
+            self._result_cache.clear()
+        if self._schema_cache is not None:
+            self._schema_cache.clear()
+
+    def clear_schema_cache(self, table_name=None):
+        """ Drop cached metadata of ``table_name``, or of all tables.
+        """
+        if self._schema_cache is not None:
+            self._schema_cache.invalidate(table_name)
+
     def name(self):
         """ Return name of database connected to.
         """
@@ -231,14 +752,52 @@ class DBPool:
         return self._access_db(method_id='variables', args=args, kw=kw)
 
     def tables(self, *args, **kw):
-        return self._access_db(method_id='tables', args=args, kw=kw)
+        return self._cached_schema(None, 'tables', args, kw)
 
-    def columns(self, *args, **kw):
-        return self._access_db(method_id='columns', args=args, kw=kw)
+    def columns(self, table_name, *args, **kw):
+        return self._cached_schema(table_name, 'columns',
+                                   (table_name,) + args, kw)
+
+    def schema(self, *args, **kw):
+        return self._cached_schema(None, 'schema', args, kw)
 
     def query(self, *args, **kw):
         return self._access_db(method_id='query', args=args, kw=kw)
 
+    def query_parallel(self, queries, max_rows=1000):
+        """ Run ``queries`` concurrently on connections of their own.
+
+            Returns the ``(items, rows)`` results in the order of
+            ``queries``, None for failed queries, and a mapping of the index
+            of each failed query to its error.
+        """
+        return self._parallel.query(queries, max_rows)
+
+    async def query_async(self, sql_string, max_rows=1000):
+        """ Run ``sql_string`` from a coroutine and return
+            ``(items, rows)`` like ``query``.
+
+            The event loop keeps running while the server works on the
+            query. The query uses a connection in autocommit mode outside of
+            any Zope transaction.
+        """
+        return await self._async.query(sql_string, max_rows)
+
+    def query_stream(self, *args, **kw):
+        return self._access_db(method_id='query_stream', args=args, kw=kw)
+
+    def query_prepared(self, *args, **kw):
+        return self._access_db(method_id='query_prepared', args=args, kw=kw)
+
+    def query_columns(self, *args, **kw):
+        return self._access_db(method_id='query_columns', args=args, kw=kw)
+
+    def bulk_insert(self, *args, **kw):
+        return self._access_db(method_id='bulk_insert', args=args, kw=kw)
+
+    def load_data(self, *args, **kw):
+        return self._access_db(method_id='load_data', args=args, kw=kw)
+
     def string_literal(self, *args, **kw):
         return self._access_db(method_id='string_literal', args=args, kw=kw)
 
@@ -256,17 +815,62 @@ class DBPool:
             return self._access_db(method_id='string_literal',
                                    args=new_args, kw=kw)
 
+    def _cached_schema(self, table_name, method_id, args, kw):
+        """ Call the schema introspection method ``method_id``, using the
+            schema cache if it is enabled.
+
+            Copies are returned so callers cannot change cached values.
+        """
+        if self._schema_cache is None:
+            return self._access_db(method_id=method_id, args=args, kw=kw)
+
+        def compute():
+            return self._access_db(method_id=method_id, args=args, kw=kw)
+
+        def stamps():
+            return self._access_db(method_id='schema_stamps', args=(), kw={})
+
+        key = (method_id, args, tuple(sorted(kw.items())))
+        value = self._schema_cache.get(key, table_name, compute, stamps)
+        return copy.deepcopy(value)
+
     def _access_db(self, method_id, args, kw):
         """
           Generic method to call pooled objects' methods.
           When the current thread had never issued any call, create a db_cls
           instance.
+
+          In shared pool mode the db is checked out for the call and given
+          back right away unless it joined a Zope transaction or is reading
+          a result stream, in which case it is returned when the
+          transaction ends or the stream is closed.
+
+          A result stream the thread left open on its db is drained and
+          closed before the db is used for the next call.
         """
         ident = get_ident()
+        if self._eviction_interval:
+            self._evict_expired()
+
+        if self.pool_max_size:
+            db = self._checkout(ident)
+            try:
+                db._close_stream()
+                return getattr(db, method_id)(*args, **kw)
+            finally:
+                if not db._registered and db._stream_ref is None:
+                    self._checkin(db)
+
         db = self._pool_get(ident)
         if db is None:
-            db = self._db_cls(**self._db_flags)
+            db = self._spare()
+            if db is None:
+                db = self._db_cls(**self._db_flags)
             self._pool_set(ident, db)
+        else:
+            db._close_stream()
+            if self._eviction_interval:
+                self._recycle(db)
         return getattr(db, method_id)(*args, **kw)
 
 
@@ -299,20 +903,88 @@ class DB(TM):
     conv[FIELD_TYPE.NEWDECIMAL] = float
     del conv[FIELD_TYPE.TIME]
 
+    # Conversion profiles selectable by name, ``legacy`` means ``conv``
+    conv_profiles = {
+        # MySQLdb defaults: int, Decimal, date, datetime and timedelta
+        'native': conversions.copy(),
+        # ``conv`` with DECIMAL values as exact Decimal instead of float
+        'decimal': {**conv,
+                    FIELD_TYPE.DECIMAL: conversions[FIELD_TYPE.DECIMAL],
+                    FIELD_TYPE.NEWDECIMAL: conversions[FIELD_TYPE.NEWDECIMAL]},
+        # No conversion of result values, they are returned as strings.
+        # The encoders for query parameters are kept.
+        'raw': {key: value for key, value in conversions.items()
+                if not isinstance(key, int)},
+    }
+
+    # Converters for DATE and DATETIME values selectable by name
+    date_conversions = {
+        'legacy': DateTime_or_None,
+        'fast': fast_DateTime_or_None,
+        'native': datetime_or_None,
+    }
+
     _p_oid = _p_changed = None
     _sort_key = '1'
     _registered = False
     _finalize = False
+    _pool = None
+    _pool_ident = None
+    _created = 0.0
+    _last_used = 0.0
+    _query_failed = False
+    _stream_ref = None
+    _prepared_count = 0
+    _result_cache = None
+    _transaction_begun = False
+    _lazy_rows = False
+    _lazy_conv = None
+    _batch_queries = False
+    _max_packet = None
+    _query_stats = None
+    _slow_log = None
+    _replicas = None
+    _transaction_wrote = False
+    _last_write = None
+    _writers = None
+    _writer_generation = 0
+
+    # Bytes of ``max_allowed_packet`` not used by ``bulk_insert`` statements
+    packet_reserve = 1024
+
+    # Maximum number of server-side prepared statements kept per connection
+    prepared_cache_size = 32
+
+    # Seconds reads stay on the primary after a change made outside of a
+    # transaction or after a transaction with changes has committed, so
+    # they see it although the replicas lag behind
+    read_your_writes = 5.0
 
     unicode_charset = 'utf8'  # hardcoded for now
 
     def __init__(self, connection=None, kw_args=None, use_TM=None,
-                 mysql_lock=None, transactions=None):
+                 mysql_lock=None, transactions=None, ping_interval=None,
+                 stats=None, result_cache=None, lazy_rows=False,
+                 batch_queries=False, query_stats=None, slow_log=None,
+                 replicas=None, writers=None, stats_lock=None):
         self.connection = connection  # backwards compat
         self._kw_args = kw_args
         self._mysql_lock = mysql_lock
         self._use_TM = use_TM
         self._transactions = transactions
+        self._ping_interval = ping_interval
+        self._stats = stats if stats is not None else {}
+        # guards ``stats``, which all db objects of the pool update
+        self._stats_lock = stats_lock or allocate_lock()
+        self._result_cache = result_cache
+        # tables changed by the current transaction
+        self._written_tables = set()
+        self._batch_queries = batch_queries
+        self._query_stats = query_stats
+        self._slow_log = slow_log
+        self._replicas = replicas
+        self._writers = writers
+        self._lazy_rows = lazy_rows
         self._forceReconnection()
 
     def close(self):
@@ -336,13 +1008,24 @@ class DB(TM):
                     reason])
             else:
                 LOG.debug('Forcing reconnection, reason: %s.' % reason)
+            self._count('reconnects')
 
         try:  # try to clean up first
             self.db.close()
         except Exception:
             pass
 
-        self.db = MySQLdb.connect(**self._kw_args)
+        # Prepared statements only live as long as the server session
+        self._prepared = OrderedDict()
+        if self._writers is None:
+            self.db = MySQLdb.connect(**self._kw_args)
+        else:
+            self.db, self._writer_generation = self._writers.connect(
+                self._kw_args)
+        self._created = self._last_used = time.monotonic()
+        if self._lazy_rows:
+            # converters for ``query`` results, applied on first access
+            self._lazy_conv = self._lazy_converters()
         # Calling ``ping`` to verify that the connection works and passing
         # ``True`` to enable the automatic reconnection feature.
         # The MySQL/MariaDB client library supports automatic reconnections if
@@ -352,17 +1035,59 @@ class DB(TM):
         # Future versions of this package will disable it.
         self.db.ping(True)
 
+    def _lazy_converters(self):
+        """ Split the conversion mapping of the connection for reading lazy
+        rows.
+
+        Decoders the connection has set up itself, like the ones of the
+        text types with ``use_unicode``, are kept for reading the result.
+        """
+        conv = self._kw_args['conv']
+        fetch_conv, deferred = split_converters(conv)
+        for key, value in self.db.converter.items():
+            if conv.get(key) is not value:
+                fetch_conv[key] = value
+                deferred.pop(key, None)
+        return fetch_conv, deferred
+
     @classmethod
     def _parse_connection_string(cls, connection, use_unicode=False,
-                                 charset=None, timeout=None):
+                                 charset=None, timeout=None,
+                                 date_conversion=None, conv_profile=None,
+                                 local_infile=False):
         """ Done as a class method to both allow access to class attribute
             conv (conversion) settings while allowing for wrapping pool class
             use of this method. The former is important to allow for subclasses
             to override the conv settings while the latter is important so
             the connection string doesn't have to be parsed for each instance
             in the pool.
+
+            ``conv_profile`` names one of the ``conv_profiles`` to use
+            instead of ``conv``. ``date_conversion`` names one of the
+            ``date_conversions`` to use for DATE and DATETIME values.
+            ``local_infile`` enables ``LOAD DATA LOCAL INFILE``.
+
+            Read replicas listed after the host are returned as list of
+            ``host``, ``port`` and ``weight`` mappings under ``replicas``.
+            If several hosts are given, they are returned the same way under
+            ``writers`` as candidates for the primary server.
         """
-        kw_args = {'conv': cls.conv}
+        conv = cls.conv
+        if conv_profile and conv_profile != 'legacy':
+            try:
+                conv = cls.conv_profiles[conv_profile]
+            except KeyError:
+                raise ValueError('Unknown conversion profile %s' %
+                                 conv_profile)
+        if date_conversion:
+            try:
+                converter = cls.date_conversions[date_conversion]
+            except KeyError:
+                raise ValueError('Unknown date conversion %s' %
+                                 date_conversion)
+            conv = conv.copy()
+            conv[FIELD_TYPE.DATETIME] = conv[FIELD_TYPE.DATE] = converter
+        kw_args = {'conv': conv}
         flags = {'kw_args': kw_args, 'connection': connection}
         kw_args['use_unicode'] = use_unicode
         if use_unicode:
@@ -371,8 +1096,8 @@ class DB(TM):
             kw_args['charset'] = charset
         items = connection.split()
         flags['use_TM'] = None
-        if _mysql.get_client_info()[0] >= '5':
-            kw_args['client_flag'] = CLIENT.MULTI_STATEMENTS
+        # All client libraries mysqlclient builds with support this
+        kw_args['client_flag'] = CLIENT.MULTI_STATEMENTS
         if items:
             lockreq, items = items[0], items[1:]
             if lockreq[0] == '*':
@@ -382,9 +1107,15 @@ class DB(TM):
             else:
                 flags['mysql_lock'] = None
                 db_host = lockreq
+            if '/' in db_host:
+                db_host, replicas = db_host.split('/', 1)
+                flags['replicas'] = parse_hosts(replicas)
             if '@' in db_host:
                 db, host = db_host.split('@', 1)
                 kw_args['db'] = db
+                if ',' in host:
+                    flags['writers'] = parse_hosts(host)
+                    host = host.split(',', 1)[0]
                 if ':' in host:
                     host, port = host.split(':', 1)
                     kw_args['port'] = int(port)
@@ -406,6 +1137,8 @@ class DB(TM):
                 kw_args['unix_socket'], items = items[0], items[1:]
         if timeout:
             kw_args['connect_timeout'] = timeout
+        if local_infile:
+            kw_args['local_infile'] = 1
 
         return flags
 
@@ -414,30 +1147,16 @@ class DB(TM):
         """
         t_list = []
         db_result = self._query('SHOW TABLE STATUS')
-        charset = self._kw_args.get('charset', 'UTF-8')
-        if charset.startswith('utf8'):
-            charset = 'UTF-8'
+        charset = self._decode_charset()
 
         for row in db_result.fetch_row(0):
-            variables = {}
-            for index, key in ((0, 't_name'), (1, 't_engine'), (4, 't_size'),
-                               (14, 't_cs')):
-                value = row[index]
-                if isinstance(value, bytes):
-                    value = value.decode(charset)
-                variables[key] = value
-
-            description = ('%(t_engine)s, %(t_size)s rows, '
-                           'character set/collation %(t_cs)s' % variables)
-            t_list.append({'table_name': variables['t_name'],
-                           'table_type': 'table',
-                           'description': description})
+            t_list.append(self._table_info(
+                [row[index] for index in (0, 1, 4, 14)], charset))
         return t_list
 
     def columns(self, table_name):
         """ Returns list of column descriptions for ``table_name``.
         """
-        c_list = []
         try:
             # Field, Type, Null, Key, Default, Extra
             db_result = self._query('SHOW COLUMNS FROM %s' % table_name)
@@ -446,73 +1165,150 @@ class DB(TM):
             LOG.warning('columns query for non-existing table %s' % table_name)
             return ()
 
+        charset = self._decode_charset()
+        return [self._column_info(row, charset)
+                for row in db_result.fetch_row(0)]
+
+    def schema(self):
+        """ Returns list of tables with their column descriptions under
+        the ``columns`` key.
+
+        All tables and columns are read with two ``information_schema``
+        queries instead of one ``SHOW COLUMNS`` per table.
+        """
+        charset = self._decode_charset()
+        db_result = self._query(
+            'SELECT TABLE_NAME, ENGINE, TABLE_ROWS, TABLE_COLLATION, '
+            'TABLE_TYPE FROM information_schema.TABLES '
+            'WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME')
+        t_list = []
+        t_columns = {}
+        for row in db_result.fetch_row(0):
+            t_info = self._table_info(row[:4], charset)
+            table_type = row[4]
+            if isinstance(table_type, bytes):
+                table_type = table_type.decode(charset)
+            t_info['table_type'] = schema_table_types.get(table_type, 'table')
+            t_info['columns'] = t_columns[t_info['table_name']] = []
+            t_list.append(t_info)
+
+        db_result = self._query(
+            'SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, '
+            'COLUMN_KEY, COLUMN_DEFAULT, EXTRA '
+            'FROM information_schema.COLUMNS '
+            'WHERE TABLE_SCHEMA = DATABASE() '
+            'ORDER BY TABLE_NAME, ORDINAL_POSITION')
+        for row in db_result.fetch_row(0):
+            table_name = row[0]
+            if isinstance(table_name, bytes):
+                table_name = table_name.decode(charset)
+            if table_name in t_columns:
+                t_columns[table_name].append(
+                    self._column_info(row[1:], charset))
+        return t_list
+
+    def _decode_charset(self):
+        """ Return the codec for decoding byte strings from the server.
+        """
         charset = self._kw_args.get('charset', 'UTF-8')
         if charset.startswith('utf8'):
             charset = 'UTF-8'
+        return charset
 
-        for Field, Type, Null, Key, Default, Extra in db_result.fetch_row(0):
-
-            # Force-decoding to make the Browse ZMI tab work across
-            # all supported Python versions
-            if isinstance(Field, bytes):
-                Field = Field.decode(charset)
-            if isinstance(Type, bytes):
-                Type = Type.decode(charset)
-            if isinstance(Null, bytes):
-                Null = Null.decode(charset)
-            if isinstance(Key, bytes):
-                Key = Key.decode(charset)
-            if isinstance(Default, bytes):
-                Default = Default.decode(charset)
-            if isinstance(Extra, bytes):
-                Extra = Extra.decode(charset)
-
-            info = {'name': Field,
-                    'extra': (Extra,),
-                    'nullable': (Null == 'YES') and 1 or 0}
-
-            if Default is not None:
-                info['default'] = Default
-                field_default = "DEFAULT '%s'" % Default
-            else:
-                field_default = ''
-
-            if '(' in Type:
-                end = Type.rfind(')')
-                short_type, size = Type[:end].split('(', 1)
-                if short_type not in ('set', 'enum'):
-                    if ',' in size:
-                        info['scale'], info['precision'] = map(
-                            int, size.split(',', 1))
-                    else:
-                        info['scale'] = int(size)
-            else:
-                short_type = Type
+    def _table_info(self, row, charset):
+        """ Build a table description from its name, storage engine,
+        number of rows and collation.
+        """
+        variables = {}
+        for key, value in zip(('t_name', 't_engine', 't_size', 't_cs'), row):
+            if isinstance(value, bytes):
+                value = value.decode(charset)
+            variables[key] = value
+
+        description = ('%(t_engine)s, %(t_size)s rows, '
+                       'character set/collation %(t_cs)s' % variables)
+        return {'table_name': variables['t_name'],
+                'table_type': 'table',
+                'description': description}
+
+    def _column_info(self, row, charset):
+        """ Build a column description from a ``SHOW COLUMNS`` result row.
+        """
+        Field, Type, Null, Key, Default, Extra = row
+
+        # Force-decoding to make the Browse ZMI tab work across
+        # all supported Python versions
+        if isinstance(Field, bytes):
+            Field = Field.decode(charset)
+        if isinstance(Type, bytes):
+            Type = Type.decode(charset)
+        if isinstance(Null, bytes):
+            Null = Null.decode(charset)
+        if isinstance(Key, bytes):
+            Key = Key.decode(charset)
+        if isinstance(Default, bytes):
+            Default = Default.decode(charset)
+        if isinstance(Extra, bytes):
+            Extra = Extra.decode(charset)
+
+        info = {'name': Field,
+                'extra': (Extra,),
+                'nullable': (Null == 'YES') and 1 or 0}
+
+        if Default is not None:
+            info['default'] = Default
+            field_default = "DEFAULT '%s'" % Default
+        else:
+            field_default = ''
+
+        if '(' in Type:
+            end = Type.rfind(')')
+            short_type, size = Type[:end].split('(', 1)
+            if short_type not in ('set', 'enum'):
+                if ',' in size:
+                    info['scale'], info['precision'] = map(
+                        int, size.split(',', 1))
+                else:
+                    info['scale'] = int(size)
+        else:
+            short_type = Type
 
-            if short_type in field_icons:
-                info['icon'] = short_type
-            else:
-                info['icon'] = icon_xlate.get(short_type, 'what')
-
-            info['type'] = short_type
-            nul = (Null == 'NO' and 'NOT NULL' or '')
-            info['description'] = ' '.join([Type,
-                                            field_default,
-                                            Extra or '',
-                                            key_types.get(Key, Key or ''),
-                                            nul])
-            if Key:
-                info['index'] = True
-                info['key'] = Key
-            if Key == 'PRI':
-                info['primary_key'] = True
-                info['unique'] = True
-            elif Key == 'UNI':
-                info['unique'] = True
-
-            c_list.append(info)
-
-        return c_list
+        if short_type in field_icons:
+            info['icon'] = short_type
+        else:
+            info['icon'] = icon_xlate.get(short_type, 'what')
+
+        info['type'] = short_type
+        nul = (Null == 'NO' and 'NOT NULL' or '')
+        info['description'] = ' '.join([Type,
+                                        field_default,
+                                        Extra or '',
+                                        key_types.get(Key, Key or ''),
+                                        nul])
+        if Key:
+            info['index'] = True
+            info['key'] = Key
+        if Key == 'PRI':
+            info['primary_key'] = True
+            info['unique'] = True
+        elif Key == 'UNI':
+            info['unique'] = True
+
+        return info
+
+    def schema_stamps(self):
+        """ Return the creation and update times of all tables in the
+        current database, keyed by lowercased table name.
+        """
+        db_result = self._query('SELECT TABLE_NAME, CREATE_TIME, UPDATE_TIME '
+                                'FROM information_schema.TABLES '
+                                'WHERE TABLE_SCHEMA = DATABASE()')
+        stamps = {}
+        for name, created, updated in db_result.fetch_row(0):
+            if isinstance(name, bytes):
+                name = name.decode('UTF-8')
+            stamps[name.lower()] = (created, updated)
+        return stamps
 
     def variables(self):
         """ Return dictionary of current mysql variable/values.
@@ -521,7 +1317,8 @@ class DB(TM):
         variables = self._query('SHOW VARIABLES')
         return {name: value for name, value in variables.fetch_row(0)}
 
-    def _query(self, query, force_reconnect=False):
+    def _query(self, query, force_reconnect=False, unbuffered=False,
+               converter=None):
         """
           Send a query to MySQL server.
           It reconnects automaticaly if needed and the following conditions are
@@ -531,7 +1328,23 @@ class DB(TM):
            - This conection is not transactionnal and has set no MySQL locks,
              because they are bound to the connection. This check can be
              overridden by passing force_reconnect with True value.
+          With ``unbuffered`` the result rows are left on the server to be
+          read with ``fetch_row`` instead of being transferred right away.
+          ``converter`` replaces the conversion mapping of the connection
+          for reading the result.
+          The time until the result is read is recorded as statement time.
+          If the primary server has changed, the connection is moved to the
+          new one before a transaction begins. Statements refused by a
+          read-only server make the pool look for a new primary.
         """
+        if self._stream_ref is not None:
+            raise ProgrammingError('Connection is busy reading the rows of '
+                                   'an unfinished result stream.')
+        if not self._transaction_begun and self._writer_moved():
+            self._forceReconnection(reason='primary changed')
+        self._last_used = time.monotonic()
+        self._query_failed = True
+        start = time.perf_counter()
         try:
             self.db.query(query)
         except OperationalError as exc:
@@ -539,19 +1352,29 @@ class DB(TM):
                 raise OperationalError(exc.args[0],
                                        f'{exc.args[1]}: {query}')
 
-            if not force_reconnect and \
-               (self._mysql_lock or self._transactions) or \
-               exc.args[0] not in hosed_connection:
+            if exc.args[0] == ER.OPTION_PREVENTS_STATEMENT and \
+               self._writers is not None and \
+               self._writers.find(self._kw_args, self._writer_generation):
+                # The server has been demoted to a read-only replica
+                self._forceReconnection(reason='primary changed')
+                if not force_reconnect and \
+                   (self._mysql_lock or self._transactions):
+                    raise ConflictError('Database primary changed, '
+                                        'retry the transaction')
+                self.db.query(query)
+            elif not force_reconnect and \
+                    (self._mysql_lock or self._transactions) or \
+                    exc.args[0] not in hosed_connection:
                 if len(query) > 2000:
                     msg = '%s... (truncated at 2000 chars)' % query[:2000]
                 else:
                     msg = query
                 LOG.warning('query failed:\n%s' % msg)
                 raise
-
-            # Hm. maybe the db is hosed.  Let's restart it.
-            self._forceReconnection(reason=exc.args[0])
-            self.db.query(query)
+            else:
+                # Hm. maybe the db is hosed.  Let's restart it.
+                self._forceReconnection(reason=exc.args[0])
+                self.db.query(query)
         except ProgrammingError as exc:
             if exc.args[0] in hosed_connection:
                 self._forceReconnection(reason=exc.args[0])
@@ -563,48 +1386,598 @@ class DB(TM):
                 LOG.warning('query failed:\n%s' % msg)
             raise
 
-        return self.db.store_result()
+        self._query_failed = False
+        if unbuffered:
+            result = self.db.use_result()
+        else:
+            result = self._store_result(converter)
+        if self._query_stats is not None:
+            self._query_stats.record_statement(time.perf_counter() - start)
+        return result
+
+    def _store_result(self, converter=None):
+        """ Return the result of the current statement, read with the
+        conversion mapping ``converter`` instead of the connection's.
+        """
+        if converter is None:
+            return self.db.store_result()
+        # The result looks up its value converters when it is created
+        db_converter = self.db.converter
+        self.db.converter = converter
+        try:
+            return self.db.store_result()
+        finally:
+            self.db.converter = db_converter
 
     def query(self, sql_string, max_rows=1000):
         """ Execute ``sql_string`` and return at most ``max_rows``.
+
+        Queries only reading data are sent to a read replica, unless the
+        current transaction has changed data already.
+
+        The time, the number of rows and the estimated size of the result
+        are recorded in the query statistics of the pool, also by the
+        fingerprint of the statements. Queries taking
+        longer than the slow query time are logged.
+        """
+        if self._replicas is not None and not self._reads_primary() and \
+           self._replica_safe(sql_string):
+            with self._replicas.connection() as replica:
+                if replica is not None:
+                    return self._measure(replica, sql_string, max_rows)
+        return self._measure(self, sql_string, max_rows)
+
+    def _measure(self, db, sql_string, max_rows, chunk_size=None):
+        """ Run ``sql_string`` on ``db``, this connection or a replica, and
+        record it in the statistics and slow query log of the pool.
+
+        With a ``chunk_size`` the result is read by column with
+        ``_read_columns`` instead of by row.
+        """
+        if chunk_size is None:
+            def run():
+                return db._run_query(sql_string, max_rows)
+        else:
+            def run():
+                return db._read_columns(sql_string, max_rows, chunk_size)
+        stats = self._query_stats
+        slow_log = self._slow_log
+        if stats is None and slow_log is None:
+            return run()
+        start = time.perf_counter()
+        try:
+            items, rows = run()
+        except Exception:
+            if stats is not None:
+                stats.record_error(time.perf_counter() - start, sql_string)
+            raise
+        seconds = time.perf_counter() - start
+        if chunk_size is None:
+            count, size = len(rows), result_bytes(rows)
+        else:
+            count = len(rows[0]) if rows else 0
+            size = column_bytes(rows)
+        if stats is not None:
+            stats.record_query(seconds, count, size, sql_string)
+        if slow_log is not None and seconds >= slow_log.threshold:
+            self._log_slow_query(db, sql_string, seconds, count)
+        return items, rows
+
+    def _log_slow_query(self, db, sql_string, seconds, rows):
+        """ Log a slow query and add it to the slow query log, with the
+        plans of its statements if enabled.
+
+        The plans are shown by ``db``, which ran the query, so a read
+        is explained by the replica it ran on.
+        """
+        plans = db._explain(sql_string) if self._slow_log.explain else None
+        if len(sql_string) > 2000:
+            sql_string = '%s... (truncated at 2000 chars)' % sql_string[:2000]
+        entry = self._slow_log.add(sql_string, seconds, rows, plans)
+        LOG.warning('slow query took %.3f seconds for %d rows in thread '
+                    '%s:\n%s' % (seconds, rows, entry['thread'], sql_string))
+
+    def _explain(self, sql_string):
+        """ Return the ``EXPLAIN`` output of the statements of
+        ``sql_string`` as a list of ``(statement, rows)`` pairs.
+
+        Each row is a mapping of ``EXPLAIN`` columns to values. If a
+        statement cannot be explained, the error message is returned
+        instead of the rows.
+        """
+        plans = []
+        for qs in filter(None, [q.strip() for q in sql_string.split('\0')]):
+            if qs.split(None, 1)[0].upper() not in explain_statements:
+                continue
+            try:
+                result = self._query('EXPLAIN ' + qs)
+            except MySQLdb.Error as exc:
+                plans.append((qs, str(exc)))
+                continue
+            names = [info[0] for info in result.describe()]
+            plans.append((qs, [dict(zip(names, row))
+                               for row in result.fetch_row(0)]))
+        return plans
+
+    def _run_query(self, sql_string, max_rows):
+        """ Execute ``sql_string`` and return at most ``max_rows``.
+
+        If a result cache is configured, results of plain ``SELECT``
+        statements are served from and stored in it, unless the current
+        transaction has changed data that is not committed yet.
+
+        With lazy rows enabled the rows are ``LazyRow`` objects, which
+        convert each value when it is first accessed.
+
+        The statements of ``sql_string`` are separated by null characters.
+        The rows of the last statement returning a result are returned.
         """
         self._use_TM and self._register()
         desc = None
         rows = ()
 
+        cache = self._result_cache
+        use_cache = cache is not None and not self._written_tables
+        if use_cache:
+            cached = cache.get((sql_string, max_rows))
+            if cached is not None:
+                items, rows = cached
+                return [dict(item) for item in items], rows
+        tables = set()
+        fetch_conv = self._lazy_conv and self._lazy_conv[0]
+
+        queries = []
         for qs in filter(None, [q.strip() for q in sql_string.split('\0')]):
             qtype = qs.split(None, 1)[0].upper()
+            if qtype not in read_statements:
+                self._invalidate_cache(qs)
+                use_cache = False
+            elif use_cache:
+                if cacheable(qs):
+                    tables.update(statement_tables(qs))
+                else:
+                    use_cache = False
             if qtype == 'SELECT' and max_rows:
                 qs = '%s LIMIT %d' % (qs, max_rows)
-            db_results = self._query(qs)
+            queries.append((qtype, qs))
+
+        with closing(self._results(queries, fetch_conv)) as results:
+            for db_results in results:
+                if desc is not None and \
+                   db_results and \
+                   db_results.describe() != desc:
+                    msg = 'Multiple select schema are not allowed.'
+                    raise ProgrammingError(msg)
+
+                if db_results:
+                    desc = db_results.describe()
+                    rows = db_results.fetch_row(max_rows)
+                    if fetch_conv is not None:
+                        deferred = self._lazy_conv[1]
+                        rows = lazy_rows(rows, [deferred.get(info[1])
+                                                for info in desc])
+                else:
+                    desc = None
 
-            if desc is not None and \
-               db_results and \
-               db_results.describe() != desc:
-                msg = 'Multiple select schema are not allowed.'
-                raise ProgrammingError(msg)
+        if desc is None:
+            return (), ()
 
-            if db_results:
-                desc = db_results.describe()
-                rows = db_results.fetch_row(max_rows)
-            else:
-                desc = None
+        items = self._items(desc)
+        if use_cache:
+            cached = ([dict(item) for item in items], rows)
+            cache.set((sql_string, max_rows), cached, tables,
+                      result_size(cached))
+        return items, rows
+
+    def _reads_primary(self):
+        """ Must reads go to the primary to see changes of this connection?
+        """
+        if self._transaction_wrote:
+            return True
+        return self._last_write is not None and \
+            time.monotonic() - self._last_write < self.read_your_writes
 
-            if qtype == 'CALL':
-                # For stored procedures, skip the status result
+    def _replica_safe(self, sql_string):
+        """ Can ``sql_string`` be run on a read replica?
+
+        Only plain ``SELECT`` statements can. Locking reads, ``SELECT ...
+        INTO`` and statements using variables or session functions like
+        ``LAST_INSERT_ID()`` or ``GET_LOCK()`` are run on the primary.
+        """
+        statements = [q.strip() for q in sql_string.split('\0')]
+        statements = list(filter(None, statements))
+        return bool(statements) and all(map(plain_read, statements))
+
+    def _results(self, queries, converter=None):
+        """ Execute the ``(type, statement)`` pairs ``queries`` and yield
+        the result of each statement.
+
+        With batched statements enabled, all statements are sent to the
+        server in one round trip as a multi-statement query and their
+        results are read with ``next_result``. Batches containing ``CALL``
+        statements are executed one statement at a time, because stored
+        procedures may return any number of results.
+        """
+        if not self._batch_queries or len(queries) < 2 or \
+           not self._multi_statements() or \
+           any(qtype == 'CALL' for qtype, qs in queries):
+            for qtype, qs in queries:
+                yield self._query(qs, converter=converter)
+                if qtype == 'CALL':
+                    # For stored procedures, skip the status result
+                    self.db.next_result()
+            return
+
+        db_results = self._query(';\n'.join(qs for qtype, qs in queries),
+                                 converter=converter)
+        try:
+            yield db_results
+            for i in range(1, len(queries)):
+                # Errors of later statements are raised by ``next_result``
+                self._query_failed = True
                 self.db.next_result()
+                self._query_failed = False
+                yield self._store_result(converter)
+        finally:
+            self._drain_results()
 
-        if desc is None:
+    def _multi_statements(self):
+        """ Can several statements be sent to the server in one query?
+        """
+        return bool(self._kw_args.get('client_flag', 0) &
+                    CLIENT.MULTI_STATEMENTS)
+
+    def _drain_results(self):
+        """ Discard the unread results of a multi-statement query.
+        """
+        while self.db.next_result() == 0:
+            self.db.store_result()
+
+    def query_stream(self, sql_string, chunk_size=1000):
+        """ Execute the single statement ``sql_string`` and return its
+        result column descriptions and a ``ResultStream`` over its rows.
+
+        Rows are read from the server ``chunk_size`` at a time instead of
+        all at once, so memory use does not depend on the result size.
+        Until the stream is exhausted or closed no other query can be run
+        on this connection. The connection keeps only a weak reference to
+        the stream, a stream dropped before its end is closed when it is
+        collected.
+        """
+        statements = [q.strip() for q in sql_string.split('\0')]
+        statements = list(filter(None, statements))
+        if len(statements) != 1:
+            raise ProgrammingError('Only a single statement can be streamed.')
+
+        self._use_TM and self._register()
+        self._invalidate_cache(statements[0])
+        db_results = self._query(statements[0], unbuffered=True)
+        if not db_results:
+            return (), ()
+
+        stream = ResultStream(self, db_results, chunk_size)
+        self._stream_ref = weakref.ref(stream)
+        return self._items(db_results.describe()), stream
+
+    def query_columns(self, sql_string, max_rows=1000, chunk_size=1000):
+        """ Execute the single statement ``sql_string`` and return its
+        result column descriptions and a list with the values of each
+        column, for at most ``max_rows`` rows.
+
+        Columns of numeric types are returned as NumPy arrays if NumPy is
+        installed, else as ``array`` objects, unless they contain values
+        that do not fit, like NULL. Other columns are lists. The rows are
+        read from the server ``chunk_size`` at a time and never kept as
+        row tuples.
+
+        Like ``query`` the statement is recorded in the query statistics
+        and the slow query log of the pool.
+        """
+        statements = [q.strip() for q in sql_string.split('\0')]
+        statements = list(filter(None, statements))
+        if len(statements) != 1:
+            raise ProgrammingError('Only a single statement can be read '
+                                   'by column.')
+        return self._measure(self, statements[0], max_rows,
+                             max(int(chunk_size), 1))
+
+    def _read_columns(self, qs, max_rows, chunk_size):
+        """ Execute the statement ``qs`` and return at most ``max_rows``
+        of its result by column.
+        """
+        self._use_TM and self._register()
+        self._invalidate_cache(qs)
+        if qs.split(None, 1)[0].upper() == 'SELECT' and max_rows:
+            qs = '%s LIMIT %d' % (qs, max_rows)
+        db_results = self._query(qs, unbuffered=True)
+        if not db_results:
+            return (), ()
+
+        items = self._items(db_results.describe())
+        columns = [ColumnBuilder(item['type']) for item in items]
+        rows_left = max_rows
+        while not max_rows or rows_left > 0:
+            size = min(chunk_size, rows_left) if max_rows else chunk_size
+            rows = db_results.fetch_row(size)
+            if not rows:
+                break
+            rows_left -= len(rows)
+            for index, column in enumerate(columns):
+                column.extend([row[index] for row in rows])
+        # Rows beyond max_rows must be read before the next statement
+        while db_results.fetch_row(chunk_size):
+            pass
+
+        return items, [column.result() for column in columns]
+
+    def query_prepared(self, sql_string, params=(), max_rows=1000):
+        """ Execute the single statement ``sql_string`` as a server-side
+        prepared statement, binding ``params`` to its ``?`` placeholders,
+        and return at most ``max_rows``.
+
+        The server parses each distinct statement only once per connection.
+        The ``prepared_cache_size`` most recently used statements are kept
+        prepared, older ones are deallocated.
+        """
+        self._use_TM and self._register()
+        self._invalidate_cache(sql_string)
+        try:
+            db_results = self._execute_prepared(sql_string, params)
+        except _mysql.Error as exc:
+            if exc.args[0] != ER.UNKNOWN_STMT_HANDLER:
+                raise
+            # The server session was replaced by a reconnection
+            self._prepared.clear()
+            db_results = self._execute_prepared(sql_string, params)
+
+        if not db_results:
             return (), ()
 
+        return self._items(db_results.describe()), db_results.fetch_row(
+            max_rows)
+
+    def _prepare(self, sql_string):
+        """ Return the name of the prepared statement for ``sql_string``,
+        preparing it on the server if necessary.
+        """
+        name = self._prepared.get(sql_string)
+        if name is not None:
+            self._prepared.move_to_end(sql_string)
+            self._count('prepared_hits')
+            return name
+
+        while len(self._prepared) >= max(self.prepared_cache_size, 1):
+            old_name = self._prepared.popitem(last=False)[1]
+            self._query('DEALLOCATE PREPARE %s' % old_name)
+
+        self._prepared_count += 1
+        name = 'zmysqlda_stmt%d' % self._prepared_count
+        self._query(b'PREPARE %s FROM %s' % (name.encode(),
+                                             self.db.literal(sql_string)))
+        self._prepared[sql_string] = name
+        self._count('prepared')
+        return name
+
+    def _execute_prepared(self, sql_string, params):
+        """ Execute the prepared statement for ``sql_string`` with ``params``
+        and return its result.
+
+        The parameters are assigned to user variables in the same round
+        trip as the ``EXECUTE`` if the connection allows several statements
+        in one query, else in a query of their own.
+        """
+        name = self._prepare(sql_string)
+        if not params:
+            return self._query('EXECUTE %s' % name)
+
+        names = [b'@zmysqlda_p%d' % i for i in range(len(params))]
+        values = [b'%s=%s' % (var, self.db.literal(value))
+                  for var, value in zip(names, params)]
+        assign = b'SET %s' % b', '.join(values)
+        execute = b'EXECUTE %s USING %s' % (name.encode(), b', '.join(names))
+        if not self._multi_statements():
+            self._query(assign)
+            return self._query(execute)
+        self._query(assign + b';' + execute)
+        self.db.next_result()
+        return self.db.store_result()
+
+    def bulk_insert(self, table, columns, rows):
+        """ Insert the value tuples ``rows`` into the ``columns`` of
+        ``table`` with multi-row ``INSERT`` statements.
+
+        Each statement holds as many rows as fit into the server's
+        ``max_allowed_packet``. The statements run in the current
+        transaction. Returns a dictionary with the number of ``rows`` and
+        ``statements``, the ``seconds`` taken and the ``rows_per_second``.
+        """
+        self._use_TM and self._register()
+        start = time.monotonic()
+        encoding = self.db.encoding
+        prefix = 'INSERT INTO %s (%s) VALUES ' % (
+            '.'.join(quote_identifier(name) for name in table.split('.')),
+            ', '.join(quote_identifier(name) for name in columns))
+        self._invalidate_cache(prefix)
+        prefix = prefix.encode(encoding)
+        max_size = self._max_allowed_packet() - self.packet_reserve
+
+        count = statements = 0
+        values = []
+        size = len(prefix)
+        for row in rows:
+            if len(row) != len(columns):
+                raise ProgrammingError('Row %d has %d values instead of %d.'
+                                       % (count + 1, len(row), len(columns)))
+            value = b'(%s)' % b', '.join(self.db.literal(x) for x in row)
+            if values and size + len(value) + 1 > max_size:
+                self._query(prefix + b','.join(values))
+                statements += 1
+                values = []
+                size = len(prefix)
+            values.append(value)
+            size += len(value) + 1
+            count += 1
+        if values:
+            self._query(prefix + b','.join(values))
+            statements += 1
+
+        seconds = time.monotonic() - start
+        LOG.debug('Inserted %d rows into %s with %d statements in %.3fs.' %
+                  (count, table, statements, seconds))
+        return {'rows': count, 'statements': statements, 'seconds': seconds,
+                'rows_per_second': count / seconds if seconds else 0.0}
+
+    def load_data(self, table, source, columns=None, format='tsv',
+                  duplicates=None, ignore_lines=0):
+        """ Load ``source`` into ``table`` with ``LOAD DATA LOCAL INFILE``.
+
+        ``source`` is an iterable of value tuples or a file object with
+        data in ``format``, ``tsv`` or ``csv``, of which the first
+        ``ignore_lines`` lines are skipped. ``columns`` are the table
+        columns the fields are loaded into, by default all. ``duplicates``
+        of unique keys are skipped or, with ``replace``, replace the
+        existing rows.
+
+        The data is streamed to the server while it is read from
+        ``source``. The statement runs in the current transaction. Returns
+        a dictionary with the number of ``records`` read, rows ``loaded``,
+        ``skipped`` and ``deleted`` and ``warnings``, and the ``seconds``
+        taken.
+        """
+        if not self._kw_args.get('local_infile'):
+            raise NotSupportedError('LOAD DATA LOCAL INFILE is not enabled '
+                                    'for this connection.')
+        if format not in formats:
+            raise ValueError('Unknown data format %s' % format)
+        if duplicates not in (None, 'ignore', 'replace'):
+            raise ValueError('Unknown duplicates handling %s' % duplicates)
+
+        self._use_TM and self._register()
+        start = time.monotonic()
+        encoding = self.db.encoding
+        if hasattr(source, 'read'):
+            chunks = _file_chunks(source, encoding)
+        else:
+            chunks = tsv_lines(source, encoding)
+            format, ignore_lines = 'tsv', 0
+
+        with InfileFeeder(chunks) as feeder:
+            sql = ['LOAD DATA LOCAL INFILE %s' %
+                   self.db.literal(feeder.path).decode(encoding)]
+            if duplicates:
+                sql.append(duplicates.upper())
+            sql.append('INTO TABLE %s CHARACTER SET %s %s' % (
+                '.'.join(quote_identifier(name) for name in table.split('.')),
+                self.db.character_set_name(), formats[format].decode()))
+            if ignore_lines:
+                sql.append('IGNORE %d LINES' % ignore_lines)
+            if columns:
+                columns = map(quote_identifier, columns)
+                sql.append('(%s)' % ', '.join(columns))
+            sql = ' '.join(sql)
+            self._invalidate_cache(sql)
+            self._query(sql)
+            info = load_info(self.db.info())
+        if feeder.error is not None:
+            raise feeder.error
+
+        seconds = time.monotonic() - start
+        records = info.get('records', 0)
+        skipped = info.get('skipped', 0)
+        return {'records': records, 'loaded': records - skipped,
+                'skipped': skipped, 'deleted': info.get('deleted', 0),
+                'warnings': info.get('warnings', 0), 'seconds': seconds}
+
+    def _max_allowed_packet(self):
+        """ Return the maximum statement size accepted by the server.
+        """
+        if self._max_packet is None:
+            variables = self.variables()
+            value = variables.get('max_allowed_packet',
+                                  variables.get(b'max_allowed_packet'))
+            self._max_packet = int(value) if value else 1024 * 1024
+        return self._max_packet
+
+    def _invalidate_cache(self, sql_string):
+        """ Drop cached results of tables ``sql_string`` may change.
+
+        Inside a transaction the tables are remembered and invalidated
+        again when it ends, so results read by other connections before
+        the commit are not served afterwards. Until then, all reads of
+        the transaction go to the primary, and for ``read_your_writes``
+        seconds after it has committed. Outside of a transaction, reads
+        go to the primary for ``read_your_writes`` seconds.
+        """
+        if sql_string.split(None, 1)[0].upper() in read_statements:
+            return
+        if self._transaction_begun:
+            self._transaction_wrote = True
+        else:
+            self._last_write = time.monotonic()
+        if self._result_cache is None:
+            return
+        tables = changed_tables(sql_string)
+        self._result_cache.invalidate(tables)
+        if self._transaction_begun:
+            self._written_tables.update(tables)
+
+    def _forget_writes(self, committed=False):
+        """ Invalidate the tables changed by the finished transaction.
+
+        If it has committed changes, reads stay on the primary for another
+        ``read_your_writes`` seconds.
+        """
+        if committed and self._transaction_wrote:
+            self._last_write = time.monotonic()
+        self._transaction_wrote = False
+        if self._written_tables:
+            tables, self._written_tables = self._written_tables, set()
+            self._result_cache.invalidate(tables)
+
+    @property
+    def _stream(self):
+        """ The unfinished result stream of this connection, if any.
+
+        Only a weak reference is kept, so that a stream dropped before it
+        was read to the end is collected and gives the connection back.
+        """
+        if self._stream_ref is not None:
+            return self._stream_ref()
+        return None
+
+    def _end_stream(self, stream):
+        """ Called by ``stream`` once all of its rows have been read.
+        """
+        # The weak reference is already dead if ``stream`` is closed
+        # while it is being collected
+        if self._stream_ref is not None and \
+           self._stream_ref() in (stream, None):
+            self._stream_ref = None
+            self._release()
+
+    def _close_stream(self):
+        """ Read and discard the rest of an unfinished result stream,
+        so that the connection can be used again.
+
+        Unlike closing the stream itself this does not give the
+        connection back to its shared pool.
+        """
+        ref, self._stream_ref = self._stream_ref, None
+        stream = ref() if ref is not None else None
+        if stream is not None:
+            stream.close()
+
+    @classmethod
+    def _items(cls, desc):
+        """ Translate a result description to Zope column descriptions.
+        """
         items = []
         for info in desc:
             items.append({'name': info[0],
-                          'type': self.defs.get(info[1], 't'),
+                          'type': cls.defs.get(info[1], 't'),
                           'width': info[2],
                           'null': info[6]})
-
-        return items, rows
+        return items
 
     def string_literal(self, sql_str):
         """ Called from zope to quote/escape strings for inclusion
@@ -642,9 +2015,12 @@ class DB(TM):
                 LOG.error(msg, exc_info=True)
                 raise
             else:
-                self._begin()
+                # Registered before beginning, so a connection of a shared
+                # pool whose begin fails stays checked out until the
+                # transaction it joined is aborted
                 self._registered = True
                 self._finalize = False
+                self._begin()
 
     def _begin(self, *ignored):
         """ Begin a transaction, if transactions are enabled.
@@ -652,31 +2028,82 @@ class DB(TM):
         Also called from _register() upon first query.
         """
         try:
-            try:
-                # Calling ``ping`` to verify that the connection is working.
-                self.db.ping()
-            except OperationalError as exc:
-                # Before mysqlclient version 2.2.1 the ``ping`` method seemed
-                # to never raise exceptions, now it does. Attempt to reconnect
-                # if the exception type implies a stale connection.
-                if exc.args[0] in hosed_connection:
-                    self._forceReconnection(reason=exc.args[0])
-                else:
-                    raise
-
+            if self._writer_moved():
+                self._forceReconnection(reason='primary changed')
+            pinged = self._ping()
+
+            # Without a ping the first statement may find the connection
+            # gone. Nothing has happened in this transaction yet, so it is
+            # safe to let ``_query`` reconnect for it.
+            reconnect = not pinged
             self._transaction_begun = True
             if self._transactions:
-                self._query('BEGIN')
+                self._query('BEGIN', force_reconnect=reconnect)
+                reconnect = False
             if self._mysql_lock:
-                self._query("SELECT GET_LOCK('%s',0)" % self._mysql_lock)
+                self._query("SELECT GET_LOCK('%s',0)" % self._mysql_lock,
+                            force_reconnect=reconnect)
         except Exception as exc:
             LOG.error('Exception during _begin', exc_info=True)
             raise ConflictError('Database error %s' % exc.args[0])
 
+    def _ping(self):
+        """ Check that the connection works, if it is due, and reconnect
+        if it has gone stale. Returns whether it was checked.
+        """
+        pinged = self._needs_ping()
+        if pinged:
+            self._count('pings')
+            try:
+                # Calling ``ping`` to verify that the connection works.
+                self.db.ping()
+            except OperationalError as exc:
+                # Before mysqlclient version 2.2.1 the ``ping`` method
+                # seemed to never raise exceptions, now it does. Attempt
+                # to reconnect if the exception type implies a stale
+                # connection.
+                if not self._reconnect_hosed(exc):
+                    raise
+        else:
+            self._count('pings_skipped')
+        return pinged
+
+    def _reconnect_hosed(self, exc):
+        """ Reconnect if the error ``exc`` means the connection is gone.
+        Returns whether it did.
+        """
+        if exc.args and exc.args[0] in hosed_connection:
+            self._forceReconnection(reason=exc.args[0])
+            return True
+        return False
+
+    def _needs_ping(self):
+        """ Should the connection be checked before the transaction begins?
+
+        Without a ``ping_interval`` it is checked every time, otherwise only
+        if it has been idle for longer or the last query failed.
+        """
+        if self._ping_interval is None or self._query_failed:
+            return True
+        return time.monotonic() - self._last_used > self._ping_interval
+
+    def _writer_moved(self):
+        """ Has the primary server changed since the connection was opened?
+        """
+        return self._writers is not None and \
+            self._writer_generation != self._writers.generation
+
+    def _count(self, key, amount=1):
+        """ Increment the statistics counter ``key``.
+        """
+        with self._stats_lock:
+            self._stats[key] = self._stats.get(key, 0) + amount
+
     def _finish(self, *ignored):
         """ Commit a transaction, if transactions are enabled and the
         Zope transaction has committed successfully.
         """
+        self._close_stream()
         if not self._transaction_begun:
             return
         self._transaction_begun = False
@@ -688,20 +2115,51 @@ class DB(TM):
         except Exception:
             LOG.error('exception during _finish', exc_info=True)
             raise ConflictError
+        finally:
+            self._forget_writes(committed=True)
 
     def _abort(self, *ignored):
         """ Roll back the database transaction if the Zope transaction
         has been aborted, usually due to a transaction error.
         """
+        self._close_stream()
         if not self._transaction_begun:
             return
         self._transaction_begun = False
-        if self._mysql_lock:
-            self._query("SELECT RELEASE_LOCK('%s')" % self._mysql_lock)
-        if self._transactions:
-            self._query('ROLLBACK')
-        else:
-            LOG.error('aborting when non-transactional')
+        try:
+            if self._mysql_lock:
+                self._query("SELECT RELEASE_LOCK('%s')" % self._mysql_lock)
+            if self._transactions:
+                self._query('ROLLBACK')
+            else:
+                LOG.error('aborting when non-transactional')
+        finally:
+            self._forget_writes()
+
+    def tpc_finish(self, *ignored):
+        try:
+            super().tpc_finish(*ignored)
+        finally:
+            self._release()
+
+    __inform_commit__ = tpc_finish
+
+    def abort(self, *ignored):
+        try:
+            super().abort(*ignored)
+        finally:
+            self._release()
+
+    tpc_abort = abort
+    __inform_abort__ = abort
+
+    def _release(self):
+        """ Check this instance back into its shared pool once the Zope
+        transaction it joined is over.
+        """
+        if self._pool is not None and not self._registered and \
+           self._stream_ref is None:
+            self._pool._checkin(self)
 
     def _mysql_version(self):
         """ Return mysql server version.
@@ -720,6 +2178,69 @@ class DB(TM):
         return _SavePoint(self)
 
 
+def _file_chunks(file, encoding):
+    """ Yield the content of ``file`` as byte strings.
+    """
+    while True:
+        chunk = file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        if isinstance(chunk, str):
+            chunk = chunk.encode(encoding)
+        yield chunk
+
+
+class ResultStream:
+    """ Iterator over the rows of an unbuffered query result
+
+    Rows are fetched from the server ``chunk_size`` at a time. Iterating
+    yields single rows, ``chunks`` yields the fetched tuples of rows.
+    Closing the stream early reads and discards the remaining rows, which
+    MySQL requires before the connection can be used again.
+    """
+
+    _result = None
+
+    def __init__(self, db_conn, db_result, chunk_size=1000):
+        self.db_conn = db_conn
+        self.chunk_size = max(int(chunk_size), 1)
+        self.rowcount = 0
+        self._result = db_result
+
+    def chunks(self):
+        while self._result is not None:
+            rows = self._result.fetch_row(self.chunk_size)
+            if not rows:
+                self.close()
+                break
+            self.rowcount += len(rows)
+            yield rows
+
+    def __iter__(self):
+        for rows in self.chunks():
+            yield from rows
+
+    def close(self):
+        """ Discard any unread rows and release the connection.
+        """
+        db_result, self._result = self._result, None
+        if db_result is None:
+            return
+        try:
+            while db_result.fetch_row(self.chunk_size):
+                pass
+        finally:
+            self.db_conn._end_stream(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    __del__ = close
+
+
 class _SavePoint:
     """ Simple savepoint object
     """
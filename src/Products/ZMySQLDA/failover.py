@@ -0,0 +1,136 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Candidates for the primary server shared by all threads
+"""
+import logging
+import threading
+import time
+
+import MySQLdb
+from MySQLdb import OperationalError
+
+
+LOG = logging.getLogger('ZMySQLDA')
+
+
+class Writers:
+    """ The servers that may be the writable primary of a database, in
+    order of preference
+
+    All connections of a pool connect to the ``current`` candidate. When
+    it cannot be reached or refuses writes because it is read-only, ``find``
+    probes the candidates for the first one with ``@@read_only = 0`` and
+    makes it the current one. The ``generation`` is incremented with each
+    change, so connections opened before notice that they must reconnect.
+    """
+
+    # Seconds to wait for a candidate when probing, unless the connection
+    # string sets a shorter connect timeout
+    probe_timeout = 5
+
+    def __init__(self, hosts):
+        self.hosts = [{key: value for key, value in host.items()
+                       if key in ('host', 'port')} for host in hosts]
+        self.current = 0
+        self.generation = 0
+        self.failovers = 0
+        self.changed = None
+        self._lock = threading.Lock()
+
+    def name(self, index=None):
+        """ Return ``host[:port]`` of the current or the given candidate.
+        """
+        host = self.hosts[self.current if index is None else index]
+        if 'port' in host:
+            return '%s:%d' % (host['host'], host['port'])
+        return host['host']
+
+    def kw_args(self, kw_args, index=None):
+        """ Return the connection arguments ``kw_args`` for the current or
+        the given candidate.
+        """
+        kw_args = dict(kw_args)
+        kw_args.pop('port', None)
+        kw_args.pop('unix_socket', None)
+        kw_args.update(self.hosts[self.current if index is None else index])
+        return kw_args
+
+    def connect(self, kw_args):
+        """ Connect to the current primary with ``kw_args``.
+
+        If it cannot be reached, the next writable candidate is connected
+        to instead. Returns the connection and the generation it belongs to.
+        """
+        generation = self.generation
+        try:
+            return MySQLdb.connect(**self.kw_args(kw_args)), generation
+        except OperationalError:
+            if not self.find(kw_args, generation):
+                raise
+        generation = self.generation
+        return MySQLdb.connect(**self.kw_args(kw_args)), generation
+
+    def find(self, kw_args, generation):
+        """ Look for the writable primary after connections of
+        ``generation`` failed.
+
+        Returns True if the primary has changed since, also if another
+        thread has found the new one already.
+        """
+        with self._lock:
+            if generation != self.generation:
+                return True
+            for index in range(len(self.hosts)):
+                try:
+                    read_only = self._read_only(kw_args, index)
+                except MySQLdb.Error as exc:
+                    LOG.warning('Cannot probe primary candidate %s: %s' %
+                                (self.name(index), exc))
+                    continue
+                if read_only:
+                    continue
+                if index == self.current:
+                    return False
+                LOG.warning('Primary changed from %s to %s' %
+                            (self.name(), self.name(index)))
+                self.current = index
+                self.generation += 1
+                self.failovers += 1
+                self.changed = time.time()
+                return True
+            LOG.error('No writable primary found among %s' %
+                      ', '.join(map(self.name, range(len(self.hosts)))))
+            return False
+
+    def _read_only(self, kw_args, index):
+        """ Is the candidate at ``index`` read-only?
+        """
+        kw_args = self.kw_args(kw_args, index)
+        kw_args['connect_timeout'] = min(kw_args.get('connect_timeout') or
+                                         self.probe_timeout,
+                                         self.probe_timeout)
+        connection = MySQLdb.connect(**kw_args)
+        try:
+            connection.query('SELECT @@read_only')
+            row = connection.store_result().fetch_row(1)
+        finally:
+            connection.close()
+        return not row or int(row[0][0]) != 0
+
+    def stats(self):
+        """ Return the current primary, the candidates and the number and
+        time of changes.
+        """
+        return {'host': self.name(),
+                'candidates': list(map(self.name, range(len(self.hosts)))),
+                'failovers': self.failovers, 'changed': self.changed}
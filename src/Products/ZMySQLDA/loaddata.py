@@ -0,0 +1,141 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Feed data to LOAD DATA LOCAL INFILE statements
+"""
+import os
+import re
+import shutil
+import tempfile
+import threading
+from datetime import date
+from datetime import datetime
+from datetime import time
+
+
+# Field and line options of the formats ``LOAD DATA`` can read
+formats = {
+    # The default format of LOAD DATA, also written for rows
+    'tsv': b"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' "
+           b"LINES TERMINATED BY '\\n'",
+    'csv': b"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' "
+           b"ESCAPED BY '\\\\' LINES TERMINATED BY '\\n'",
+}
+
+# Size of the chunks copied from file objects
+CHUNK_SIZE = 64 * 1024
+
+_escapes = {b'\\': b'\\\\', b'\t': b'\\t', b'\n': b'\\n', b'\r': b'\\r',
+            b'\0': b'\\0'}
+_special = re.compile(b'[\\\\\t\n\r\0]')
+_info = re.compile(r'(\w+): (\d+)')
+
+
+def tsv_value(value, encoding):
+    """ Format ``value`` as field of the ``tsv`` format.
+    """
+    if value is None:
+        return b'\\N'
+    if isinstance(value, str):
+        value = value.encode(encoding)
+    elif isinstance(value, bool):
+        return b'1' if value else b'0'
+    elif isinstance(value, datetime):
+        return value.isoformat(' ').encode('ascii')
+    elif isinstance(value, (date, time)):
+        return value.isoformat().encode('ascii')
+    elif hasattr(value, 'ISO'):
+        # Zope ``DateTime``
+        return value.ISO().encode('ascii')
+    elif not isinstance(value, bytes):
+        return str(value).encode('ascii')
+    return _special.sub(lambda match: _escapes[match.group()], value)
+
+
+def tsv_lines(rows, encoding):
+    """ Yield the ``tsv`` format lines for ``rows``.
+    """
+    for row in rows:
+        yield b'\t'.join([tsv_value(value, encoding)
+                          for value in row]) + b'\n'
+
+
+def load_info(info):
+    """ Parse the information string of a finished ``LOAD DATA``.
+    """
+    if isinstance(info, bytes):
+        info = info.decode('ascii')
+    return {key.lower(): int(value)
+            for key, value in _info.findall(info or '')}
+
+
+class InfileFeeder:
+    """ Provide data under a file name the client library can read
+
+    Where possible, the data is written into a named pipe by a thread
+    while the client library reads it, so it is never kept in memory or
+    on disk as a whole. Elsewhere it is written to a temporary file.
+
+    ``chunks`` is an iterable of byte strings.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.error = None
+        self._opened = False
+        self._thread = None
+        self._directory = tempfile.mkdtemp(prefix='zmysqlda')
+        self.path = os.path.join(self._directory, 'infile')
+
+    def __enter__(self):
+        if hasattr(os, 'mkfifo'):
+            os.mkfifo(self.path, 0o600)
+            self._thread = threading.Thread(target=self._feed,
+                                            name='zmysqlda-infile',
+                                            daemon=True)
+            self._thread.start()
+        else:
+            self._feed()
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            if self._thread is not None:
+                self._release()
+                self._thread.join()
+        finally:
+            shutil.rmtree(self._directory, ignore_errors=True)
+
+    def _feed(self):
+        try:
+            with open(self.path, 'wb') as infile:
+                self._opened = True
+                for chunk in self.chunks:
+                    infile.write(chunk)
+        except BrokenPipeError:
+            # The reader stopped early, e.g. because the statement failed
+            pass
+        except Exception as exc:
+            self.error = exc
+
+    def _release(self):
+        """ Stop the feeding thread if the pipe was not read to the end.
+
+        Opening the pipe for reading lets the thread open it for writing,
+        closing it again makes further writes fail.
+        """
+        fd = os.open(self.path, os.O_RDONLY | os.O_NONBLOCK)
+        try:
+            while not self._opened and self._thread.is_alive():
+                self._thread.join(0.01)
+        finally:
+            os.close(fd)
@@ -0,0 +1,124 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Independent read queries run concurrently on connections of their own
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from MySQLdb import ProgrammingError
+
+
+# Statements that can be run in parallel
+parallel_statements = frozenset(('SELECT', 'SHOW', 'DESC', 'DESCRIBE',
+                                 'EXPLAIN'))
+
+
+class ParallelQueries:
+    """ Runs read queries on up to ``max_workers`` connections at once
+
+    The connections are opened as needed and kept for later queries. They
+    run in autocommit mode outside of any Zope transaction, so they don't
+    see changes the calling thread has not committed yet.
+
+    ``db_flags`` are the ``db_cls`` arguments for the connections of the
+    pool, whose result cache, statistics and replicas are shared.
+
+    If ``slots`` is given, the pool limiting the number of connections,
+    each connection takes one of its slots while a query runs and is
+    closed afterwards, so it never holds a slot the pool needs.
+    """
+
+    # Number of queries run at once if not configured
+    max_workers = 4
+
+    def __init__(self, db_cls, db_flags, max_workers=None, slots=None):
+        if max_workers:
+            self.max_workers = int(max_workers)
+        self._db_cls = db_cls
+        self._slots = slots
+        self._db_flags = dict(db_flags, use_TM=False, transactions=False,
+                              mysql_lock=None,
+                              kw_args=dict(db_flags['kw_args'],
+                                           autocommit=True))
+        self._lock = threading.Lock()
+        self._idle = []
+        self._executor = None
+
+    def query(self, queries, max_rows=1000):
+        """ Run ``queries`` concurrently and return their results.
+
+        Returns the list of ``(items, rows)`` results in the order of
+        ``queries``, with None for queries that failed, and a mapping of
+        the index of each failed query to its error.
+        """
+        futures = [self.submit(sql_string, max_rows)
+                   for sql_string in queries]
+        results = []
+        errors = {}
+        for index, future in enumerate(futures):
+            try:
+                results.append(future.result())
+            except Exception as exc:
+                results.append(None)
+                errors[index] = exc
+        return results, errors
+
+    def submit(self, sql_string, max_rows=1000):
+        """ Start running ``sql_string`` and return a future for its
+        ``(items, rows)`` result.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.max_workers, thread_name_prefix='zmysqlda-parallel')
+            executor = self._executor
+        return executor.submit(self._run, sql_string, max_rows)
+
+    def _run(self, sql_string, max_rows):
+        """ Run one query on an idle or new connection.
+        """
+        for qs in filter(None, [q.strip() for q in sql_string.split('\0')]):
+            if qs.split(None, 1)[0].upper() not in parallel_statements:
+                raise ProgrammingError('Only reading statements can be run '
+                                       'in parallel: %s' % qs[:200])
+        with self._lock:
+            db = self._idle.pop() if self._idle else None
+        if db is None:
+            if self._slots is not None:
+                self._slots._reserve()
+            try:
+                db = self._db_cls(**self._db_flags)
+            except Exception:
+                if self._slots is not None:
+                    self._slots._release()
+                raise
+        try:
+            return db.query(sql_string, max_rows)
+        finally:
+            if self._slots is not None:
+                db.close()
+                self._slots._release()
+            elif db.db is not None:
+                with self._lock:
+                    self._idle.append(db)
+
+    def close(self):
+        """ Close all idle connections and stop the worker threads.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+            executor, self._executor = self._executor, None
+        for db in idle:
+            db.close()
+        if executor is not None:
+            executor.shutdown(wait=False)
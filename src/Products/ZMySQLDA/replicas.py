@@ -0,0 +1,336 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Connections to read replicas shared by all threads
+"""
+import logging
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from MySQLdb import Error
+from MySQLdb import OperationalError
+from MySQLdb import ProgrammingError
+
+
+LOG = logging.getLogger('ZMySQLDA')
+
+# Ways to choose the replica for a read
+strategies = ('round_robin', 'least_outstanding')
+
+# Statements showing the replication status, the first one for MySQL 8.0.22
+# and MariaDB 10.5.1 or later
+status_queries = ('SHOW REPLICA STATUS', 'SHOW SLAVE STATUS')
+
+
+def parse_hosts(hosts):
+    """ Parse a comma separated list of ``host[:port][=weight]`` entries.
+    """
+    result = []
+    for entry in filter(None, hosts.split(',')):
+        host = {}
+        if '=' in entry:
+            entry, weight = entry.split('=', 1)
+            host['weight'] = int(weight)
+        if ':' in entry:
+            entry, port = entry.split(':', 1)
+            host['port'] = int(port)
+        host['host'] = entry
+        result.append(host)
+    return result
+
+
+class ReplicaHost:
+    """ A read replica, its idle connections and its health
+    """
+
+    def __init__(self, kw_args, weight=1):
+        self.kw_args = kw_args
+        self.weight = max(int(weight), 1)
+        self.name = kw_args['host']
+        if 'port' in kw_args:
+            self.name += ':%d' % kw_args['port']
+        self.idle = []
+        self.outstanding = 0
+        self.selected = 0
+        self.failures = 0
+        # taken out of rotation because it is down or lagging behind
+        self.healthy = True
+        self.ejections = 0
+        self.lag = None
+        self.checked = None
+        # weighted round-robin counter
+        self.current = 0
+        # connection and statement used by the health check
+        self.check_db = None
+        self.status_query = status_queries[0]
+
+    def stats(self):
+        return {'host': self.name, 'weight': self.weight,
+                'selected': self.selected, 'outstanding': self.outstanding,
+                'idle': len(self.idle), 'failures': self.failures,
+                'healthy': self.healthy, 'ejections': self.ejections,
+                'lag': self.lag, 'checked': self.checked}
+
+
+def _connection_error(exc):
+    """ Is ``exc`` an error of the client library, like a lost connection,
+    instead of an error reported by the server?
+    """
+    return bool(exc.args) and 2000 <= exc.args[0] < 3000
+
+
+def _check_loop(ref, stopped, interval):
+    """ Check the replicas of the pool referenced by ``ref`` every
+    ``interval`` seconds until it is stopped or garbage collected.
+    """
+    while True:
+        pool = ref()
+        if pool is None:
+            return
+        try:
+            pool.check_hosts()
+        except Exception:
+            LOG.error('Replica health check failed', exc_info=True)
+        del pool
+        if stopped.wait(interval):
+            return
+
+
+class ReplicaPool:
+    """ Connections to the read replicas of a database
+
+    Every read routed to the replicas checks a connection to one of them
+    out of the pool and returns it afterwards, so the number of
+    connections to each replica is limited by the number of concurrent
+    reads. The ``round_robin`` strategy chooses the replicas in turn,
+    proportional to their weight, ``least_outstanding`` chooses the one
+    with the fewest reads in progress relative to its weight.
+
+    Replicas that cannot be connected to or lag more than ``max_lag``
+    seconds behind the primary are taken out of rotation until a health
+    check finds them working again. Without any replica in rotation, reads
+    go to the primary.
+
+    ``db_flags`` are the ``db_cls`` arguments for the primary. The replica
+    connections use its database, user and options without transactions,
+    locks or statistics of their own. They run in autocommit mode, so each
+    read sees the latest replicated data instead of the snapshot taken by
+    the first read.
+    """
+
+    # Seconds between two health checks
+    check_interval = 5.0
+
+    def __init__(self, db_cls, db_flags, hosts, strategy=None, max_lag=None):
+        if strategy and strategy not in strategies:
+            raise ValueError('Unknown replica strategy %s' % strategy)
+        self.strategy = strategy or strategies[0]
+        self.max_lag = float(max_lag) if max_lag else None
+        self._db_cls = db_cls
+        self._db_flags = dict(db_flags, use_TM=False, transactions=False,
+                              mysql_lock=None, query_stats=None,
+                              slow_log=None, replicas=None, writers=None)
+        kw_args = dict(db_flags['kw_args'], autocommit=True)
+        kw_args.pop('unix_socket', None)
+        kw_args.pop('port', None)
+        self.hosts = []
+        for host in hosts:
+            host = dict(host)
+            weight = host.pop('weight', 1)
+            self.hosts.append(ReplicaHost(dict(kw_args, **host), weight))
+        self._lock = threading.Lock()
+        self._next = 0
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _choose(self):
+        """ Return the replica for the next read, or None if no replica is
+        in rotation.
+        """
+        hosts = [host for host in self.hosts if host.healthy]
+        if not hosts:
+            return None
+        if self.strategy == 'least_outstanding':
+            # rotate the start so ties are spread over all replicas
+            self._next += 1
+            start = self._next % len(hosts)
+            hosts = hosts[start:] + hosts[:start]
+            return min(hosts, key=lambda host: host.outstanding / host.weight)
+        # smooth weighted round-robin
+        total = 0
+        chosen = None
+        for host in hosts:
+            host.current += host.weight
+            total += host.weight
+            if chosen is None or host.current > chosen.current:
+                chosen = host
+        chosen.current -= total
+        return chosen
+
+    @contextmanager
+    def connection(self):
+        """ Check out a connection to a replica for one read.
+
+        None is provided if no replica can be used, so the read can fall
+        back to the primary. If the read loses the connection, it is closed
+        and the replica is taken out of rotation.
+        """
+        with self._lock:
+            host = self._choose()
+            if host is None:
+                db = None
+            else:
+                host.selected += 1
+                host.outstanding += 1
+                db = host.idle.pop() if host.idle else None
+        if host is None:
+            yield None
+            return
+        lost = False
+        try:
+            if db is None:
+                try:
+                    db = self._db_cls(**dict(self._db_flags,
+                                             kw_args=host.kw_args))
+                except OperationalError:
+                    LOG.warning('Cannot connect to replica %s' % host.name,
+                                exc_info=True)
+                    with self._lock:
+                        host.failures += 1
+                        self._eject(host)
+            try:
+                yield db
+            except OperationalError as exc:
+                lost = db is not None and _connection_error(exc)
+                if lost:
+                    LOG.warning('Lost connection to replica %s: %s' %
+                                (host.name, exc))
+                raise
+        finally:
+            with self._lock:
+                host.outstanding -= 1
+                if lost:
+                    host.failures += 1
+                    self._eject(host)
+                elif db is not None and db.db is not None:
+                    host.idle.append(db)
+            if lost:
+                try:
+                    db.close()
+                except Exception:
+                    pass
+
+    def _eject(self, host):
+        """ Take ``host`` out of rotation and drop its idle connections.
+        """
+        if host.healthy:
+            host.healthy = False
+            host.ejections += 1
+            host.current = 0
+            LOG.warning('Replica %s taken out of rotation' % host.name)
+        idle, host.idle = host.idle, []
+        for db in idle:
+            db.close()
+
+    def start(self):
+        """ Start checking the replicas in a background thread.
+        """
+        if self._thread is None and self.check_interval:
+            self._thread = threading.Thread(
+                target=_check_loop, name='zmysqlda-replicas', daemon=True,
+                args=(weakref.ref(self), self._stopped, self.check_interval))
+            self._thread.start()
+
+    def stop(self):
+        """ Stop the health checks.
+        """
+        self._stopped.set()
+
+    def check_hosts(self):
+        """ Measure the replication lag of all replicas and update which
+        of them are in rotation.
+        """
+        for host in self.hosts:
+            try:
+                lag = self._replication_lag(host)
+            except Error as exc:
+                LOG.warning('Health check of replica %s failed: %s' %
+                            (host.name, exc))
+                if host.check_db is not None:
+                    host.check_db.close()
+                    host.check_db = None
+                lag = None
+                healthy = False
+            else:
+                healthy = lag is not None and \
+                    (self.max_lag is None or lag <= self.max_lag)
+            with self._lock:
+                host.lag = lag
+                host.checked = time.time()
+                if not healthy:
+                    self._eject(host)
+                elif not host.healthy:
+                    host.healthy = True
+                    LOG.info('Replica %s back in rotation' % host.name)
+
+    def _replication_lag(self, host):
+        """ Return how many seconds ``host`` lags behind its primary.
+
+        None is returned if replication is not running, 0 if ``host``
+        is not a replica at all.
+        """
+        if host.check_db is None:
+            host.check_db = self._db_cls(**dict(self._db_flags,
+                                                kw_args=host.kw_args))
+        db = host.check_db
+        try:
+            result = db._query(host.status_query)
+        except ProgrammingError:
+            if host.status_query == status_queries[-1]:
+                raise
+            # Older servers only know the previous statement
+            host.status_query = status_queries[-1]
+            result = db._query(host.status_query)
+        if not result:
+            return 0
+        row = result.fetch_row(1)
+        if not row:
+            return 0
+        status = {info[0]: value
+                  for info, value in zip(result.describe(), row[0])}
+        lag = status.get('Seconds_Behind_Source',
+                         status.get('Seconds_Behind_Master'))
+        return None if lag is None else int(lag)
+
+    def stats(self):
+        """ Return the reads, connections and health of each replica.
+        """
+        with self._lock:
+            return [host.stats() for host in self.hosts]
+
+    def close(self):
+        """ Stop the health checks and close all idle connections.
+        """
+        self.stop()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(self.check_interval)
+        with self._lock:
+            for host in self.hosts:
+                for db in host.idle:
+                    db.close()
+                host.idle = []
+                if host.check_db is not None:
+                    host.check_db.close()
+                    host.check_db = None
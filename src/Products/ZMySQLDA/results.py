@@ -0,0 +1,169 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Alternative representations of query results
+"""
+import threading
+from array import array
+
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# ``array`` type codes for the numeric column types of ``DB.defs``
+array_typecodes = {'i': 'q', 'l': 'q', 'n': 'd'}
+
+
+class ColumnBuilder:
+    """ Collect the values of one result column
+
+    Numeric columns are stored in an ``array`` of 64 bit integers or
+    floats. If a value does not fit, like NULL, a Decimal or a number
+    outside the 64 bit range, the column falls back to a list.
+    """
+
+    def __init__(self, type_code):
+        typecode = array_typecodes.get(type_code)
+        self.values = array(typecode) if typecode else []
+
+    def extend(self, values):
+        """ Append the column ``values`` of a chunk of rows.
+        """
+        buffer = self.values
+        if isinstance(buffer, array):
+            size = len(buffer)
+            try:
+                if buffer.typecode == 'd' and \
+                   not all(type(value) is float for value in values):
+                    raise TypeError('not a float')
+                buffer.extend(values)
+                return
+            except (TypeError, OverflowError):
+                # ``extend`` may have appended some of the values
+                self.values = buffer = buffer[:size].tolist()
+        buffer.extend(values)
+
+    def result(self):
+        """ Return the column as NumPy array, ``array`` or list.
+        """
+        if numpy is not None and isinstance(self.values, array):
+            return numpy.frombuffer(self.values, dtype=self.values.typecode)
+        return self.values
+
+
+def _deferred(converter):
+    """ Wrap ``converter`` to be applied to a value read without it.
+    """
+    def convert(value):
+        # MySQLdb passes the value as string to converters
+        if isinstance(value, bytes):
+            value = value.decode()
+        return converter(value)
+    return convert
+
+
+def split_converters(conv):
+    """ Split the conversion mapping ``conv`` for reading lazy rows.
+
+    Returns the mapping to read results with, which keeps the encoders
+    and the decoders MySQLdb handles by type or field flags, and a
+    mapping of field types to the converters deferred to first access.
+    """
+    fetch_conv = {}
+    deferred = {}
+    for key, value in conv.items():
+        if isinstance(key, int) and callable(value) and \
+           value not in (str, bytes):
+            deferred[key] = _deferred(value)
+        else:
+            fetch_conv[key] = value
+    return fetch_conv, deferred
+
+
+def lazy_rows(rows, converters):
+    """ Wrap the unconverted ``rows`` in ``LazyRow`` objects.
+
+    ``converters`` holds a converter or None for each column.
+    """
+    converters = tuple(converters)
+    pending = 0
+    for index, converter in enumerate(converters):
+        if converter is not None:
+            pending |= 1 << index
+    if not pending:
+        return rows
+    lock = threading.Lock()
+    return tuple(LazyRow(row, converters, pending, lock) for row in rows)
+
+
+class LazyRow:
+    """ Result row converting each value when it is first accessed
+
+    It behaves like a tuple of the converted values. Converted values
+    are remembered, so every value is converted at most once, also when
+    threads share the row through the result cache.
+    """
+
+    __slots__ = ('_values', '_converters', '_pending', '_lock')
+
+    def __init__(self, values, converters, pending, lock):
+        self._values = list(values)
+        # shared by all rows of a result
+        self._converters = converters
+        self._lock = lock
+        # bit mask of the columns not converted yet
+        self._pending = pending
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self[i]
+                         for i in range(*index.indices(len(self._values))))
+        value = self._values[index]
+        if index < 0:
+            index += len(self._values)
+        if self._pending >> index & 1:
+            with self._lock:
+                # another thread may have converted it in the meantime
+                if self._pending >> index & 1:
+                    value = self._values[index]
+                    if value is not None:
+                        value = self._converters[index](value)
+                        self._values[index] = value
+                    self._pending &= ~(1 << index)
+                else:
+                    value = self._values[index]
+        return value
+
+    def __len__(self):
+        return len(self._values)
+
+    def __iter__(self):
+        for index in range(len(self._values)):
+            yield self[index]
+
+    def __eq__(self, other):
+        if isinstance(other, (LazyRow, tuple)):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(tuple(self))
+
+    def __repr__(self):
+        return repr(tuple(self))
+
+    def __reduce__(self):
+        # Copies and pickles are plain tuples
+        return tuple, (tuple(self),)
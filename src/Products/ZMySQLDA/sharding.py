@@ -0,0 +1,363 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Queries routed to one of several databases by a shard key
+"""
+import hashlib
+import re
+from bisect import bisect_right
+
+from MySQLdb import ProgrammingError
+
+from DateTime.DateTime import DateTime
+
+
+# Comment naming the shard key of a query, like ``/* shard_key: 42 */``
+shard_hint = re.compile(r"/\*\s*shard_key\s*[:=]\s*(.*?)\s*\*/", re.DOTALL)
+
+
+def hint_key(sql_string):
+    """ Return the shard key named in ``sql_string`` and the statements
+    without the comment naming it, or None and ``sql_string``.
+
+    Quoted keys, as rendered by ``dtml-sqlvar`` for strings, are unquoted.
+    """
+    match = shard_hint.search(sql_string)
+    if match is None:
+        return None, sql_string
+    key = match.group(1)
+    if len(key) > 1 and key[0] == key[-1] and key[0] in '\'"':
+        key = key[1:-1].replace(key[0] * 2, key[0]).replace('\\', '')
+    return key, '%s %s' % (sql_string[:match.start()],
+                           sql_string[match.end():])
+
+
+class HashShardMap:
+    """ Spreads keys evenly over the shards by a stable hash of their text
+
+    A key goes to the shard whose name scores the highest hash together
+    with the key. The order of the shards does not matter, and adding a
+    shard only moves the keys that the new shard takes over.
+    """
+
+    def __init__(self, names, ranges=''):
+        self.names = [(name, (name + '\0').encode('utf-8'))
+                      for name in names]
+
+    def __call__(self, key):
+        key = str(key).encode('utf-8')
+        score, name = max((self._score(prefix, key), name)
+                          for name, prefix in self.names)
+        return name
+
+    @staticmethod
+    def _score(name, key):
+        return hashlib.blake2b(name + key, digest_size=8).digest()
+
+
+class RangeShardMap:
+    """ Assigns keys to shards by ranges of values
+
+    ``ranges`` has one ``lower_bound shard_name`` line for each range. A
+    range reaches up to the next bound. If all bounds are integers, keys
+    are compared as integers, otherwise as strings.
+    """
+
+    def __init__(self, names, ranges=''):
+        bounds = []
+        for line in ranges.splitlines():
+            if line.strip():
+                bound, name = line.split()
+                if name not in names:
+                    raise ValueError('Unknown shard %s' % name)
+                bounds.append((bound, name))
+        if not bounds:
+            raise ValueError('No shard ranges given')
+        try:
+            bounds = [(int(bound), name) for bound, name in bounds]
+            self.convert = int
+        except ValueError:
+            self.convert = str
+        bounds.sort()
+        self.bounds = [bound for bound, name in bounds]
+        self.names = [name for bound, name in bounds]
+
+    def __call__(self, key):
+        index = bisect_right(self.bounds, self.convert(key)) - 1
+        if index < 0:
+            raise ValueError('No shard for key %r' % key)
+        return self.names[index]
+
+
+class ShardedPool:
+    """ Database connection with one ``DBPool`` for each shard
+
+    The connection string has one ``shard_name connection_string`` line
+    for each shard. ``pool_factory`` returns a new, not yet connected
+    ``DBPool`` with the options of all shards. The pools share their
+    query statistics and slow query log.
+
+    Queries run on the shard of their key. It is passed by the caller or
+    named in a ``/* shard_key: ... */`` comment, which Z SQL methods can
+    render from their arguments. ``shard_map`` names the way keys are
+    mapped to shards, one of ``shard_maps``. Queries without a key fail,
+    ``query_shards`` runs a reading query on all shards at once.
+    """
+
+    connected_timestamp = ''
+    # Settings of the Zope connection object the pool was made for
+    settings = None
+
+    # Ways to map shard keys to shards, called with the shard names and
+    # the ``shard_ranges`` setting
+    shard_maps = {'hash': HashShardMap, 'range': RangeShardMap}
+
+    def __init__(self, pool_factory, shard_map=None, shard_ranges=''):
+        self._pool_factory = pool_factory
+        self.shard_map = shard_map or 'hash'
+        if self.shard_map not in self.shard_maps:
+            raise ValueError('Unknown shard map %s' % self.shard_map)
+        self.shard_ranges = shard_ranges or ''
+        self.shards = {}
+
+    def __call__(self, connection):
+        """ Connect all shards listed in the connection string.
+        """
+        self.connection = connection
+        shards = {}
+        first = None
+        try:
+            for line in connection.splitlines():
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    name, conn_string = line.split(None, 1)
+                except ValueError:
+                    raise ValueError('No connection string for shard %s' %
+                                     line)
+                pool = self._pool_factory()
+                if first is None:
+                    first = pool
+                else:
+                    pool._query_stats = first._query_stats
+                    pool._slow_log = first._slow_log
+                shards[name] = pool(conn_string)
+            if not shards:
+                raise ValueError('No shards in the connection string')
+            self._map = self.shard_maps[self.shard_map](list(shards),
+                                                        self.shard_ranges)
+        except Exception:
+            for pool in shards.values():
+                pool.close()
+            raise
+        self.shards = shards
+        self.connected_timestamp = DateTime()
+        return self
+
+    @property
+    def _first(self):
+        return next(iter(self.shards.values()))
+
+    def shard_name(self, shard_key):
+        """ Return the name of the shard holding ``shard_key``.
+        """
+        return self._map(shard_key)
+
+    def shard(self, shard_key):
+        """ Return the ``DBPool`` of the shard holding ``shard_key``.
+        """
+        return self.shards[self._map(shard_key)]
+
+    def _route(self, sql_string, shard_key):
+        """ Return the pool for ``sql_string`` and the statements to run,
+        or None if it has no shard key.
+        """
+        hinted, sql_string = hint_key(sql_string)
+        if shard_key is None:
+            shard_key = hinted
+        if shard_key is None:
+            return None, sql_string
+        return self.shard(shard_key), sql_string
+
+    def query(self, sql_string, max_rows=1000, shard_key=None):
+        """ Run ``sql_string`` on the shard of its key.
+
+            Queries without a key fail instead of running on a shard that
+            may not hold their rows. ``query_shards`` runs them on all
+            shards.
+        """
+        pool, sql_string = self._route(sql_string, shard_key)
+        if pool is None:
+            raise ProgrammingError('No shard key: %s' % sql_string[:200])
+        return pool.query(sql_string, max_rows)
+
+    def query_shards(self, sql_string, max_rows=1000):
+        """ Run the reading query ``sql_string`` on all shards at once.
+
+            Returns a mapping of shard names to the ``(items, rows)``
+            results of the shards that succeeded and a mapping of shard
+            names to the errors of the others.
+        """
+        hinted, sql_string = hint_key(sql_string)
+        futures = {name: pool._parallel.submit(sql_string, max_rows)
+                   for name, pool in self.shards.items()}
+        results = {}
+        errors = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as exc:
+                errors[name] = exc
+        return results, errors
+
+    def query_parallel(self, queries, max_rows=1000):
+        """ Run ``queries`` concurrently, each on the shard of its key.
+
+            Returns the results and errors like ``DBPool.query_parallel``.
+            Queries without a shard key fail.
+        """
+        futures = []
+        for sql_string in queries:
+            pool, sql_string = self._route(sql_string, None)
+            if pool is None:
+                futures.append(ProgrammingError('No shard key: %s' %
+                                                sql_string[:200]))
+            else:
+                futures.append(pool._parallel.submit(sql_string, max_rows))
+        results = []
+        errors = {}
+        for index, future in enumerate(futures):
+            try:
+                if isinstance(future, Exception):
+                    raise future
+                results.append(future.result())
+            except Exception as exc:
+                results.append(None)
+                errors[index] = exc
+        return results, errors
+
+    def _keyed(method_id):
+        def method(self, sql_string, *args, **kw):
+            pool, sql_string = self._route(sql_string,
+                                           kw.pop('shard_key', None))
+            if pool is None:
+                raise ProgrammingError('%s needs a shard key' % method_id)
+            return getattr(pool, method_id)(sql_string, *args, **kw)
+        method.__name__ = method_id
+        method.__doc__ = """ Run ``DBPool.%s`` on the shard of the key
+            passed as ``shard_key`` or named in ``sql_string``.
+        """ % method_id
+        return method
+
+    query_stream = _keyed('query_stream')
+    query_columns = _keyed('query_columns')
+    query_prepared = _keyed('query_prepared')
+    query_async = _keyed('query_async')
+    del _keyed
+
+    def bulk_insert(self, *args, **kw):
+        raise ProgrammingError('Rows must be inserted into the shard of '
+                               'their key, use shard(key).bulk_insert')
+
+    def load_data(self, *args, **kw):
+        raise ProgrammingError('Rows must be loaded into the shard of '
+                               'their key, use shard(key).load_data')
+
+    def closeConnection(self):
+        for pool in self.shards.values():
+            pool.closeConnection()
+
+    def close(self):
+        for pool in self.shards.values():
+            pool.close()
+
+    # The schema is the same on all shards
+    def name(self):
+        return self._first.name()
+
+    def variables(self, *args, **kw):
+        return self._first.variables(*args, **kw)
+
+    def tables(self, *args, **kw):
+        return self._first.tables(*args, **kw)
+
+    def columns(self, *args, **kw):
+        return self._first.columns(*args, **kw)
+
+    def schema(self, *args, **kw):
+        return self._first.schema(*args, **kw)
+
+    def string_literal(self, *args, **kw):
+        return self._first.string_literal(*args, **kw)
+
+    def unicode_literal(self, *args, **kw):
+        return self._first.unicode_literal(*args, **kw)
+
+    # Statistics shared by all shards
+    def query_stats(self):
+        return self._first.query_stats()
+
+    def top_queries(self, limit=20, order='total'):
+        return self._first.top_queries(limit, order)
+
+    def reset_query_stats(self):
+        self._first.reset_query_stats()
+
+    def slow_queries(self):
+        return self._first.slow_queries()
+
+    def clear_slow_queries(self):
+        self._first.clear_slow_queries()
+
+    # Statistics of each shard
+    def pool_stats(self):
+        return {name: pool.pool_stats()
+                for name, pool in self.shards.items()}
+
+    def cache_stats(self):
+        return {name: pool.cache_stats()
+                for name, pool in self.shards.items()}
+
+    def schema_cache_stats(self):
+        return {name: pool.schema_cache_stats()
+                for name, pool in self.shards.items()}
+
+    def replica_stats(self):
+        return [dict(stats, shard=name)
+                for name, pool in self.shards.items()
+                for stats in pool.replica_stats()]
+
+    def writer_stats(self):
+        return {}
+
+    def shard_stats(self):
+        """ Return the name, server and database of each shard.
+        """
+        stats = []
+        for name, pool in self.shards.items():
+            kw_args = pool._db_flags['kw_args']
+            host = kw_args.get('unix_socket') or kw_args.get('host', '')
+            if kw_args.get('port'):
+                host = '%s:%d' % (host, kw_args['port'])
+            host = pool.writer_stats().get('host', host)
+            stats.append({'name': name, 'host': host,
+                          'database': kw_args.get('db', '')})
+        return stats
+
+    def clear_cache(self):
+        for pool in self.shards.values():
+            pool.clear_cache()
+
+    def clear_schema_cache(self, table_name=None):
+        for pool in self.shards.values():
+            pool.clear_schema_cache(table_name)
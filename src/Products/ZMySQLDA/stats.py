@@ -0,0 +1,306 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Query statistics shared by all threads using a database connection
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from functools import lru_cache
+
+
+# Upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5,
+                   1.0, 2.0, 5.0, 10.0)
+
+# Number of rows whose size is measured to estimate the size of a result
+SAMPLE_ROWS = 16
+
+# Number of statement fingerprints whose statistics are kept
+MAX_FINGERPRINTS = 500
+
+# Length of the sample statements kept for fingerprints
+SAMPLE_LENGTH = 2000
+
+# Orders of ``QueryStats.top``
+top_orders = frozenset(('count', 'total', 'mean', 'p95', 'max', 'rows',
+                        'errors'))
+
+_tokens = re.compile(r"""
+  (?=[`/\-\#'"\d.xbn])                  # skip other characters fast
+  (?:(`(?:[^`]|``)*`)                   # quoted name, kept
+  | (/\*.*?\*/|(?:--\s|\#)[^\n]*)         # comment, dropped
+  | (?:\b[xb])?'(?:[^'\\]|\\.|'')*'       # literals
+  | "(?:[^"\\]|\\.|"")*"
+  | \b0x[0-9a-f]+\b | \bNULL\b
+  | (?<![\w$])\d+(?:\.\d*)?(?:e[-+]?\d+)?(?![\w$])
+  | (?<![\w$.])\.\d+(?:e[-+]?\d+)?(?![\w$]))
+""", re.IGNORECASE | re.DOTALL | re.VERBOSE)
+_list = re.compile(r'\(\s*-?\?(?:\s*,\s*-?\?)*\s*\)')
+_rows = re.compile(r'\(\?\+\)(?:\s*,\s*\(\?\+\))+')
+_space = re.compile(r'\s+')
+
+
+def _token(match):
+    name, comment = match.groups()
+    if name:
+        return name
+    return ' ' if comment else '?'
+
+
+def fingerprint(sql):
+    """ Return ``sql`` with its literal values replaced by ``?``.
+
+    Lists of values like ``IN`` lists and the rows of multi-row
+    ``INSERT`` statements are collapsed to ``(?+)``, comments are dropped
+    and whitespace and case are normalized, so statements only differing
+    in their values have the same fingerprint. Statements separated by
+    null characters are fingerprinted one by one.
+    """
+    statements = []
+    for statement in sql.split('\0'):
+        statement = _tokens.sub(_token, statement)
+        statement = _rows.sub('(?+)', _list.sub('(?+)', statement))
+        statement = _space.sub(' ', statement).strip()
+        if statement:
+            statements.append(statement.lower())
+    return ';\n'.join(statements)
+
+
+@lru_cache(maxsize=1024)
+def _cached_fingerprint(sql):
+    return fingerprint(sql)
+
+
+def query_fingerprint(sql):
+    """ Return the fingerprint of ``sql``, remembering those of recent
+    statements up to ``SAMPLE_LENGTH`` characters long.
+    """
+    if len(sql) > SAMPLE_LENGTH:
+        return fingerprint(sql)
+    return _cached_fingerprint(sql)
+
+
+def result_bytes(rows):
+    """ Estimate the number of bytes of the values of ``rows``.
+
+    Only the first ``SAMPLE_ROWS`` rows are measured. Strings count with
+    their length, other values with 8 bytes.
+    """
+    if not rows:
+        return 0
+    sample = rows[:SAMPLE_ROWS]
+    size = 0
+    for row in sample:
+        # Unconverted values of lazy rows
+        for value in getattr(row, '_values', row):
+            if isinstance(value, (bytes, str)):
+                size += len(value)
+            elif value is not None:
+                size += 8
+    return size * len(rows) // len(sample)
+
+
+def column_bytes(columns):
+    """ Estimate the number of bytes of the values of a result read by
+    column, like ``result_bytes`` does for rows.
+    """
+    if not columns or not len(columns[0]):
+        return 0
+    sample = list(zip(*[column[:SAMPLE_ROWS] for column in columns]))
+    return result_bytes(sample) * len(columns[0]) // len(sample)
+
+
+class Histogram:
+    """ Count of durations in buckets of ``LATENCY_BUCKETS``
+    """
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """ Return the upper bound of the bucket holding the given
+        ``fraction`` of the durations, or the maximum for the last bucket.
+        """
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def stats(self):
+        """ Return count, time and percentile statistics and the buckets.
+        """
+        return {'count': self.count, 'total': self.total,
+                'mean': self.total / self.count if self.count else 0.0,
+                'max': self.max, 'p50': self.percentile(0.5),
+                'p95': self.percentile(0.95), 'p99': self.percentile(0.99),
+                'buckets': list(zip(self.bounds + (None,), self.counts))}
+
+
+class QueryStats:
+    """ Timing of queries and statements of all connections of a pool
+
+    ``queries`` counts calls of ``DB.query`` including the conversion of
+    the result, ``statements`` the statements sent to the server
+    including the transfer of their results.
+
+    Queries are also aggregated by their fingerprint. If there are more
+    than ``max_fingerprints`` of them, the tenth with the least total
+    time is dropped.
+    """
+
+    def __init__(self, max_fingerprints=MAX_FINGERPRINTS):
+        self._lock = threading.Lock()
+        self.max_fingerprints = max_fingerprints
+        self.reset()
+
+    def reset(self):
+        """ Forget all recorded queries.
+        """
+        with self._lock:
+            self.queries = Histogram()
+            self.statements = Histogram()
+            self.rows = 0
+            self.bytes = 0
+            self.errors = 0
+            self.started = time.time()
+            # fingerprint: [histogram, rows, errors, sample statement]
+            self.fingerprints = {}
+            self.dropped = 0
+
+    def record_query(self, seconds, rows, size, sql=None):
+        """ Record a query returning ``rows`` rows of ``size`` bytes.
+        """
+        fprint = sql and query_fingerprint(sql)
+        with self._lock:
+            self.queries.add(seconds)
+            self.rows += rows
+            self.bytes += size
+            if fprint:
+                entry = self._fingerprint_entry(fprint, sql)
+                entry[0].add(seconds)
+                entry[1] += rows
+
+    def record_statement(self, seconds):
+        with self._lock:
+            self.statements.add(seconds)
+
+    def record_error(self, seconds, sql=None):
+        fprint = sql and query_fingerprint(sql)
+        with self._lock:
+            self.queries.add(seconds)
+            self.errors += 1
+            if fprint:
+                entry = self._fingerprint_entry(fprint, sql)
+                entry[0].add(seconds)
+                entry[2] += 1
+
+    def _fingerprint_entry(self, fprint, sql):
+        entry = self.fingerprints.get(fprint)
+        if entry is None:
+            if len(self.fingerprints) >= self.max_fingerprints:
+                self._drop_fingerprints()
+            entry = self.fingerprints[fprint] = [Histogram(), 0, 0,
+                                                 sql[:SAMPLE_LENGTH]]
+        return entry
+
+    def _drop_fingerprints(self):
+        """ Make room by dropping the fingerprints with the least time.
+        """
+        fingerprints = self.fingerprints
+        by_total = sorted(fingerprints,
+                          key=lambda fprint: fingerprints[fprint][0].total)
+        dropped = by_total[:max(len(by_total) // 10, 1)]
+        for fprint in dropped:
+            del fingerprints[fprint]
+        self.dropped += len(dropped)
+
+    def top(self, limit=20, order='total'):
+        """ Return the statistics of the ``limit`` query fingerprints
+        with the highest ``order`` value, one of ``top_orders``.
+        """
+        if order not in top_orders:
+            raise ValueError('Unknown order %r.' % order)
+        with self._lock:
+            top = []
+            for fprint, (histogram, rows, errors, sql) in \
+                    self.fingerprints.items():
+                stats = histogram.stats()
+                del stats['buckets']
+                stats.update(fingerprint=fprint, sample=sql, rows=rows,
+                             errors=errors)
+                top.append(stats)
+        top.sort(key=lambda stats: stats[order], reverse=True)
+        return top[:limit]
+
+    def stats(self):
+        """ Return the statistics of queries and statements.
+        """
+        with self._lock:
+            return {'queries': self.queries.stats(),
+                    'statements': self.statements.stats(),
+                    'rows': self.rows, 'bytes': self.bytes,
+                    'errors': self.errors, 'started': self.started,
+                    'fingerprints': len(self.fingerprints),
+                    'dropped_fingerprints': self.dropped,
+                    'seconds': time.time() - self.started}
+
+
+class SlowQueryLog:
+    """ The most recent queries slower than ``threshold`` seconds
+
+    With ``explain`` the plans of their statements are kept as well.
+    """
+
+    def __init__(self, threshold, explain=False, size=100):
+        self.threshold = threshold
+        self.explain = explain
+        self._lock = threading.Lock()
+        self._entries = deque(maxlen=size)
+
+    def add(self, sql, seconds, rows, plans=None):
+        """ Record a slow query run by the current thread.
+        """
+        entry = {'time': time.time(), 'sql': sql, 'seconds': seconds,
+                 'rows': rows, 'thread': threading.current_thread().name,
+                 'plans': plans}
+        with self._lock:
+            self._entries.append(entry)
+        return entry
+
+    def entries(self):
+        """ Return the recorded queries, the most recent first.
+        """
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
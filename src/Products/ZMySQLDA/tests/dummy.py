@@ -12,13 +12,62 @@
 ##############################################################################
 """ Dummy fixtures for testing
 """
+import socket
+
 from MySQLdb import OperationalError
+from MySQLdb.constants import FIELD_TYPE
 
 
 RESULTS = {'show table status': [['table1', 'engine1', None, None, 5, None,
                                   None, None, None, None, None, None, None,
                                   None, 'my_collation']],
-           'show variables': [('var1', 'val1'), ('version', '5.5.5')]}
+           'show variables': [('var1', 'val1'), ('version', '5.5.5')],
+           'select * from table1': [(1, 'a'), (2, 'b'), (3, 'c')],
+           'select * from table2': [(b'1', b'2024-01-02', b'a'),
+                                    (b'2', None, b'b')],
+           'explain select * from table1': [(1, 'SIMPLE', 'table1', 'ALL',
+                                             None, 3)],
+           'show replica status': [('Yes', 'Yes', 4)],
+           'show slave status': [('Yes', 'No', None)],
+           ('select table_name, engine, table_rows, table_collation, '
+            'table_type from information_schema.tables '
+            'where table_schema = database() order by table_name'): [
+               ('table1', 'engine1', 5, 'my_collation', 'BASE TABLE'),
+               ('view1', None, None, None, 'VIEW')],
+           ('select table_name, column_name, column_type, is_nullable, '
+            'column_key, column_default, extra '
+            'from information_schema.columns '
+            'where table_schema = database() '
+            'order by table_name, ordinal_position'): [
+               ('table1', 'c_int', 'int(10)', 'NO', 'PRI', None, ''),
+               ('table1', 'c_varchar', 'varchar(20)', 'YES', '', None, ''),
+               ('view1', 'c_int', 'int(10)', 'NO', '', None, '')]}
+
+DESCRIPTIONS = {'show variables': (('Variable_name', 253, 7, 64, 64, 0, 0),
+                                   ('Value', 253, 5, 1024, 1024, 0, 1)),
+                'select * from table1': (('c_int', 3, 10, 10, 10, 0, 0),
+                                         ('c_varchar', 253, 1, 20, 20, 0, 1)),
+                'select * from table2': (('c_int', 3, 10, 10, 10, 0, 0),
+                                         ('c_date', 10, 10, 10, 10, 0, 1),
+                                         ('c_varchar', 253, 1, 20, 20, 0, 1)),
+                'explain select * from table1': (
+                    ('id', 3, 1, 10, 10, 0, 0),
+                    ('select_type', 253, 6, 20, 20, 0, 0),
+                    ('table', 253, 6, 64, 64, 0, 1),
+                    ('type', 253, 3, 10, 10, 0, 1),
+                    ('key', 253, 0, 64, 64, 0, 1),
+                    ('rows', 8, 1, 20, 20, 0, 1)),
+                'show replica status': (
+                    ('Replica_IO_Running', 253, 3, 3, 3, 0, 0),
+                    ('Replica_SQL_Running', 253, 3, 3, 3, 0, 0),
+                    ('Seconds_Behind_Source', 8, 1, 21, 21, 0, 1)),
+                'show slave status': (
+                    ('Slave_IO_Running', 253, 3, 3, 3, 0, 0),
+                    ('Slave_SQL_Running', 253, 3, 3, 3, 0, 0),
+                    ('Seconds_Behind_Master', 8, 1, 21, 21, 0, 1))}
+
+TEXT_TYPES = (FIELD_TYPE.STRING, FIELD_TYPE.VAR_STRING, FIELD_TYPE.VARCHAR,
+              FIELD_TYPE.BLOB, FIELD_TYPE.JSON)
 
 TABLE = {'table_name': 'table1', 'table_type': 'type1', 'description': ''}
 
@@ -37,12 +86,32 @@ class FakeColumns:
 
 class FakeResults:
 
-    def __init__(self, results, **kw):
+    def __init__(self, results, description=None, **kw):
         self.results = results
+        self.description = description
         self.next_index = 0
 
+    def describe(self):
+        return self.description
+
+    def __bool__(self):
+        # MySQLdb returns no result for statements without result set
+        return self.description is not None
+
+    def decode(self, columns):
+        """ Decode the bytes values of the ``columns`` flagged True.
+        """
+        self.results = [tuple(value.decode() if decode and
+                              isinstance(value, bytes) else value
+                              for decode, value in zip(columns, row))
+                        for row in self.results]
+
     def fetch_row(self, count):
-        return self.results
+        if not count:
+            count = len(self.results)
+        rows = self.results[self.next_index:self.next_index + count]
+        self.next_index += len(rows)
+        return tuple(rows)
 
 
 class FakeConnection:
@@ -54,9 +123,20 @@ class FakeConnection:
         self.string_literal_called = False
         self.unicode_literal_called = False
         self.ping_raises = False
+        self.converter = {}
+        self.encoding = 'utf8'
+        self.infile_data = None
+        self.info_string = None
+        self.next_results = []
+        self.sockets = None
 
         for k, v in kw.items():
             setattr(self, k, v)
+        if kw.get('use_unicode'):
+            # Like MySQLdb, text columns are decoded by the connection
+            self.converter = dict(kw.get('conv', {}))
+            for field_type in TEXT_TYPES:
+                self.converter[field_type] = str
 
     def ping(self, *args):
         if self.ping_raises:
@@ -64,17 +144,75 @@ class FakeConnection:
 
     def query(self, sql):
         self.last_query = sql
+        self.next_results = []
+        if isinstance(sql, str) and sql.startswith('LOAD DATA LOCAL'):
+            with open(sql.split("'")[1], 'rb') as infile:
+                self.infile_data = infile.read()
+            self.info_string = ('Records: %d  Deleted: 0  Skipped: 0  '
+                                'Warnings: 0' % self.infile_data.count(b'\n'))
         sql = sql.lower()
-        self.last_results = FakeResults(RESULTS.get(sql, []))
+        if isinstance(sql, str):
+            for statement in sql.split(';\n'):
+                # The row limit is applied by ``fetch_row``
+                statement = statement.split(' limit ')[0]
+                self.next_results.append(FakeResults(
+                    RESULTS.get(statement, []),
+                    description=DESCRIPTIONS.get(statement)))
+        else:
+            self.next_results.append(FakeResults([]))
+        self.last_results = self.next_results.pop(0)
         return self.last_results
 
     _query = query
 
+    def send_query(self, sql):
+        self.query(sql)
+
+    def read_query_result(self):
+        pass
+
+    def fileno(self):
+        # A socket that is always readable, like one with a server answer
+        if self.sockets is None:
+            self.sockets = socket.socketpair()
+            self.sockets[1].send(b'x')
+        return self.sockets[0].fileno()
+
     def store_result(self):
-        return self.last_results
+        results = self.last_results
+        if results and str in self.converter.values():
+            results.decode([self.converter.get(info[1]) is str
+                            for info in results.describe()])
+        return results
+
+    use_result = store_result
 
     def close(self):
-        pass
+        if self.sockets is not None:
+            for sock in self.sockets:
+                sock.close()
+            self.sockets = None
+
+    def info(self):
+        return self.info_string
+
+    def character_set_name(self):
+        return 'utf8mb4'
+
+    def next_result(self):
+        if self.next_results:
+            self.last_results = self.next_results.pop(0)
+            return 0
+        return -1
+
+    def literal(self, value):
+        if value is None:
+            return b'NULL'
+        if isinstance(value, str):
+            value = value.encode('UTF-8')
+        if isinstance(value, bytes):
+            return b"'%s'" % value.replace(b"'", b"\\'")
+        return str(value).encode('UTF-8')
 
     def string_literal(self, txt):
         self.string_literal_called = txt
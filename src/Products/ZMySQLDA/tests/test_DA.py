@@ -49,6 +49,43 @@ class ConnectionTests(unittest.TestCase):
         self.assertIsNone(conn.charset)
         self.assertTrue(conn.auto_create_db)
         self.assertEqual(conn.timeout, 3)
+        self.assertIsNone(conn.pool_min_size)
+        self.assertIsNone(conn.pool_max_size)
+        self.assertIsNone(conn.pool_timeout)
+
+    def test_initialization_shared_pool(self):
+        conn = self._makeOne('conn_id', 'Conn Title', 'db_conn_string', False,
+                             pool_min_size='0', pool_max_size='10',
+                             pool_timeout='1.5', idle_timeout='300',
+                             max_lifetime='', pool_warmup='4',
+                             ping_interval='0', result_cache_ttl='60',
+                             result_cache_size='', schema_cache_ttl='300',
+                             date_conversion='fast', conv_profile='raw',
+                             lazy_rows='yes', batch_queries='yes',
+                             local_infile='yes', slow_query_time='0.5',
+                             explain_slow_queries='yes',
+                             replica_strategy='least_outstanding',
+                             replica_max_lag='30', parallel_queries='8')
+        self.assertEqual(conn.pool_min_size, 0)
+        self.assertEqual(conn.pool_max_size, 10)
+        self.assertEqual(conn.pool_timeout, 1.5)
+        self.assertEqual(conn.idle_timeout, 300.0)
+        self.assertIsNone(conn.max_lifetime)
+        self.assertEqual(conn.pool_warmup, 4)
+        self.assertEqual(conn.ping_interval, 0.0)
+        self.assertEqual(conn.result_cache_ttl, 60.0)
+        self.assertIsNone(conn.result_cache_size)
+        self.assertEqual(conn.schema_cache_ttl, 300.0)
+        self.assertEqual(conn.date_conversion, 'fast')
+        self.assertEqual(conn.conv_profile, 'raw')
+        self.assertTrue(conn.lazy_rows)
+        self.assertTrue(conn.batch_queries)
+        self.assertTrue(conn.local_infile)
+        self.assertEqual(conn.slow_query_time, 0.5)
+        self.assertTrue(conn.explain_slow_queries)
+        self.assertEqual(conn.replica_strategy, 'least_outstanding')
+        self.assertEqual(conn.replica_max_lag, 30.0)
+        self.assertEqual(conn.parallel_queries, 8)
 
     def test_factory(self):
         from Products.ZMySQLDA.db import DB
@@ -90,6 +127,13 @@ class ConnectionTests(unittest.TestCase):
         self.assertTrue(conn.connected())
         self.assertEqual(conn.timeout, 20)
 
+        conn.manage_edit('Another Title', 'another_conn_string',
+                         pool_min_size='', pool_max_size='4',
+                         pool_timeout='')
+        self.assertIsNone(conn.pool_min_size)
+        self.assertEqual(conn.pool_max_size, 4)
+        self.assertIsNone(conn.pool_timeout)
+
         Connection.connect = old_connect
 
     def test_zope_factory(self):
@@ -153,11 +197,154 @@ class PatchedConnectionTests(PatchedConnectionTestsBase):
         self.assertIsInstance(self.conn._v_database_connection, DBPool)
         self.assertIsInstance(self.conn._v_connected, DateTime)
 
+    def test_connect_shared_pool(self):
+        self.conn = self._makeOne('conn_id', 'Conn Title', 'db_conn_string',
+                                  False, pool_max_size=3, pool_timeout=2,
+                                  idle_timeout=60, max_lifetime=3600)
+        self.conn.connect(self.conn.connection_string)
+        pool = self.conn._v_database_connection
+        self.assertEqual(pool.pool_max_size, 3)
+        self.assertEqual(pool.pool_timeout, 2.0)
+        self.assertEqual(pool.idle_timeout, 60.0)
+        self.assertEqual(pool.max_lifetime, 3600.0)
+        self.assertEqual(self.conn.pool_stats()['max_size'], 3)
+
+    def test_manage_edit_replaces_pool(self):
+        self.conn = self._simpleMakeOne()
+        self.conn._pool_key = lambda: ('conn_id',)
+        self.conn.connect(self.conn.connection_string)
+        old = self.conn._v_database_connection
+        old.query_parallel(['SELECT * FROM table1'])
+        self.assertIsNotNone(old._parallel._executor)
+
+        # Unchanged settings keep the pool
+        self.conn.manage_edit('Conn Title', 'db_conn_string', check=True)
+        self.assertIs(self.conn._v_database_connection, old)
+
+        self.conn.manage_edit('Conn Title', 'db_conn_string',
+                              pool_max_size='5', result_cache_ttl='60',
+                              slow_query_time='1')
+        with self.assertRaises(AttributeError):
+            self.conn._v_database_connection
+        pool = self.conn._getConnection()
+        self.assertIsNot(pool, old)
+        self.assertEqual(pool.pool_max_size, 5)
+        # The replaced pool was closed completely
+        self.assertEqual(old._db_pool, {})
+        self.assertIsNone(old._parallel._executor)
+        self.assertIsNotNone(pool._result_cache)
+        self.assertIsNotNone(pool._slow_log)
+
     def test_tpValues(self):
         self.conn = self._simpleMakeOne()
         vals = self.conn.tpValues()
         self.assertEqual(vals[0].__name__, 'table1')
         self.assertEqual(vals[0].icon, 'table')
+        self.assertEqual(vals[1].__name__, 'view1')
+        self.assertEqual(vals[1].icon, 'view')
+
+        # Columns were read together with the tables
+        db_pool = self.conn._v_database_connection._db_pool
+        internal_conn = db_pool.get(get_ident()).db
+        internal_conn.last_query = None
+        cols = vals[0].tpValues()
+        self.assertEqual(cols[0].tpId(), 'c_int')
+        self.assertEqual(cols[1].tpId(), 'c_varchar')
+        self.assertIsNone(internal_conn.last_query)
+
+    def test_query_stream(self):
+        self.conn = self._simpleMakeOne()
+        items, rows = self.conn.query_stream('SELECT * FROM table1',
+                                             chunk_size=2)
+        self.assertEqual(len(items), 2)
+        self.assertEqual(list(rows), [(1, 'a'), (2, 'b'), (3, 'c')])
+
+    def test_query_columns(self):
+        self.conn = self._simpleMakeOne()
+        items, columns = self.conn.query_columns('SELECT * FROM table1')
+        self.assertEqual(len(items), 2)
+        self.assertEqual(list(columns[0]), [1, 2, 3])
+        self.assertEqual(columns[1], ['a', 'b', 'c'])
+
+    def test_query_parallel(self):
+        self.conn = self._simpleMakeOne()
+        results, errors = self.conn.query_parallel(['SELECT * FROM table1',
+                                                    'SELECT * FROM table2'])
+        self.assertEqual(errors, {})
+        self.assertEqual([len(rows) for items, rows in results], [3, 2])
+
+    def test_query_async(self):
+        import asyncio
+        self.conn = self._simpleMakeOne()
+        items, rows = asyncio.run(
+            self.conn.query_async('SELECT * FROM table1', max_rows=2))
+        self.assertEqual(len(rows), 2)
+
+    def test_query_prepared(self):
+        self.conn = self._simpleMakeOne()
+        self.conn.query_prepared('SELECT * FROM table1 WHERE c_int = ?', (1,))
+
+        db_pool = self.conn._v_database_connection._db_pool
+        internal_conn = db_pool.get(get_ident()).db
+        self.assertEqual(internal_conn.last_query,
+                         b'SET @zmysqlda_p0=1;'
+                         b'EXECUTE zmysqlda_stmt1 USING @zmysqlda_p0')
+
+    def test_bulk_insert(self):
+        self.conn = self._simpleMakeOne()
+        stats = self.conn.bulk_insert('table2', ['c_int'], [(1,), (2,)])
+
+        self.assertEqual(stats['rows'], 2)
+        db_pool = self.conn._v_database_connection._db_pool
+        internal_conn = db_pool.get(get_ident()).db
+        self.assertEqual(internal_conn.last_query,
+                         b'INSERT INTO `table2` (`c_int`) VALUES (1),(2)')
+
+    def test_cache_stats(self):
+        self.conn = self._simpleMakeOne()
+        self.conn.result_cache_ttl = 60
+        self.conn.connect(self.conn.connection_string)
+
+        db_pool = self.conn._v_database_connection
+        db_pool.query('SELECT * FROM table1')
+        db_pool.query('SELECT * FROM table1')
+        stats = self.conn.cache_stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['entries'], 1)
+
+        self.conn.manage_clearCache()
+        self.assertEqual(self.conn.cache_stats()['entries'], 0)
+
+    def test_query_stats(self):
+        self.conn = self._simpleMakeOne()
+        self.conn.connect(self.conn.connection_string)
+
+        self.conn._v_database_connection.query('SELECT * FROM table1')
+        stats = self.conn.query_stats()
+        self.assertEqual(stats['queries']['count'], 1)
+        self.assertEqual(stats['rows'], 3)
+        top = self.conn.top_queries(limit='5')
+        self.assertEqual(top[0]['fingerprint'], 'select * from table1')
+
+        self.conn.manage_resetQueryStats()
+        self.assertEqual(self.conn.query_stats()['queries']['count'], 0)
+        self.assertEqual(self.conn.replica_stats(), [])
+        self.assertEqual(self.conn.writer_stats(), {})
+
+    def test_slow_queries(self):
+        self.conn = self._simpleMakeOne()
+        self.conn.slow_query_time = 1e-9
+        self.conn.connect(self.conn.connection_string)
+        self.assertEqual(self.conn.slow_queries(), [])
+
+        self.conn._v_database_connection.query('SELECT * FROM table1')
+        entries = self.conn.slow_queries()
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['rows'], 3)
+        self.assertIsNone(entries[0]['plans'])
+
+        self.conn.manage_clearSlowQueries()
+        self.assertEqual(self.conn.slow_queries(), [])
 
     def test_sql_quote__no_unicode(self):
         self.conn = self._simpleMakeOne()
@@ -0,0 +1,159 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Tests for the aio module
+"""
+import asyncio
+import unittest
+
+from MySQLdb import OperationalError
+
+from .base import PatchedConnectionTestsBase
+
+
+class AsyncPoolTests(PatchedConnectionTestsBase):
+
+    def _makeOne(self, max_size=None, expired=None, ping_interval=None,
+                 **flags):
+        from Products.ZMySQLDA.aio import AsyncPool
+        from Products.ZMySQLDA.db import DB
+        flags.setdefault('kw_args', {'db': 'foo_db', 'conv': DB.conv})
+        pool = AsyncPool(DB, flags, max_size, expired=expired,
+                         ping_interval=ping_interval)
+        self.addCleanup(pool.close)
+        return pool
+
+    def test_query(self):
+        pool = self._makeOne()
+
+        items, rows = asyncio.run(pool.query('SELECT * FROM table1'))
+        self.assertEqual([x['name'] for x in items], ['c_int', 'c_varchar'])
+        self.assertEqual([x['type'] for x in items], ['i', 't'])
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(len(pool._idle), 1)
+        db = pool._idle[0].db
+        self.assertEqual(db.last_query, 'SELECT * FROM table1 LIMIT 1000')
+        self.assertTrue(db.autocommit)
+        self.assertEqual(db.db, 'foo_db')
+
+        self.assertEqual(asyncio.run(pool.query('DELETE FROM table1')),
+                         ((), ()))
+        self.assertEqual(len(pool._idle), 1)
+
+    def test_query_concurrently(self):
+        pool = self._makeOne()
+
+        async def main():
+            return await asyncio.gather(*[
+                pool.query('SELECT * FROM table1', max_rows=2)
+                for i in range(3)])
+
+        results = asyncio.run(main())
+        self.assertEqual([len(rows) for items, rows in results], [2, 2, 2])
+        # Each query in progress had a connection of its own
+        self.assertEqual(len(pool._idle), 3)
+
+    def test_query_error(self):
+        from Products.ZMySQLDA.stats import QueryStats
+        stats = QueryStats()
+        pool = self._makeOne(query_stats=stats)
+        asyncio.run(pool.query('SELECT * FROM table1'))
+        db = pool._idle[0].db
+
+        def read_query_result():
+            raise OperationalError(1054, "Unknown column 'c_foo'")
+
+        db.read_query_result = read_query_result
+        with self.assertRaises(OperationalError):
+            asyncio.run(pool.query('SELECT * FROM table1'))
+        self.assertEqual(pool._idle, [])
+        self.assertEqual(stats.stats()['queries']['count'], 2)
+        self.assertEqual(stats.stats()['errors'], 1)
+
+    def test_query_reconnects(self):
+        stats = {}
+        pool = self._makeOne(stats=stats)
+        asyncio.run(pool.query('SELECT * FROM table1'))
+        db = pool._idle[0].db
+
+        def read_query_result():
+            raise OperationalError(2013, 'Lost connection')
+
+        # A lost connection is replaced and the statement sent again
+        db.read_query_result = read_query_result
+        items, rows = asyncio.run(pool.query('SELECT * FROM table1'))
+        self.assertEqual(len(rows), 3)
+        self.assertIsNot(pool._idle[0].db, db)
+        self.assertEqual(stats['reconnects'], 1)
+
+    def test_query_max_size(self):
+        pool = self._makeOne(max_size=2)
+
+        async def main():
+            return await asyncio.gather(*[
+                pool.query('SELECT * FROM table1') for i in range(5)])
+
+        results = asyncio.run(main())
+        self.assertEqual(len(results), 5)
+        # Only two queries ran at once
+        self.assertEqual(len(pool._idle), 2)
+
+    def test_checkout_pings(self):
+        stats = {}
+        pool = self._makeOne(stats=stats)
+        asyncio.run(pool.query('SELECT * FROM table1'))
+        db = pool._idle[0].db
+        db.ping_raises = 2006
+
+        asyncio.run(pool.query('SELECT * FROM table1'))
+        self.assertEqual(stats['pings'], 1)
+        self.assertEqual(stats['reconnects'], 1)
+        self.assertIsNot(pool._idle[0].db, db)
+
+        pool = self._makeOne(stats=stats, ping_interval=60)
+        asyncio.run(pool.query('SELECT * FROM table1'))
+        asyncio.run(pool.query('SELECT * FROM table1'))
+        self.assertEqual(stats['pings'], 1)
+
+    def test_checkout_recycles(self):
+        stats = {}
+        reasons = []
+        pool = self._makeOne(stats=stats, ping_interval=60,
+                             expired=lambda db, now: reasons and reasons[0])
+        asyncio.run(pool.query('SELECT * FROM table1'))
+        db = pool._idle[0]
+        connection = db.db
+        connection.last_query = None
+
+        reasons.append('idle timeout exceeded')
+        asyncio.run(pool.query('SELECT * FROM table1'))
+        self.assertEqual(stats['reconnects'], 1)
+        self.assertIsNone(connection.last_query)
+        # Connections expiring while in use are not kept
+        self.assertEqual(pool._idle, [])
+        self.assertIsNone(db.db)
+
+    def test_query_invalidates_cache(self):
+        from Products.ZMySQLDA.cache import ResultCache
+        cache = ResultCache(ttl=60, max_size=1024 * 1024)
+        cache.set('key', 'value', {'table1'}, 10)
+        pool = self._makeOne(result_cache=cache)
+
+        asyncio.run(pool.query('SELECT * FROM table1'))
+        self.assertEqual(cache.get('key'), 'value')
+        asyncio.run(pool.query('UPDATE table1 SET c_int = 1'))
+        self.assertIsNone(cache.get('key'))
+
+
+def test_suite():
+    return unittest.TestSuite((
+        unittest.defaultTestLoader.loadTestsFromTestCase(AsyncPoolTests),))
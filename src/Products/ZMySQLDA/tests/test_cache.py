@@ -0,0 +1,255 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Tests for the cache module
+"""
+import unittest
+
+
+class CacheFunctionsTests(unittest.TestCase):
+
+    def test_statement_tables(self):
+        from Products.ZMySQLDA.cache import statement_tables
+
+        self.assertEqual(statement_tables('SELECT 1'), set())
+        self.assertEqual(statement_tables('SELECT * FROM table1'),
+                         {'table1'})
+        self.assertEqual(
+            statement_tables('SELECT * FROM `db`.`Table1` t1, table2 AS t2 '
+                             'LEFT JOIN table3 ON t2.a = table3.a '
+                             'WHERE t1.a IN (SELECT a FROM table4)'),
+            {'table1', 'table2', 'table3', 'table4'})
+
+    def test_changed_tables(self):
+        from Products.ZMySQLDA.cache import ALL_TABLES
+        from Products.ZMySQLDA.cache import changed_tables
+
+        self.assertEqual(changed_tables('INSERT INTO table1 VALUES (1)'),
+                         {'table1'})
+        self.assertEqual(changed_tables('INSERT table1 VALUES (1)'),
+                         {'table1'})
+        self.assertEqual(changed_tables('UPDATE table1 SET a = 1'),
+                         {'table1'})
+        self.assertEqual(changed_tables('DELETE QUICK FROM table1'),
+                         {'table1'})
+        self.assertEqual(changed_tables('TRUNCATE TABLE table1'), {'table1'})
+        self.assertEqual(changed_tables('CALL proc1()'), {ALL_TABLES})
+        self.assertEqual(changed_tables('FLUSH STATUS'), {ALL_TABLES})
+
+    def test_cacheable(self):
+        from Products.ZMySQLDA.cache import cacheable
+
+        self.assertTrue(cacheable('SELECT * FROM table1'))
+        self.assertTrue(cacheable('select * from table1'))
+        self.assertFalse(cacheable('SELECT * FROM table1 FOR UPDATE'))
+        self.assertFalse(cacheable('SELECT * FROM table1 LOCK IN SHARE MODE'))
+        self.assertFalse(cacheable('SELECT a INTO @a FROM table1'))
+        self.assertFalse(cacheable('SHOW TABLES'))
+        # Session state and changing values are never cached
+        self.assertFalse(cacheable('SELECT LAST_INSERT_ID()'))
+        self.assertFalse(cacheable('SELECT FOUND_ROWS()'))
+        self.assertFalse(cacheable("SELECT GET_LOCK('x', 10)"))
+        self.assertFalse(cacheable('SELECT @counter'))
+        self.assertFalse(cacheable('SELECT * FROM table1 WHERE a > @@port'))
+        self.assertFalse(cacheable('SELECT * FROM table1 WHERE d < NOW()'))
+        self.assertFalse(cacheable('SELECT a, RAND() FROM table1'))
+        self.assertFalse(cacheable('SELECT UUID() FROM table1'))
+        self.assertFalse(cacheable('SELECT * FROM t WHERE d = CURRENT_DATE'))
+        # Results without tables are never invalidated
+        self.assertFalse(cacheable('SELECT 1 + 1'))
+        # Function names and @ in string literals don't count
+        self.assertTrue(cacheable("SELECT * FROM table1 "
+                                  "WHERE mail = 'a@b.c' AND s = 'now()'"))
+
+    def test_plain_read(self):
+        from Products.ZMySQLDA.cache import plain_read
+
+        self.assertTrue(plain_read('SELECT NOW()'))
+        self.assertTrue(plain_read('SELECT * FROM table1'))
+        self.assertFalse(plain_read('SELECT LAST_INSERT_ID()'))
+        self.assertFalse(plain_read('SELECT ROW_COUNT()'))
+        self.assertFalse(plain_read("SELECT RELEASE_LOCK('x')"))
+        self.assertFalse(plain_read('SELECT @a := 1'))
+        self.assertFalse(plain_read('SELECT * FROM table1 FOR SHARE'))
+        self.assertFalse(plain_read('UPDATE table1 SET a = 1'))
+
+    def test_result_size(self):
+        from Products.ZMySQLDA.cache import result_size
+        from Products.ZMySQLDA.results import lazy_rows
+
+        items = [{'name': 'a'}]
+        self.assertGreater(result_size((items, ())), 0)
+        small = result_size((items, ((b'1', b'x'),) * 10))
+        large = result_size((items, ((b'1', b'x'),) * 1000))
+        self.assertGreater(large, small * 50)
+
+        # Lazy rows are measured without converting their values
+        rows = lazy_rows(((b'1', b'x'),) * 100, (int, None))
+        self.assertGreater(result_size((items, rows)), 0)
+        self.assertEqual(rows[0]._pending, 1)
+        self.assertEqual(rows[99]._values, [b'1', b'x'])
+
+
+class ResultCacheTests(unittest.TestCase):
+
+    def _makeOne(self, **kw):
+        from Products.ZMySQLDA.cache import ResultCache
+        return ResultCache(**kw)
+
+    def test_get_set(self):
+        cache = self._makeOne()
+
+        self.assertIsNone(cache.get('key'))
+        cache.set('key', 'value', {'table1'}, 10)
+        self.assertEqual(cache.get('key'), 'value')
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['size'], 10)
+        self.assertEqual(stats['hit_ratio'], 0.5)
+
+    def test_ttl(self):
+        cache = self._makeOne(ttl=0)
+
+        cache.set('key', 'value', {'table1'}, 10)
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.size, 0)
+
+    def test_max_size(self):
+        cache = self._makeOne(max_size=25)
+
+        cache.set('key1', 'value1', {'table1'}, 10)
+        cache.set('key2', 'value2', {'table1'}, 10)
+        cache.get('key1')
+        cache.set('key3', 'value3', {'table1'}, 10)
+        self.assertEqual(cache.get('key1'), 'value1')
+        self.assertIsNone(cache.get('key2'))
+        self.assertEqual(cache.get('key3'), 'value3')
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+        # Values larger than the cache are not stored
+        cache.set('key4', 'value4', {'table1'}, 30)
+        self.assertIsNone(cache.get('key4'))
+        self.assertEqual(cache.size, 20)
+
+    def test_invalidate(self):
+        from Products.ZMySQLDA.cache import ALL_TABLES
+        cache = self._makeOne()
+
+        cache.set('key1', 'value1', {'table1'}, 10)
+        cache.set('key2', 'value2', {'table1', 'table2'}, 10)
+        cache.set('key3', 'value3', {'table3'}, 10)
+        cache.invalidate({'table2'})
+        self.assertEqual(cache.get('key1'), 'value1')
+        self.assertIsNone(cache.get('key2'))
+        self.assertEqual(cache.get('key3'), 'value3')
+
+        cache.invalidate({ALL_TABLES})
+        self.assertIsNone(cache.get('key1'))
+        self.assertIsNone(cache.get('key3'))
+        self.assertEqual(cache.stats()['invalidations'], 3)
+        self.assertEqual(cache._tables, {})
+
+    def test_clear(self):
+        cache = self._makeOne()
+
+        cache.set('key', 'value', {'table1'}, 10)
+        cache.clear()
+        self.assertIsNone(cache.get('key'))
+        self.assertEqual(cache.size, 0)
+
+
+class SchemaCacheTests(unittest.TestCase):
+
+    def _makeOne(self, **kw):
+        from Products.ZMySQLDA.cache import SchemaCache
+        cache = SchemaCache(**kw)
+        cache.check_interval = 0
+        return cache
+
+    def test_get(self):
+        cache = self._makeOne()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return ['value']
+
+        def stamps():
+            return {'table1': (1, 1)}
+
+        self.assertEqual(cache.get('key', 'table1', compute, stamps),
+                         ['value'])
+        self.assertEqual(cache.get('key', 'table1', compute, stamps),
+                         ['value'])
+        self.assertEqual(len(calls), 1)
+        stats = cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['entries'], 1)
+
+    def test_ttl(self):
+        cache = self._makeOne(ttl=0)
+
+        cache.get('key', 'table1', lambda: 'value', dict)
+        self.assertEqual(cache.get('key', 'table1', lambda: 'new', dict),
+                         'new')
+
+    def test_stamps_changed(self):
+        cache = self._makeOne()
+        stamps = {'table1': (1, 1), 'table2': (1, 1)}
+
+        cache.get('tables', None, lambda: 'tables', stamps.copy)
+        cache.get('table1', 'table1', lambda: 'table1', stamps.copy)
+        cache.get('table2', '`Table2`', lambda: 'table2', stamps.copy)
+
+        stamps['table1'] = (1, 2)
+        self.assertEqual(cache.get('table2', 'table2', lambda: 'new',
+                                   stamps.copy), 'table2')
+        self.assertEqual(cache.get('table1', 'table1', lambda: 'new',
+                                   stamps.copy), 'new')
+        self.assertEqual(cache.get('tables', None, lambda: 'new',
+                                   stamps.copy), 'new')
+        self.assertEqual(cache.stats()['invalidations'], 2)
+
+    def test_check_interval(self):
+        cache = self._makeOne()
+        cache.check_interval = 60
+        checks = []
+
+        def stamps():
+            checks.append(1)
+            return {}
+
+        cache.get('key1', None, lambda: 'value', stamps)
+        cache.get('key2', None, lambda: 'value', stamps)
+        self.assertEqual(len(checks), 1)
+
+    def test_invalidate(self):
+        cache = self._makeOne()
+
+        cache.get('tables', None, lambda: 'tables', dict)
+        cache.get('table1', 'table1', lambda: 'table1', dict)
+        cache.get('table2', 'table2', lambda: 'table2', dict)
+        cache.invalidate('table1')
+        self.assertEqual(set(cache._entries), {'table2'})
+
+        cache.invalidate()
+        self.assertEqual(cache._entries, {})
+
+
+def test_suite():
+    return unittest.TestSuite((
+        unittest.defaultTestLoader.loadTestsFromTestCase(CacheFunctionsTests),
+        unittest.defaultTestLoader.loadTestsFromTestCase(ResultCacheTests),
+        unittest.defaultTestLoader.loadTestsFromTestCase(SchemaCacheTests)))
@@ -0,0 +1,64 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Tests for the converters module
+"""
+import unittest
+from datetime import date
+from datetime import datetime
+
+
+class ConvertersTests(unittest.TestCase):
+
+    def test_parse_datetime(self):
+        from Products.ZMySQLDA.converters import parse_datetime
+
+        self.assertEqual(parse_datetime('2024-01-02'), date(2024, 1, 2))
+        self.assertEqual(parse_datetime(b'2024-01-02 03:04:05'),
+                         datetime(2024, 1, 2, 3, 4, 5))
+        self.assertEqual(parse_datetime('2024-01-02 03:04:05.25'),
+                         datetime(2024, 1, 2, 3, 4, 5, 250000))
+        self.assertIsNone(parse_datetime('0000-00-00 00:00:00'))
+        self.assertIsNone(parse_datetime('2024-02-30'))
+        self.assertIsNone(parse_datetime('02.01.2024'))
+
+    def test_datetime_or_None(self):
+        from Products.ZMySQLDA.converters import datetime_or_None
+
+        value = datetime_or_None('2024-01-02 03:04:05')
+        self.assertEqual(value, datetime(2024, 1, 2, 3, 4, 5))
+        self.assertIs(datetime_or_None('2024-01-02 03:04:05'), value)
+
+    def test_fast_DateTime_or_None(self):
+        from Products.ZMySQLDA.converters import DateTime_or_None
+        from Products.ZMySQLDA.converters import fast_DateTime_or_None
+
+        for value in ('2024-07-02 03:04:05', '2024-07-02 03:04:05.123456',
+                      '2024-07-02', '1901-12-31 23:59:59',
+                      '2100-01-01 00:00:00', '1000-01-01 12:00:00.5',
+                      '9999-12-31 23:59:59'):
+            expected = DateTime_or_None(value)
+            result = fast_DateTime_or_None(value)
+            self.assertEqual(result, expected)
+            self.assertEqual(result.__getstate__(), expected.__getstate__())
+            self.assertEqual(repr(result), repr(expected))
+            self.assertTrue(result.timezoneNaive())
+
+        self.assertIs(fast_DateTime_or_None('2024-07-02'),
+                      fast_DateTime_or_None('2024-07-02'))
+        self.assertIsNone(fast_DateTime_or_None('0000-00-00 00:00:00'))
+        self.assertIsNone(fast_DateTime_or_None('0000-00-00'))
+
+
+def test_suite():
+    return unittest.TestSuite((
+        unittest.defaultTestLoader.loadTestsFromTestCase(ConvertersTests),))
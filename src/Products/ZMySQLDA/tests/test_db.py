@@ -12,6 +12,7 @@
 ##############################################################################
 """ Tests for the db module
 """
+import threading
 import unittest
 from _thread import get_ident
 
@@ -64,6 +65,44 @@ class DBPoolTests(unittest.TestCase):
         self.assertFalse(pool.use_unicode)
         self.assertIsNone(pool.charset)
         self.assertIsNone(pool.timeout)
+        self.assertIsNone(pool.pool_max_size)
+        self.assertIsNone(pool.pool_min_size)
+        self.assertIsNone(pool.pool_timeout)
+        self.assertIsNone(pool.idle_timeout)
+        self.assertIsNone(pool.max_lifetime)
+        self.assertEqual(pool.pool_warmup, 0)
+        self.assertIsNone(pool.ping_interval)
+
+    def test_instantiate_recycling(self):
+        pool = self._makeOne(idle_timeout='600', max_lifetime=3600)
+        self.assertEqual(pool.idle_timeout, 600.0)
+        self.assertEqual(pool.max_lifetime, 3600.0)
+        self.assertEqual(pool._eviction_interval, 300.0)
+
+    def test_instantiate_shared_pool(self):
+        pool = self._makeOne(pool_max_size='5', pool_timeout='2.5')
+        self.assertEqual(pool.pool_max_size, 5)
+        self.assertEqual(pool.pool_min_size, 5)
+        self.assertEqual(pool.pool_timeout, 2.5)
+
+        pool = self._makeOne(pool_max_size=5, pool_min_size=0)
+        self.assertEqual(pool.pool_min_size, 0)
+
+        pool = self._makeOne(pool_max_size=5, pool_min_size=10)
+        self.assertEqual(pool.pool_min_size, 5)
+
+    def test_instantiate_result_cache(self):
+        pool = self._makeOne()
+        self.assertIsNone(pool._result_cache)
+        self.assertEqual(pool.cache_stats(), {})
+
+        pool = self._makeOne(result_cache_ttl='30', result_cache_size='0.5')
+        self.assertEqual(pool._result_cache.ttl, 30.0)
+        self.assertEqual(pool._result_cache.max_size, 512 * 1024)
+        self.assertEqual(pool.cache_stats()['entries'], 0)
+
+        pool = self._makeOne(result_cache_ttl=30)
+        self.assertEqual(pool._result_cache.max_size, 16 * 1024 * 1024)
 
     def test_instantiate_use_unicode(self):
         pool = self._makeOne(create_db=True, use_unicode=True)
@@ -126,6 +165,364 @@ class PatchedDBPoolTests(PatchedConnectionTestsBase):
         self.assertEqual(pool.variables(),
                          {'var1': 'val1', 'version': '5.5.5'})
 
+    def test_schema_cache(self):
+        pool = self._makeOne(schema_cache_ttl=60)
+        pool._db_flags = {'kw_args': {}}
+
+        tables = pool.tables()
+        self.assertEqual(tables[0]['table_name'], 'table1')
+        db = pool._pool_get(get_ident())
+        self.assertEqual(db.db.last_query, 'SHOW TABLE STATUS')
+
+        db.db.last_query = None
+        tables[0]['table_name'] = 'changed'
+        self.assertEqual(pool.tables()[0]['table_name'], 'table1')
+        pool.columns('table1')
+        pool.columns('table1')
+        self.assertEqual(db.db.last_query, 'SHOW COLUMNS FROM table1')
+        stats = pool.schema_cache_stats()
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['checks'], 1)
+
+        pool.clear_schema_cache('table1')
+        self.assertEqual(pool.schema_cache_stats()['entries'], 0)
+
+    def test_schema_cache_disabled(self):
+        pool = self._makeOne()
+        pool._db_flags = {'kw_args': {}}
+
+        pool.tables()
+        self.assertEqual(pool.schema_cache_stats(), {})
+
+    def test_query_stats(self):
+        pool = self._makeOne()
+        pool._db_flags = {'kw_args': {}, 'query_stats': pool._query_stats}
+
+        items, rows = pool.query('SELECT * FROM table1')
+        stats = pool.query_stats()
+        self.assertEqual(stats['queries']['count'], 1)
+        self.assertEqual(stats['statements']['count'], 1)
+        self.assertEqual(stats['rows'], 3)
+        self.assertEqual(stats['bytes'], 27)
+
+        top = pool.top_queries()
+        self.assertEqual(top[0]['fingerprint'], 'select * from table1')
+        self.assertEqual(top[0]['rows'], 3)
+
+        pool.reset_query_stats()
+        self.assertEqual(pool.query_stats()['queries']['count'], 0)
+        self.assertEqual(pool.top_queries(), [])
+
+    def test_replicas(self):
+        pool = self._makeOne()
+        self.assertEqual(pool.replica_stats(), [])
+
+        pool('foo_db@primary/replica1 foo_user')
+        pool.query('SELECT * FROM table1')
+        stats = pool.replica_stats()
+        self.assertEqual(stats[0]['host'], 'replica1')
+        self.assertEqual(stats[0]['selected'], 1)
+        db = pool._pool_get(get_ident())
+        self.assertIs(db._replicas, pool._replicas)
+        self.assertEqual(db.db.host, 'primary')
+
+        pool.close()
+        self.assertEqual(pool.replica_stats()[0]['idle'], 0)
+
+    def test_query_parallel(self):
+        pool = self._makeOne(parallel_queries='2')
+        self.assertEqual(pool.parallel_queries, 2)
+
+        pool('foo_db foo_user')
+        self.assertEqual(pool._parallel.max_workers, 2)
+        results, errors = pool.query_parallel(['SELECT * FROM table1',
+                                               'SELECT * FROM table2'])
+        self.assertEqual(errors, {})
+        self.assertEqual([len(rows) for items, rows in results], [3, 2])
+        self.assertEqual(pool.query_stats()['queries']['count'], 2)
+        self.assertIsNone(pool._pool_get(get_ident()))
+
+        pool.close()
+        self.assertEqual(pool._parallel._idle, [])
+
+    def test_query_async(self):
+        import asyncio
+        pool = self._makeOne()
+        pool('foo_db foo_user')
+
+        items, rows = asyncio.run(pool.query_async('SELECT * FROM table1'))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(pool.query_stats()['queries']['count'], 1)
+        self.assertIsNone(pool._pool_get(get_ident()))
+
+        pool.close()
+        self.assertEqual(pool._async._idle, [])
+
+    def test_shared_pool_parallel_and_async(self):
+        import asyncio
+
+        from MySQLdb import OperationalError
+        pool = self._makeOne(pool_max_size=1, pool_timeout=0.01)
+        pool('foo_db foo_user')
+
+        # The connections count against the maximum pool size
+        db = pool._checkout('thread1')
+        results, errors = pool.query_parallel(['SELECT * FROM table1'])
+        self.assertIsInstance(errors[0], OperationalError)
+        with self.assertRaises(OperationalError):
+            asyncio.run(pool.query_async('SELECT * FROM table1'))
+
+        # An idle pooled connection is closed to free its slot
+        pool._checkin(db)
+        self.assertEqual(pool.pool_stats()['idle'], 1)
+        results, errors = pool.query_parallel(['SELECT * FROM table1'])
+        self.assertEqual(errors, {})
+        self.assertIsNone(db.db)
+        items, rows = asyncio.run(pool.query_async('SELECT * FROM table1'))
+        self.assertEqual(len(rows), 3)
+
+        # and the slot is free again after the query
+        self.assertEqual(pool._parallel._idle, [])
+        self.assertEqual(pool._async._idle, [])
+        stats = pool.pool_stats()
+        self.assertEqual(stats['size'], 0)
+        self.assertEqual(stats['evicted'], 1)
+
+    def test_writers(self):
+        pool = self._makeOne()
+        self.assertEqual(pool.writer_stats(), {})
+
+        pool('foo_db@db1,db2/replica1 foo_user')
+        self.assertEqual(pool.writer_stats()['candidates'], ['db1', 'db2'])
+        pool.query('SELECT * FROM table1')
+        db = pool._pool_get(get_ident())
+        self.assertIs(db._writers, pool._writers)
+        self.assertEqual(db.db.host, 'db1')
+        self.assertIsNone(pool._replicas._db_flags['writers'])
+
+    def _makeShared(self, **kw):
+        pool = self._makeOne(**kw)
+        pool._db_flags = {'kw_args': {}}
+        return pool
+
+    def test_shared_pool_checkout_checkin(self):
+        pool = self._makeShared(pool_max_size=2)
+
+        db = pool._checkout(get_ident())
+        self.assertIs(db._pool, pool)
+        self.assertIs(pool._checkout(get_ident()), db)
+        stats = pool.pool_stats()
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['in_use'], 1)
+        self.assertEqual(stats['idle'], 0)
+
+        pool._checkin(db)
+        stats = pool.pool_stats()
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['idle'], 1)
+
+        # Checking in twice does nothing
+        pool._checkin(db)
+        self.assertEqual(pool.pool_stats()['idle'], 1)
+
+        # The idle connection is handed out again
+        self.assertIs(pool._checkout('other thread'), db)
+
+    def test_shared_pool_access_db(self):
+        pool = self._makeShared(pool_max_size=2)
+
+        self.assertEqual(pool.variables(),
+                         {'var1': 'val1', 'version': '5.5.5'})
+        stats = pool.pool_stats()
+        self.assertEqual(stats['checkouts'], 1)
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['idle'], 1)
+
+    def test_shared_pool_exhausted(self):
+        from MySQLdb import OperationalError
+        pool = self._makeShared(pool_max_size=2, pool_timeout=0.01)
+
+        pool._checkout('thread1')
+        pool._checkout('thread2')
+        self.assertRaises(OperationalError, pool._checkout, 'thread3')
+        stats = pool.pool_stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['waits'], 1)
+        self.assertEqual(stats['timeouts'], 1)
+
+    def test_shared_pool_wait(self):
+        pool = self._makeShared(pool_max_size=1)
+
+        db = pool._checkout('thread1')
+        timer = threading.Timer(0.05, pool._checkin, (db,))
+        timer.start()
+        self.assertIs(pool._checkout('thread2'), db)
+        timer.join()
+        stats = pool.pool_stats()
+        self.assertEqual(stats['waits'], 1)
+        self.assertGreater(stats['max_wait_time'], 0)
+        self.assertGreater(stats['mean_wait_time'], 0)
+
+    def test_shared_pool_min_size(self):
+        pool = self._makeShared(pool_max_size=2, pool_min_size=1)
+
+        db1 = pool._checkout('thread1')
+        db2 = pool._checkout('thread2')
+        pool._checkin(db1)
+        pool._checkin(db2)
+        stats = pool.pool_stats()
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(stats['idle'], 1)
+        self.assertIsNone(db2.db)
+
+    def test_shared_pool_closeConnection(self):
+        pool = self._makeShared(pool_max_size=2)
+
+        db = pool._checkout(get_ident())
+        pool.closeConnection()
+        self.assertIsNone(db.db)
+        self.assertEqual(pool.pool_stats()['size'], 0)
+
+    def test_shared_pool_query_stream(self):
+        pool = self._makeShared(pool_max_size=1)
+
+        items, rows = pool.query_stream('SELECT * FROM table1')
+        self.assertEqual(pool.pool_stats()['in_use'], 1)
+        self.assertEqual(len(list(rows)), 3)
+        stats = pool.pool_stats()
+        self.assertEqual(stats['in_use'], 0)
+        self.assertEqual(stats['idle'], 1)
+
+    def test_shared_pool_query_stream_dropped(self):
+        pool = self._makeShared(pool_max_size=1)
+
+        items, rows = pool.query_stream('SELECT * FROM table1', 1)
+        self.assertEqual(next(iter(rows)), (1, 'a'))
+        db = pool._db_pool[get_ident()]
+        self.assertIs(db._stream, rows)
+        del rows
+        self.assertIsNone(db._stream)
+        self.assertEqual(db.db.last_results.next_index, 3)
+        self.assertEqual(pool.pool_stats()['in_use'], 0)
+
+        result = pool.query('SELECT * FROM table1')
+        self.assertEqual(len(result[1]), 3)
+        self.assertEqual(pool.pool_stats()['idle'], 1)
+
+    def test_query_stream_left_open(self):
+        pool = self._makeOne()
+        pool._db_flags = {'kw_args': {}}
+
+        items, rows = pool.query_stream('SELECT * FROM table1', 1)
+        self.assertEqual(next(iter(rows)), (1, 'a'))
+        db = pool._pool_get(get_ident())
+        results = db.db.last_results
+
+        result = pool.query('SELECT * FROM table1')
+        self.assertEqual(len(result[1]), 3)
+        self.assertEqual(results.next_index, 3)
+        self.assertIsNone(db._stream)
+        self.assertEqual(list(rows), [])
+
+    def test_ping_interval_flags(self):
+        pool = self._makeOne(ping_interval='30')
+        pool('foo_db foo_user foo_pw')
+        self.assertEqual(pool._db_flags['ping_interval'], 30.0)
+        self.assertIs(pool._db_flags['stats'], pool._db_stats)
+
+        pool._db_stats['pings_skipped'] += 3
+        self.assertEqual(pool.pool_stats()['pings_skipped'], 3)
+
+    def test_warm_up_shared_pool(self):
+        pool = self._makeOne(pool_max_size=2, pool_warmup=3)
+        pool('foo_db foo_user foo_pw')
+        stats = pool.pool_stats()
+        self.assertEqual(stats['size'], 2)
+        self.assertEqual(stats['idle'], 2)
+        self.assertIs(pool._db_idle[0]._pool, pool)
+
+    def test_warm_up_thread_connections(self):
+        pool = self._makeOne(pool_warmup=2)
+        pool('foo_db foo_user foo_pw')
+        self.assertEqual(pool.pool_stats()['idle'], 2)
+        spare = pool._db_idle[-1]
+
+        pool.variables()
+        self.assertIs(pool._pool_get(get_ident()), spare)
+        stats = pool.pool_stats()
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(stats['size'], 2)
+
+    def test_warm_up_failure(self):
+        from MySQLdb import OperationalError
+        pool = self._makeShared(pool_max_size=2, pool_warmup=2)
+
+        def broken(**kw):
+            raise OperationalError(2003, "Can't connect")
+
+        pool._db_cls = broken
+        pool._warm_up()
+        stats = pool.pool_stats()
+        self.assertEqual(stats['size'], 0)
+        self.assertEqual(stats['idle'], 0)
+
+    def test_recycle_idle_thread_connection(self):
+        pool = self._makeShared(idle_timeout=10)
+
+        pool.variables()
+        db = pool._pool_get(get_ident())
+        old_conn = db.db
+        pool.variables()
+        self.assertIs(db.db, old_conn)
+
+        db._last_used -= 20
+        pool.variables()
+        self.assertIsNot(db.db, old_conn)
+        self.assertEqual(pool.pool_stats()['recycled'], 1)
+
+    def test_recycle_old_shared_connection(self):
+        pool = self._makeShared(pool_max_size=1, max_lifetime=60)
+
+        db = pool._checkout(get_ident())
+        pool._checkin(db)
+        old_conn = db.db
+        db._created -= 120
+        self.assertIs(pool._checkout(get_ident()), db)
+        self.assertIsNot(db.db, old_conn)
+        self.assertEqual(pool.pool_stats()['recycled'], 1)
+
+    def test_evict_expired_shared_connections(self):
+        pool = self._makeShared(pool_max_size=2, idle_timeout=10)
+
+        db1 = pool._checkout('thread1')
+        db2 = pool._checkout('thread2')
+        pool._checkin(db1)
+        pool._checkin(db2)
+        db1._last_used -= 20
+        pool._evict_expired()
+        stats = pool.pool_stats()
+        self.assertEqual(stats['evicted'], 1)
+        self.assertEqual(stats['size'], 1)
+        self.assertEqual(pool._db_idle, [db2])
+        self.assertIsNone(db1.db)
+
+    def test_evict_expired_finished_thread_connections(self):
+        pool = self._makeShared(idle_timeout=10)
+
+        pool.variables()
+        db = pool._db_cls(**pool._db_flags)
+        pool._pool_set('finished thread', db)
+        pool._evict_expired()
+        self.assertIs(pool._pool_get('finished thread'), db)
+
+        db._last_used -= 20
+        pool._next_eviction = 0.0
+        pool._evict_expired()
+        self.assertIsNone(pool._pool_get('finished thread'))
+        self.assertIsNotNone(pool._pool_get(get_ident()))
+        self.assertEqual(pool.pool_stats()['evicted'], 1)
+
 
 @unittest.skipUnless(have_test_database(), NO_MYSQL_MSG)
 class RealConnectionDBPoolTests(unittest.TestCase):
@@ -235,6 +632,52 @@ class DBTests(PatchedConnectionTestsBase):
         self.assertFalse(parsed['kw_args']['use_unicode'])
         self.assertNotIn('charset', parsed['kw_args'])
 
+    def test__parse_connection_string_date_conversion(self):
+        from MySQLdb.constants import FIELD_TYPE
+
+        from Products.ZMySQLDA.converters import DateTime_or_None
+        from Products.ZMySQLDA.converters import datetime_or_None
+        db = self._makeOne(kw_args={})
+
+        parsed = db._parse_connection_string('')
+        self.assertIs(parsed['kw_args']['conv'], db.conv)
+
+        parsed = db._parse_connection_string('', date_conversion='native')
+        conv = parsed['kw_args']['conv']
+        self.assertIs(conv[FIELD_TYPE.DATETIME], datetime_or_None)
+        self.assertIs(conv[FIELD_TYPE.DATE], datetime_or_None)
+        self.assertIs(db.conv[FIELD_TYPE.DATE], DateTime_or_None)
+
+        self.assertRaises(ValueError, db._parse_connection_string, '',
+                          date_conversion='unknown')
+
+    def test__parse_connection_string_conv_profile(self):
+        from decimal import Decimal
+
+        from MySQLdb.constants import FIELD_TYPE
+
+        from Products.ZMySQLDA.converters import fast_DateTime_or_None
+        db = self._makeOne(kw_args={})
+
+        parsed = db._parse_connection_string('', conv_profile='legacy')
+        self.assertIs(parsed['kw_args']['conv'], db.conv)
+
+        parsed = db._parse_connection_string('', conv_profile='decimal')
+        conv = parsed['kw_args']['conv']
+        self.assertEqual(conv[FIELD_TYPE.NEWDECIMAL]('1.10'), Decimal('1.10'))
+        self.assertIs(conv[FIELD_TYPE.LONG], int)
+
+        parsed = db._parse_connection_string('', conv_profile='raw',
+                                             date_conversion='fast')
+        conv = parsed['kw_args']['conv']
+        self.assertNotIn(FIELD_TYPE.LONG, conv)
+        self.assertIn(int, conv)
+        self.assertIs(conv[FIELD_TYPE.DATE], fast_DateTime_or_None)
+        self.assertNotIn(FIELD_TYPE.DATE, db.conv_profiles['raw'])
+
+        self.assertRaises(ValueError, db._parse_connection_string, '',
+                          conv_profile='unknown')
+
     def test__parse_connection_string_simple(self):
         db = self._makeOne(kw_args={})
 
@@ -350,11 +793,646 @@ class DBTests(PatchedConnectionTestsBase):
         self.assertFalse(parsed['kw_args']['use_unicode'])
         self.assertEqual(parsed['kw_args']['charset'], 'utf8')
 
+    def test__parse_connection_string_local_infile(self):
+        db = self._makeOne(kw_args={})
+
+        c_str = '+foo_db@127.0.0.1:3306 foo_user foo_pw'
+        self.assertNotIn('local_infile',
+                         db._parse_connection_string(c_str)['kw_args'])
+        parsed = db._parse_connection_string(c_str, local_infile=True)
+        self.assertEqual(parsed['kw_args']['local_infile'], 1)
+
+    def test__parse_connection_string_replicas(self):
+        db = self._makeOne(kw_args={})
+
+        parsed = db._parse_connection_string(
+            '+foo_db@primary:3307/replica1:3308,replica2 foo_user foo_pw')
+        self.assertEqual(parsed['kw_args']['db'], 'foo_db')
+        self.assertEqual(parsed['kw_args']['host'], 'primary')
+        self.assertEqual(parsed['kw_args']['port'], 3307)
+        self.assertEqual(parsed['try_transactions'], '+')
+        self.assertEqual(parsed['replicas'], [{'host': 'replica1',
+                                               'port': 3308},
+                                              {'host': 'replica2'}])
+
+        parsed = db._parse_connection_string('foo_db/replica1 foo_user')
+        self.assertNotIn('host', parsed['kw_args'])
+        self.assertEqual(parsed['replicas'], [{'host': 'replica1'}])
+        self.assertNotIn('replicas',
+                         db._parse_connection_string('foo_db foo_user'))
+
+    def test__parse_connection_string_writers(self):
+        db = self._makeOne(kw_args={})
+
+        parsed = db._parse_connection_string(
+            'foo_db@db1:3307,db2,db3:3308/replica1 foo_user foo_pw')
+        self.assertEqual(parsed['kw_args']['host'], 'db1')
+        self.assertEqual(parsed['kw_args']['port'], 3307)
+        self.assertEqual(parsed['writers'], [{'host': 'db1', 'port': 3307},
+                                             {'host': 'db2'},
+                                             {'host': 'db3', 'port': 3308}])
+        self.assertEqual(parsed['replicas'], [{'host': 'replica1'}])
+        self.assertNotIn('writers',
+                         db._parse_connection_string('foo_db@db1 foo_user'))
+
+    def test_query_replicas(self):
+        import transaction
+
+        from Products.ZMySQLDA.db import DB
+        from Products.ZMySQLDA.replicas import ReplicaPool
+        flags = {'kw_args': {'db': 'foo_db', 'host': 'primary',
+                             'port': 3307, 'user': 'foo_user'}}
+        replicas = ReplicaPool(DB, flags, [{'host': 'replica1'},
+                                           {'host': 'replica2',
+                                            'port': 3308}])
+        db = self._makeOne(use_TM=True, replicas=replicas, **flags)
+
+        # Reads are sent to the replicas in turn
+        items, rows = db.query('SELECT * FROM table1')
+        self.assertEqual(len(rows), 3)
+        self.assertIsNone(db.db.last_query)
+        self.assertFalse(db._registered)
+        db.query('SELECT * FROM table1')
+        db.query('SELECT * FROM table1')
+        stats = replicas.stats()
+        self.assertEqual([x['host'] for x in stats],
+                         ['replica1', 'replica2:3308'])
+        self.assertEqual([x['selected'] for x in stats], [2, 1])
+        self.assertEqual([x['idle'] for x in stats], [1, 1])
+        replica = replicas.hosts[0].idle[0]
+        self.assertEqual(replica.db.host, 'replica1')
+        self.assertEqual(replica.db.user, 'foo_user')
+        self.assertFalse(hasattr(replica.db, 'port'))
+        self.assertEqual(replica.db.last_query,
+                         'SELECT * FROM table1 LIMIT 1000')
+
+        # Writes and locking reads go to the primary
+        db.query('SELECT * FROM table1 FOR UPDATE')
+        self.assertEqual(db.db.last_query,
+                         'SELECT * FROM table1 FOR UPDATE LIMIT 1000')
+        db.query('SELECT * FROM table1')
+        self.assertEqual(replicas.stats()[1]['selected'], 2)
+        db.query('INSERT INTO table2 VALUES (1)')
+        self.assertTrue(db._transaction_wrote)
+
+        # Reads of a transaction after a write stay on the primary
+        db.query('SELECT * FROM table1')
+        self.assertEqual(db.db.last_query, 'SELECT * FROM table1 LIMIT 1000')
+        self.assertEqual([x['selected'] for x in replicas.stats()], [2, 2])
+
+        transaction.abort()
+        self.assertFalse(db._transaction_wrote)
+        db.query('SELECT * FROM table1')
+        self.assertEqual(replicas.stats()[0]['selected'], 3)
+
+        replicas.close()
+        self.assertEqual([x['idle'] for x in replicas.stats()], [0, 0])
+
+    def test_query_replicas_session_reads(self):
+        from Products.ZMySQLDA.db import DB
+        from Products.ZMySQLDA.replicas import ReplicaPool
+        flags = {'kw_args': {'db': 'foo_db', 'host': 'primary'}}
+        replicas = ReplicaPool(DB, flags, [{'host': 'replica1'}])
+        self.addCleanup(replicas.close)
+        db = self._makeOne(replicas=replicas, **flags)
+
+        # Reads depending on the connection state stay on the primary
+        for sql in ('SELECT LAST_INSERT_ID()', "SELECT GET_LOCK('x', 10)",
+                    'SELECT @counter', 'SELECT FOUND_ROWS()'):
+            db.query(sql)
+            self.assertEqual(db.db.last_query, sql + ' LIMIT 1000')
+        self.assertEqual(replicas.stats()[0]['selected'], 0)
+        db.query('SELECT NOW()')
+        self.assertEqual(replicas.stats()[0]['selected'], 1)
+
+    def test_query_replicas_without_transactions(self):
+        from Products.ZMySQLDA.db import DB
+        from Products.ZMySQLDA.replicas import ReplicaPool
+        flags = {'kw_args': {'db': 'foo_db', 'host': 'primary'}}
+        replicas = ReplicaPool(DB, flags, [{'host': 'replica1'}])
+        self.addCleanup(replicas.close)
+        db = self._makeOne(use_TM=False, replicas=replicas, **flags)
+
+        # Reads shortly after a change see it on the primary
+        db.query('INSERT INTO table2 VALUES (1)')
+        self.assertFalse(db._transaction_begun)
+        db.query('SELECT * FROM table1')
+        self.assertEqual(db.db.last_query, 'SELECT * FROM table1 LIMIT 1000')
+        self.assertEqual(replicas.stats()[0]['selected'], 0)
+
+        db._last_write -= db.read_your_writes
+        db.query('SELECT * FROM table1')
+        self.assertEqual(replicas.stats()[0]['selected'], 1)
+
+    def test_query_replicas_after_commit(self):
+        import transaction
+
+        from Products.ZMySQLDA.db import DB
+        from Products.ZMySQLDA.replicas import ReplicaPool
+        flags = {'kw_args': {'db': 'foo_db', 'host': 'primary'}}
+        replicas = ReplicaPool(DB, flags, [{'host': 'replica1'}])
+        self.addCleanup(replicas.close)
+        db = self._makeOne(use_TM=True, transactions=True,
+                           replicas=replicas, **flags)
+
+        # Reads shortly after a commit with changes see them on the primary
+        db.query('INSERT INTO table2 VALUES (1)')
+        transaction.commit()
+        self.assertEqual(db.db.last_query, 'COMMIT')
+        self.assertFalse(db._transaction_wrote)
+        db.query('SELECT * FROM table1')
+        self.assertEqual(db.db.last_query, 'SELECT * FROM table1 LIMIT 1000')
+        self.assertEqual(replicas.stats()[0]['selected'], 0)
+
+        db._last_write -= db.read_your_writes
+        db.query('SELECT * FROM table1')
+        self.assertEqual(replicas.stats()[0]['selected'], 1)
+        transaction.commit()
+        db.query('SELECT * FROM table1')
+        self.assertEqual(replicas.stats()[0]['selected'], 2)
+
+    def test_query_replica_unavailable(self):
+        from MySQLdb import OperationalError
+
+        from Products.ZMySQLDA.db import DB
+        from Products.ZMySQLDA.replicas import ReplicaPool
+
+        class BrokenDB(DB):
+            def _forceReconnection(self, reason=''):
+                raise OperationalError(2003, "Can't connect")
+
+        replicas = ReplicaPool(BrokenDB, {'kw_args': {}},
+                               [{'host': 'replica1'}])
+        db = self._makeOne(kw_args={}, replicas=replicas)
+
+        with self.assertLogs('ZMySQLDA', 'WARNING'):
+            items, rows = db.query('SELECT * FROM table1')
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(db.db.last_query, 'SELECT * FROM table1 LIMIT 1000')
+        self.assertEqual(replicas.stats()[0]['failures'], 1)
+        self.assertEqual(replicas.stats()[0]['outstanding'], 0)
+
     def test_variables(self):
         db = self._makeOne(kw_args={})
         self.assertDictEqual(db.variables(),
                              {'var1': 'val1', 'version': '5.5.5'})
 
+    def test_query_stream(self):
+        db = self._makeOne(kw_args={})
+
+        items, rows = db.query_stream('SELECT * FROM table1', chunk_size=2)
+        self.assertEqual([x['name'] for x in items], ['c_int', 'c_varchar'])
+        self.assertEqual([x['type'] for x in items], ['i', 't'])
+        self.assertIs(db._stream, rows)
+        self.assertEqual(list(rows.chunks()),
+                         [((1, 'a'), (2, 'b')), ((3, 'c'),)])
+        self.assertEqual(rows.rowcount, 3)
+        self.assertIsNone(db._stream)
+
+    def test_query_stream_iterate_rows(self):
+        db = self._makeOne(kw_args={})
+
+        items, rows = db.query_stream('SELECT * FROM table1', chunk_size=1)
+        self.assertEqual(list(rows), [(1, 'a'), (2, 'b'), (3, 'c')])
+        self.assertIsNone(db._stream)
+
+    def test_query_stream_busy(self):
+        from MySQLdb import ProgrammingError
+        db = self._makeOne(kw_args={})
+
+        items, rows = db.query_stream('SELECT * FROM table1', chunk_size=1)
+        self.assertEqual(next(iter(rows)), (1, 'a'))
+        self.assertRaises(ProgrammingError, db.query, 'SELECT 1')
+
+        rows.close()
+        self.assertIsNone(db._stream)
+        self.assertEqual(db.db.last_results.next_index, 3)
+        db.query('SELECT 1')
+        self.assertEqual(db.db.last_query, 'SELECT 1 LIMIT 1000')
+
+    def test_query_stream_single_statement(self):
+        from MySQLdb import ProgrammingError
+        db = self._makeOne(kw_args={})
+
+        self.assertRaises(ProgrammingError, db.query_stream,
+                          'SELECT * FROM table1\0SELECT * FROM table1')
+
+    def test_query_stream_closed_with_transaction(self):
+        import transaction
+        db = self._makeOne(kw_args={}, use_TM=True)
+
+        items, rows = db.query_stream('SELECT * FROM table1')
+        self.assertTrue(db._registered)
+        transaction.abort()
+        self.assertIsNone(db._stream)
+
+    def test_query_columns(self):
+        db = self._makeOne(kw_args={})
+
+        items, columns = db.query_columns('SELECT * FROM table1',
+                                          chunk_size=2)
+        self.assertEqual([x['name'] for x in items], ['c_int', 'c_varchar'])
+        self.assertEqual(db.db.last_query, 'SELECT * FROM table1 LIMIT 1000')
+        self.assertEqual(list(columns[0]), [1, 2, 3])
+        self.assertNotIsInstance(columns[0], list)
+        self.assertEqual(columns[1], ['a', 'b', 'c'])
+        self.assertIsNone(db._stream)
+
+    def test_query_columns_max_rows(self):
+        from Products.ZMySQLDA.stats import QueryStats
+        query_stats = QueryStats()
+        db = self._makeOne(kw_args={}, query_stats=query_stats)
+
+        items, columns = db.query_columns('SHOW VARIABLES', max_rows=1)
+        self.assertEqual(db.db.last_query, 'SHOW VARIABLES')
+        self.assertEqual(columns, [['var1'], ['val1']])
+        # The remaining rows are read and discarded
+        self.assertEqual(db.db.last_results.next_index, 2)
+
+        items, columns = db.query_columns('SELECT * FROM table1', max_rows=2)
+        self.assertEqual(db.db.last_query, 'SELECT * FROM table1 LIMIT 2')
+        self.assertEqual(list(columns[0]), [1, 2])
+        stats = query_stats.stats()
+        self.assertEqual(stats['queries']['count'], 2)
+        self.assertEqual(stats['rows'], 3)
+
+    def test_query_lazy_rows(self):
+        from datetime import date
+
+        from MySQLdb.constants import FIELD_TYPE
+
+        from Products.ZMySQLDA.converters import parse_datetime
+        from Products.ZMySQLDA.results import LazyRow
+        conv = {FIELD_TYPE.LONG: int, FIELD_TYPE.DATE: parse_datetime,
+                FIELD_TYPE.VAR_STRING: bytes, int: str}
+        db = self._makeOne(kw_args={'conv': conv}, lazy_rows=True)
+        self.assertEqual(db._lazy_conv[0], {FIELD_TYPE.VAR_STRING: bytes,
+                                            int: str})
+
+        items, rows = db.query('SELECT * FROM table2')
+        self.assertEqual(db.db.converter, {})
+        self.assertIsInstance(rows[0], LazyRow)
+        self.assertEqual(rows[0]._values, [b'1', b'2024-01-02', b'a'])
+        self.assertEqual(rows[0][0], 1)
+        self.assertEqual(rows[0]._values, [1, b'2024-01-02', b'a'])
+        self.assertEqual(rows, ((1, date(2024, 1, 2), b'a'),
+                                (2, None, b'b')))
+
+    def test_query_lazy_rows_unicode(self):
+        from MySQLdb.constants import FIELD_TYPE
+
+        from Products.ZMySQLDA.converters import parse_datetime
+        conv = {FIELD_TYPE.LONG: int, FIELD_TYPE.DATE: parse_datetime,
+                FIELD_TYPE.VAR_STRING: bytes}
+        db = self._makeOne(kw_args={'conv': conv, 'use_unicode': True},
+                           lazy_rows=True)
+
+        # Text columns are decoded by the connection as without lazy rows
+        items, rows = db.query('SELECT * FROM table2')
+        self.assertEqual(rows[0]._values, [b'1', b'2024-01-02', 'a'])
+        self.assertEqual(rows[0][2], 'a')
+        self.assertEqual(rows[1][0], 2)
+
+        # Also after reconnecting
+        db._forceReconnection()
+        items, rows = db.query('SELECT * FROM table2')
+        self.assertEqual(rows[0][2], 'a')
+
+    def test_query_stats(self):
+        from MySQLdb import ProgrammingError
+
+        from Products.ZMySQLDA.stats import QueryStats
+        query_stats = QueryStats()
+        db = self._makeOne(kw_args={}, query_stats=query_stats)
+
+        db.query('SELECT * FROM table1\0SELECT * FROM table1')
+        self.assertRaises(ProgrammingError, db.query,
+                          'SELECT * FROM table1\0SELECT * FROM table2')
+        stats = query_stats.stats()
+        self.assertEqual(stats['queries']['count'], 2)
+        self.assertEqual(stats['statements']['count'], 4)
+        self.assertEqual(stats['rows'], 3)
+        self.assertEqual(stats['errors'], 1)
+        errors = {x['fingerprint']: x['errors'] for x in query_stats.top()}
+        self.assertEqual(errors, {
+            'select * from table1;\nselect * from table1': 0,
+            'select * from table1;\nselect * from table2': 1})
+
+    def test_query_slow_log(self):
+        from Products.ZMySQLDA.stats import SlowQueryLog
+        slow_log = SlowQueryLog(0.0, explain=True)
+        db = self._makeOne(kw_args={}, slow_log=slow_log)
+
+        with self.assertLogs('ZMySQLDA', 'WARNING') as logged:
+            db.query('SELECT * FROM table1\0DROP TABLE table3')
+        self.assertIn('slow query took', logged.output[0])
+        entry, = slow_log.entries()
+        self.assertEqual(entry['sql'],
+                         'SELECT * FROM table1\0DROP TABLE table3')
+        self.assertEqual(entry['rows'], 0)
+        # Only statements showing a plan are explained
+        self.assertEqual(entry['plans'], [
+            ('SELECT * FROM table1',
+             [{'id': 1, 'select_type': 'SIMPLE', 'table': 'table1',
+               'type': 'ALL', 'key': None, 'rows': 3}])])
+
+        # Queries below the threshold are not logged
+        slow_log.threshold = 60.0
+        db.query('SELECT * FROM table1')
+        self.assertEqual(len(slow_log.entries()), 1)
+
+    def test_query_slow_log_replicas(self):
+        from Products.ZMySQLDA.db import DB
+        from Products.ZMySQLDA.replicas import ReplicaPool
+        from Products.ZMySQLDA.stats import SlowQueryLog
+        slow_log = SlowQueryLog(0.0, explain=True)
+        flags = {'kw_args': {'db': 'foo_db', 'host': 'primary'}}
+        replicas = ReplicaPool(DB, flags, [{'host': 'replica1'}])
+        self.addCleanup(replicas.close)
+        db = self._makeOne(replicas=replicas, slow_log=slow_log, **flags)
+
+        with self.assertLogs('ZMySQLDA', 'WARNING'):
+            db.query('SELECT * FROM table1')
+        # The plan is the one of the replica that ran the query
+        replica = replicas.hosts[0].idle[0]
+        self.assertEqual(replica.db.last_query, 'EXPLAIN SELECT * FROM table1')
+        self.assertIsNone(db.db.last_query)
+        entry, = slow_log.entries()
+        self.assertEqual(entry['plans'][0][1][0]['table'], 'table1')
+
+    def test_query_batch(self):
+        from MySQLdb.constants import CLIENT
+        db = self._makeOne(kw_args={'client_flag': CLIENT.MULTI_STATEMENTS},
+                           batch_queries=True)
+
+        items, rows = db.query('INSERT INTO table2 VALUES (1)\0'
+                               'SELECT * FROM table1')
+        self.assertEqual(db.db.last_query, 'INSERT INTO table2 VALUES (1);\n'
+                                           'SELECT * FROM table1 LIMIT 1000')
+        self.assertEqual([x['name'] for x in items], ['c_int', 'c_varchar'])
+        self.assertEqual(len(rows), 3)
+
+        # The last result wins
+        self.assertEqual(db.query('SELECT * FROM table1\0'
+                                  'DELETE FROM table2'), ((), ()))
+
+    def test_query_batch_schema_mismatch(self):
+        from MySQLdb import ProgrammingError
+        from MySQLdb.constants import CLIENT
+        db = self._makeOne(kw_args={'client_flag': CLIENT.MULTI_STATEMENTS},
+                           batch_queries=True)
+
+        self.assertRaises(ProgrammingError, db.query,
+                          'SELECT * FROM table1\0SELECT * FROM table2\0'
+                          'SELECT * FROM table1')
+        # The unread results are discarded
+        self.assertEqual(db.db.next_results, [])
+
+    def test_query_batch_sequential(self):
+        from MySQLdb.constants import CLIENT
+        db = self._makeOne(kw_args={'client_flag': CLIENT.MULTI_STATEMENTS},
+                           batch_queries=True)
+
+        # Stored procedures are called one at a time
+        db.query('CALL proc1()\0SELECT * FROM table1')
+        self.assertEqual(db.db.last_query, 'SELECT * FROM table1 LIMIT 1000')
+
+        # The client does not allow multi-statement queries
+        db = self._makeOne(kw_args={}, batch_queries=True)
+        db.query('SELECT * FROM table1\0SELECT * FROM table1')
+        self.assertEqual(db.db.last_query, 'SELECT * FROM table1 LIMIT 1000')
+
+    def test_bulk_insert(self):
+        db = self._makeOne(kw_args={})
+        # Room for the statement and two rows
+        db._max_packet = 1024 + 90
+        queries = []
+        db._query = lambda query: queries.append(query)
+
+        stats = db.bulk_insert('db.table2', ['c_int', 'c`varchar'],
+                               ((i, "it's %d" % i) for i in range(5)))
+        self.assertEqual(stats['rows'], 5)
+        self.assertEqual(stats['statements'], 3)
+        self.assertGreater(stats['rows_per_second'], 0)
+        prefix = b'INSERT INTO `db`.`table2` (`c_int`, `c``varchar`) VALUES '
+        self.assertEqual(queries, [
+            prefix + b"(0, 'it\\'s 0'),(1, 'it\\'s 1')",
+            prefix + b"(2, 'it\\'s 2'),(3, 'it\\'s 3')",
+            prefix + b"(4, 'it\\'s 4')"])
+
+    def test_bulk_insert_max_allowed_packet(self):
+        from MySQLdb import ProgrammingError
+        db = self._makeOne(kw_args={})
+
+        self.assertEqual(db._max_allowed_packet(), 1024 * 1024)
+        stats = db.bulk_insert('table2', ['c_int'], [])
+        self.assertEqual(stats['rows'], 0)
+        self.assertEqual(stats['statements'], 0)
+        self.assertRaises(ProgrammingError, db.bulk_insert, 'table2',
+                          ['c_int'], [(1, 2)])
+
+    def test_load_data(self):
+        db = self._makeOne(kw_args={'local_infile': 1})
+
+        stats = db.load_data('table2', ((i, 'a\tb') for i in range(3)),
+                             columns=['c_int', 'c_varchar'])
+        self.assertTrue(db.db.last_query.startswith(
+            "LOAD DATA LOCAL INFILE '"))
+        self.assertTrue(db.db.last_query.endswith(
+            "' INTO TABLE `table2` CHARACTER SET utf8mb4 FIELDS TERMINATED "
+            "BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+            "(`c_int`, `c_varchar`)"))
+        self.assertEqual(db.db.infile_data,
+                         b'0\ta\\tb\n1\ta\\tb\n2\ta\\tb\n')
+        self.assertEqual(stats['records'], 3)
+        self.assertEqual(stats['loaded'], 3)
+        self.assertEqual(stats['skipped'], 0)
+        self.assertEqual(stats['warnings'], 0)
+
+    def test_load_data_file(self):
+        import io
+        db = self._makeOne(kw_args={'local_infile': 1})
+
+        stats = db.load_data('table2', io.StringIO('c_int\n1\n2\n'),
+                             format='csv', duplicates='replace',
+                             ignore_lines=1)
+        self.assertIn(" REPLACE INTO TABLE `table2` CHARACTER SET utf8mb4 "
+                      "FIELDS TERMINATED BY ','", db.db.last_query)
+        self.assertTrue(db.db.last_query.endswith(' IGNORE 1 LINES'))
+        self.assertEqual(db.db.infile_data, b'c_int\n1\n2\n')
+        self.assertEqual(stats['records'], 3)
+
+    def test_load_data_errors(self):
+        from MySQLdb import NotSupportedError
+        db = self._makeOne(kw_args={})
+        self.assertRaises(NotSupportedError, db.load_data, 'table2', [])
+
+        db = self._makeOne(kw_args={'local_infile': 1})
+        self.assertRaises(ValueError, db.load_data, 'table2', [],
+                          format='xml')
+        self.assertRaises(ValueError, db.load_data, 'table2', [],
+                          duplicates='update')
+
+    def test_query_columns_single_statement(self):
+        from MySQLdb import ProgrammingError
+        db = self._makeOne(kw_args={})
+
+        self.assertRaises(ProgrammingError, db.query_columns,
+                          'SELECT * FROM table1\0SELECT * FROM table1')
+
+    def test_query_prepared(self):
+        from MySQLdb.constants import CLIENT
+        db = self._makeOne(kw_args={'client_flag': CLIENT.MULTI_STATEMENTS})
+
+        db.query_prepared('SELECT * FROM table1 WHERE c_int = ?', (1,))
+        self.assertEqual(list(db._prepared.values()), ['zmysqlda_stmt1'])
+        self.assertEqual(db.db.last_query,
+                         b'SET @zmysqlda_p0=1;'
+                         b'EXECUTE zmysqlda_stmt1 USING @zmysqlda_p0')
+        self.assertEqual(db._stats, {'prepared': 1})
+
+        db.query_prepared('SELECT * FROM table1 WHERE c_int = ?', (2,))
+        self.assertEqual(db.db.last_query,
+                         b'SET @zmysqlda_p0=2;'
+                         b'EXECUTE zmysqlda_stmt1 USING @zmysqlda_p0')
+        self.assertEqual(db._stats, {'prepared': 1, 'prepared_hits': 1})
+
+    def test_query_prepared_single_statements(self):
+        db = self._makeOne(kw_args={})
+        db.query('SELECT 1')
+        sent = []
+        query = db.db.query
+
+        def record(sql):
+            sent.append(sql)
+            return query(sql)
+
+        db.db.query = record
+        items, rows = db.query_prepared(
+            'SELECT * FROM table1 WHERE c_int = ?', (1,))
+        # Without multiple statements per query they are sent one by one
+        self.assertEqual(sent[1:], [b'SET @zmysqlda_p0=1',
+                                    b'EXECUTE zmysqlda_stmt1 USING '
+                                    b'@zmysqlda_p0'])
+
+    def test_query_prepared_no_params(self):
+        db = self._makeOne(kw_args={})
+
+        db.query_prepared('SELECT * FROM table1')
+        self.assertEqual(db.db.last_query, 'EXECUTE zmysqlda_stmt1')
+
+    def test_query_prepared_quoting(self):
+        from MySQLdb.constants import CLIENT
+        db = self._makeOne(kw_args={'client_flag': CLIENT.MULTI_STATEMENTS})
+
+        db.query_prepared('UPDATE table1 SET c_varchar = ? WHERE c_int = ?',
+                          ("it's", None))
+        self.assertEqual(db.db.last_query,
+                         b"SET @zmysqlda_p0='it\\'s', @zmysqlda_p1=NULL;"
+                         b'EXECUTE zmysqlda_stmt1 USING '
+                         b'@zmysqlda_p0, @zmysqlda_p1')
+
+    def test_query_prepared_cache_size(self):
+        db = self._makeOne(kw_args={})
+        db.prepared_cache_size = 2
+
+        db.query_prepared('SELECT 1')
+        db.query_prepared('SELECT 2')
+        db.query_prepared('SELECT 1')
+        db.query_prepared('SELECT 3')
+        self.assertEqual(list(db._prepared), ['SELECT 1', 'SELECT 3'])
+        self.assertEqual(db._stats, {'prepared': 3, 'prepared_hits': 1})
+
+    def test_query_prepared_reconnect(self):
+        db = self._makeOne(kw_args={})
+
+        db.query_prepared('SELECT 1')
+        db._forceReconnection()
+        self.assertEqual(len(db._prepared), 0)
+
+    def test_schema(self):
+        db = self._makeOne(kw_args={})
+
+        tables = db.schema()
+        self.assertEqual([x['table_name'] for x in tables],
+                         ['table1', 'view1'])
+        self.assertEqual(tables[0]['table_type'], 'table')
+        self.assertEqual(tables[0]['description'],
+                         'engine1, 5 rows, character set/collation '
+                         'my_collation')
+        self.assertEqual(tables[1]['table_type'], 'view')
+        cols = tables[0]['columns']
+        self.assertEqual([x['name'] for x in cols], ['c_int', 'c_varchar'])
+        self.assertEqual(cols[0]['type'], 'int')
+        self.assertEqual(cols[0]['scale'], 10)
+        self.assertTrue(cols[0]['primary_key'])
+        self.assertTrue(cols[1]['nullable'])
+        self.assertEqual(len(tables[1]['columns']), 1)
+
+    def test_query_result_cache(self):
+        from Products.ZMySQLDA.cache import ResultCache
+        cache = ResultCache()
+        db = self._makeOne(kw_args={}, result_cache=cache)
+
+        items, rows = db.query('SELECT * FROM table1')
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(cache.stats()['entries'], 1)
+
+        db.db.last_query = None
+        items[0]['name'] = 'changed'
+        cached_items, cached_rows = db.query('SELECT * FROM table1')
+        self.assertIsNone(db.db.last_query)
+        self.assertEqual(cached_items[0]['name'], 'c_int')
+        self.assertEqual(cached_rows, rows)
+
+        # Only the same statement with the same row limit is a hit
+        db.query('SELECT * FROM table1', max_rows=2)
+        self.assertEqual(db.db.last_query, 'SELECT * FROM table1 LIMIT 2')
+
+        db.query('UPDATE table1 SET c_int = 4')
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_query_result_cache_not_cacheable(self):
+        from Products.ZMySQLDA.cache import ResultCache
+        cache = ResultCache()
+        db = self._makeOne(kw_args={}, result_cache=cache)
+
+        db.query('SELECT * FROM table1 FOR UPDATE')
+        db.query('SHOW TABLES')
+        db.query('INSERT INTO table2 VALUES (1)\0SELECT * FROM table1')
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_query_result_cache_transaction(self):
+        from Products.ZMySQLDA.cache import ResultCache
+        cache = ResultCache()
+        db = self._makeOne(kw_args={}, result_cache=cache)
+        other_db = self._makeOne(kw_args={}, result_cache=cache)
+        db._begin()
+
+        db.query('UPDATE table1 SET c_int = 4')
+        self.assertEqual(db._written_tables, {'table1'})
+
+        # Uncommitted changes are neither served from nor put in the cache
+        db.query('SELECT * FROM table1')
+        self.assertEqual(cache.stats()['entries'], 0)
+
+        # Another connection still reads the old data, which must not
+        # survive the commit
+        other_db.query('SELECT * FROM table1')
+        self.assertEqual(cache.stats()['entries'], 1)
+        db._finish()
+        self.assertEqual(cache.stats()['entries'], 0)
+        self.assertEqual(db._written_tables, set())
+
+    def test_query_prepared_result_cache(self):
+        from Products.ZMySQLDA.cache import ResultCache
+        cache = ResultCache()
+        db = self._makeOne(kw_args={}, result_cache=cache)
+
+        db.query('SELECT * FROM table1')
+        db.query_prepared('DELETE FROM table1 WHERE c_int = ?', (1,))
+        self.assertEqual(cache.stats()['entries'], 0)
+
     def test__register(self):
         db = self._makeOne(kw_args={})
         self.assertFalse(db._registered)
@@ -412,6 +1490,61 @@ class DBTests(PatchedConnectionTestsBase):
         db.db.ping_raises = SERVER_HANDSHAKE_ERR
         self.assertRaises(ConflictError, db._begin)
 
+    def test__begin_ping_interval(self):
+        db = self._makeOne(kw_args={}, ping_interval=60)
+        db._transactions = True
+
+        # A recently used connection is not pinged
+        db.db.ping_raises = SERVER_HANDSHAKE_ERR
+        db._begin()
+        self.assertTrue(db._transaction_begun)
+        self.assertEqual(db.db.last_query, 'BEGIN')
+        self.assertEqual(db._stats, {'pings_skipped': 1})
+
+        # An idle connection is
+        db._last_used -= 120
+        self.assertRaises(ConflictError, db._begin)
+        self.assertEqual(db._stats, {'pings_skipped': 1, 'pings': 1})
+
+    def test__begin_ping_after_failed_query(self):
+        db = self._makeOne(kw_args={}, ping_interval=60)
+        self.assertFalse(db._needs_ping())
+
+        db._query_failed = True
+        self.assertTrue(db._needs_ping())
+        db._query('SELECT 1')
+        self.assertFalse(db._query_failed)
+        self.assertFalse(db._needs_ping())
+
+    def test__begin_without_ping_interval(self):
+        db = self._makeOne(kw_args={})
+        self.assertTrue(db._needs_ping())
+        db._begin()
+        self.assertEqual(db._stats, {'pings': 1})
+
+    def test__count_shared(self):
+        import threading
+        stats = {}
+        lock = threading.Lock()
+        dbs = [self._makeOne(kw_args={}, stats=stats, stats_lock=lock)
+               for i in range(4)]
+
+        def count(db):
+            for i in range(10000):
+                db._count('pings')
+
+        threads = [threading.Thread(target=count, args=(db,)) for db in dbs]
+        with lock:
+            # Counting waits for the lock
+            threads[0].start()
+            threads[0].join(0.1)
+            self.assertEqual(stats, {})
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(stats, {'pings': 40000})
+
     def test__begin_mysql_lock(self):
         db = self._makeOne(kw_args={})
         db._mysql_lock = 'foo_lock'
@@ -475,6 +1608,55 @@ class DBTests(PatchedConnectionTestsBase):
         self.assertFalse(db._transaction_begun)
         self.assertEqual(db.db.last_query, "SELECT RELEASE_LOCK('foo_lock')")
 
+    def _makeShared(self):
+        from Products.ZMySQLDA.db import DB
+        from Products.ZMySQLDA.db import DBPool
+        pool = DBPool(DB, pool_max_size=1)
+        pool._db_flags = {'kw_args': {}}
+        return pool
+
+    def test_abort_releases_to_shared_pool(self):
+        import transaction
+        pool = self._makeShared()
+        db = pool._checkout(get_ident())
+        db._register()
+        self.assertEqual(pool.pool_stats()['in_use'], 1)
+
+        transaction.abort()
+        self.assertFalse(db._registered)
+        self.assertEqual(pool.pool_stats()['in_use'], 0)
+        self.assertEqual(pool.pool_stats()['idle'], 1)
+
+    def test_failed_begin_keeps_connection_checked_out(self):
+        import transaction
+        from ZODB.POSException import ConflictError
+        pool = self._makeShared()
+        pool._db_flags = {'kw_args': {}, 'use_TM': True,
+                          'transactions': True}
+        db = pool._checkout(get_ident())
+        db.db.ping_raises = 1045
+
+        with self.assertRaises(ConflictError):
+            pool.query('SELECT * FROM table1')
+        # Still joined to the failing transaction, so not handed out
+        self.assertTrue(db._registered)
+        self.assertEqual(pool.pool_stats()['in_use'], 1)
+
+        transaction.abort()
+        self.assertFalse(db._registered)
+        self.assertEqual(pool.pool_stats()['idle'], 1)
+
+    def test_commit_releases_to_shared_pool(self):
+        import transaction
+        pool = self._makeShared()
+        db = pool._checkout(get_ident())
+        db._register()
+
+        transaction.commit()
+        self.assertFalse(db._registered)
+        self.assertEqual(pool.pool_stats()['in_use'], 0)
+        self.assertEqual(pool.pool_stats()['idle'], 1)
+
     def test_savepoint_outside_transaction(self):
         db = self._makeOne(kw_args={})
 
@@ -530,12 +1712,36 @@ class RealConnectionDBTests(unittest.TestCase):
         self.assertEqual(cols[1]['type'], 'varchar')
         self.assertEqual(cols[1]['scale'], 20)
 
+    def test_schema(self):
+        self.db = self._makeOne()
+
+        tables = self.db.schema()
+        test_table = [x for x in tables if x['table_name'] == TABLE_NAME][0]
+        self.assertEqual(test_table['table_type'], 'table')
+        self.assertTrue(test_table.get('description'))
+        cols = test_table['columns']
+        self.assertEqual([x['name'] for x in cols],
+                         [x['name'] for x in self.db.columns(TABLE_NAME)])
+
     def test_columns_badtable(self):
         self.db = self._makeOne()
 
         # Asking for columns from a bad table should just return empty results.
         self.assertFalse(self.db.columns('notexistingtable'))
 
+    def test_query_lazy_rows(self):
+        from Products.ZMySQLDA.db import DB
+        flags = DB._parse_connection_string(DB_CONN_STRING)
+        del flags['try_transactions']
+        self.db = self._makeOne()
+        items, rows = self.db.query('SELECT * FROM %s' % TABLE_NAME)
+        self.db.close()
+
+        self.db = DB(lazy_rows=True, **flags)
+        lazy_items, lazy_rows = self.db.query('SELECT * FROM %s' % TABLE_NAME)
+        self.assertEqual(lazy_items, items)
+        self.assertEqual(lazy_rows, rows)
+
     def test_query_error(self):
         from MySQLdb import ProgrammingError
         self.db = self._makeOne()
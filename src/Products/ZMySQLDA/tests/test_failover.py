@@ -0,0 +1,181 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Tests for the failover module
+"""
+import unittest
+
+from MySQLdb import OperationalError
+from MySQLdb.constants import ER
+
+from .dummy import FakeConnection
+from .dummy import FakeResults
+
+
+class FakeServers:
+    """ Fake ``MySQLdb.connect`` for a set of servers, some of them down or
+    read-only
+    """
+
+    def __init__(self):
+        self.down = set()
+        self.read_only = set()
+        self.connects = []
+
+    def __call__(self, **kw):
+        self.connects.append(kw['host'])
+        if kw['host'] in self.down:
+            raise OperationalError(2003, "Can't connect to MySQL server")
+        servers = self
+
+        class ServerConnection(FakeConnection):
+
+            def query(self, sql):
+                if self.host in servers.down:
+                    raise OperationalError(2013, 'Lost connection')
+                read_only = self.host in servers.read_only
+                if sql == 'SELECT @@read_only':
+                    self.last_results = FakeResults([(int(read_only),)])
+                    return self.last_results
+                if read_only and sql.startswith('INSERT'):
+                    raise OperationalError(ER.OPTION_PREVENTS_STATEMENT,
+                                           'The MySQL server is running '
+                                           'with the --read-only option')
+                return super().query(sql)
+
+        return ServerConnection(**kw)
+
+
+class WritersTests(unittest.TestCase):
+
+    def setUp(self):
+        from Products.ZMySQLDA.db import MySQLdb
+        self.old_connect = MySQLdb.connect
+        self.servers = MySQLdb.connect = FakeServers()
+
+    def tearDown(self):
+        from Products.ZMySQLDA.db import MySQLdb
+        MySQLdb.connect = self.old_connect
+
+    def _makeOne(self):
+        from Products.ZMySQLDA.failover import Writers
+        return Writers([{'host': 'db1', 'port': 3307},
+                        {'host': 'db2'}, {'host': 'db3', 'weight': 2}])
+
+    def test_kw_args(self):
+        writers = self._makeOne()
+        kw_args = {'db': 'foo_db', 'host': 'db1', 'port': 3307,
+                   'unix_socket': '/tmp/mysql.sock'}
+
+        self.assertEqual(writers.kw_args(kw_args),
+                         {'db': 'foo_db', 'host': 'db1', 'port': 3307})
+        self.assertEqual(writers.kw_args(kw_args, 2),
+                         {'db': 'foo_db', 'host': 'db3'})
+        self.assertEqual(writers.stats(),
+                         {'host': 'db1:3307', 'failovers': 0,
+                          'candidates': ['db1:3307', 'db2', 'db3'],
+                          'changed': None})
+
+    def test_find(self):
+        writers = self._makeOne()
+
+        self.assertFalse(writers.find({}, 0))
+        self.assertEqual(self.servers.connects, ['db1'])
+
+        self.servers.read_only.add('db1')
+        self.servers.down.add('db2')
+        with self.assertLogs('ZMySQLDA', 'WARNING'):
+            self.assertTrue(writers.find({}, 0))
+        self.assertEqual(writers.name(), 'db3')
+        self.assertEqual(writers.generation, 1)
+        stats = writers.stats()
+        self.assertEqual(stats['failovers'], 1)
+        self.assertIsNotNone(stats['changed'])
+
+        # Another thread found the new primary already
+        self.servers.connects = []
+        self.assertTrue(writers.find({}, 0))
+        self.assertEqual(self.servers.connects, [])
+
+        self.servers.read_only.add('db3')
+        with self.assertLogs('ZMySQLDA', 'ERROR'):
+            self.assertFalse(writers.find({}, 1))
+        self.assertEqual(writers.name(), 'db3')
+
+    def test_connect(self):
+        writers = self._makeOne()
+
+        connection, generation = writers.connect({'db': 'foo_db'})
+        self.assertEqual(connection.host, 'db1')
+        self.assertEqual(generation, 0)
+
+        self.servers.down.add('db1')
+        with self.assertLogs('ZMySQLDA', 'WARNING'):
+            connection, generation = writers.connect({'db': 'foo_db'})
+        self.assertEqual(connection.host, 'db2')
+        self.assertEqual(connection.db, 'foo_db')
+        self.assertEqual(generation, 1)
+
+        self.servers.down.update(('db2', 'db3'))
+        with self.assertLogs('ZMySQLDA', 'WARNING'):
+            self.assertRaises(OperationalError, writers.connect, {})
+
+    def test_db_failover(self):
+        from ZODB.POSException import ConflictError
+
+        from Products.ZMySQLDA.db import DB
+        writers = self._makeOne()
+        db = DB(kw_args={'db': 'foo_db'}, writers=writers)
+        other = DB(kw_args={'db': 'foo_db'}, writers=writers)
+        self.assertEqual(db.db.host, 'db1')
+
+        # A switchover turns the primary read-only
+        self.servers.read_only.add('db1')
+        with self.assertLogs('ZMySQLDA', 'WARNING'):
+            db.query('INSERT INTO table1 VALUES (4)')
+        self.assertEqual(db.db.host, 'db2')
+        self.assertEqual(db.db.last_query, 'INSERT INTO table1 VALUES (4)')
+
+        # Other connections follow before their next statement
+        other.query('SELECT * FROM table1')
+        self.assertEqual(other.db.host, 'db2')
+
+        # Transactions cannot be continued on another server
+        self.servers.read_only.add('db2')
+        db._transactions = True
+        with self.assertLogs('ZMySQLDA', 'WARNING'):
+            self.assertRaises(ConflictError, db.query,
+                              'INSERT INTO table1 VALUES (5)')
+        self.assertEqual(db.db.host, 'db3')
+
+        # A read-only server without another primary keeps the error
+        self.servers.read_only.add('db3')
+        with self.assertLogs('ZMySQLDA', 'WARNING'):
+            self.assertRaises(OperationalError, db.query,
+                              'INSERT INTO table1 VALUES (6)')
+        self.assertEqual(db.db.host, 'db3')
+
+    def test_db_primary_down(self):
+        from Products.ZMySQLDA.db import DB
+        writers = self._makeOne()
+        db = DB(kw_args={'db': 'foo_db'}, writers=writers)
+
+        self.servers.down.add('db1')
+        with self.assertLogs('ZMySQLDA', 'WARNING'):
+            items, rows = db.query('SELECT * FROM table1')
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(db.db.host, 'db2')
+
+
+def test_suite():
+    return unittest.TestSuite((
+        unittest.defaultTestLoader.loadTestsFromTestCase(WritersTests),))
@@ -0,0 +1,96 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Tests for the loaddata module
+"""
+import os
+import unittest
+from datetime import date
+from datetime import datetime
+from decimal import Decimal
+
+
+class LoadDataFunctionsTests(unittest.TestCase):
+
+    def test_tsv_value(self):
+        from DateTime.DateTime import DateTime
+
+        from Products.ZMySQLDA.loaddata import tsv_value
+
+        self.assertEqual(tsv_value(None, 'utf8'), b'\\N')
+        self.assertEqual(tsv_value(1, 'utf8'), b'1')
+        self.assertEqual(tsv_value(True, 'utf8'), b'1')
+        self.assertEqual(tsv_value(Decimal('1.50'), 'utf8'), b'1.50')
+        self.assertEqual(tsv_value('\xe4\tb\\c\nd', 'utf8'),
+                         b'\xc3\xa4\\tb\\\\c\\nd')
+        self.assertEqual(tsv_value('\xe4', 'latin1'), b'\xe4')
+        self.assertEqual(tsv_value(b'a\0b', 'utf8'), b'a\\0b')
+        self.assertEqual(tsv_value(date(2024, 1, 2), 'utf8'), b'2024-01-02')
+        self.assertEqual(tsv_value(datetime(2024, 1, 2, 3, 4, 5), 'utf8'),
+                         b'2024-01-02 03:04:05')
+        self.assertEqual(tsv_value(DateTime('2024-01-02 03:04:05'), 'utf8'),
+                         b'2024-01-02 03:04:05')
+
+    def test_tsv_lines(self):
+        from Products.ZMySQLDA.loaddata import tsv_lines
+
+        self.assertEqual(list(tsv_lines([(1, 'a'), (2, None)], 'utf8')),
+                         [b'1\ta\n', b'2\t\\N\n'])
+
+    def test_load_info(self):
+        from Products.ZMySQLDA.loaddata import load_info
+
+        self.assertEqual(
+            load_info(b'Records: 3  Deleted: 0  Skipped: 1  Warnings: 2'),
+            {'records': 3, 'deleted': 0, 'skipped': 1, 'warnings': 2})
+        self.assertEqual(load_info(None), {})
+
+
+class InfileFeederTests(unittest.TestCase):
+
+    def _makeOne(self, chunks):
+        from Products.ZMySQLDA.loaddata import InfileFeeder
+        return InfileFeeder(chunks)
+
+    def test_read(self):
+        with self._makeOne(iter([b'1\n', b'2\n'])) as feeder:
+            with open(feeder.path, 'rb') as infile:
+                self.assertEqual(infile.read(), b'1\n2\n')
+        self.assertIsNone(feeder.error)
+        self.assertFalse(os.path.exists(feeder.path))
+
+    def test_not_read(self):
+        def chunks():
+            while True:
+                yield b'x' * 1024
+
+        with self._makeOne(chunks()) as feeder:
+            pass
+        self.assertIsNone(feeder.error)
+        self.assertFalse(os.path.exists(feeder.path))
+
+    def test_error(self):
+        def chunks():
+            yield b'1\n'
+            raise ValueError('broken')
+
+        with self._makeOne(chunks()) as feeder:
+            with open(feeder.path, 'rb') as infile:
+                self.assertEqual(infile.read(), b'1\n')
+        self.assertIsInstance(feeder.error, ValueError)
+
+
+def test_suite():
+    return unittest.TestSuite((
+        unittest.defaultTestLoader.loadTestsFromTestCase(
+            LoadDataFunctionsTests),
+        unittest.defaultTestLoader.loadTestsFromTestCase(InfileFeederTests)))
@@ -0,0 +1,104 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Tests for the parallel module
+"""
+import threading
+import unittest
+
+from MySQLdb import OperationalError
+from MySQLdb import ProgrammingError
+
+from .base import PatchedConnectionTestsBase
+
+
+class ParallelQueriesTests(PatchedConnectionTestsBase):
+
+    def _makeOne(self, max_workers=None):
+        from Products.ZMySQLDA.db import DB
+        from Products.ZMySQLDA.parallel import ParallelQueries
+        parallel = ParallelQueries(DB, {'kw_args': {'db': 'foo_db'}},
+                                   max_workers)
+        self.addCleanup(parallel.close)
+        return parallel
+
+    def test_query(self):
+        parallel = self._makeOne()
+
+        results, errors = parallel.query(['SELECT * FROM table1',
+                                          'EXPLAIN SELECT * FROM table1',
+                                          'SELECT * FROM table2'])
+        self.assertEqual(errors, {})
+        self.assertEqual([len(rows) for items, rows in results], [3, 1, 2])
+        self.assertEqual(results[0][0][0]['name'], 'c_int')
+        self.assertEqual(results[1][0][0]['name'], 'id')
+
+        # The connections are kept for the next queries
+        self.assertTrue(parallel._idle)
+        self.assertTrue(all(db.db.autocommit for db in parallel._idle))
+        self.assertFalse(any(db._use_TM for db in parallel._idle))
+        self.assertLessEqual(len(parallel._idle), 3)
+
+    def test_query_concurrently(self):
+        parallel = self._makeOne(max_workers=3)
+        self.assertEqual(parallel.max_workers, 3)
+        barrier = threading.Barrier(3, timeout=5)
+        db_cls = parallel._db_cls
+
+        class WaitingDB(db_cls):
+            def query(self, *args):
+                # Only succeeds if all three queries run at the same time
+                barrier.wait()
+                return super().query(*args)
+
+        parallel._db_cls = WaitingDB
+        results, errors = parallel.query(['SELECT * FROM table1'] * 3)
+        self.assertEqual(errors, {})
+        self.assertEqual(len(parallel._idle), 3)
+
+    def test_query_errors(self):
+        parallel = self._makeOne()
+        db_cls = parallel._db_cls
+
+        class FailingDB(db_cls):
+            def query(self, sql_string, max_rows=1000):
+                if 'table2' in sql_string:
+                    raise OperationalError(1146, "Table 'table2' doesn't "
+                                                 "exist")
+                return super().query(sql_string, max_rows)
+
+        parallel._db_cls = FailingDB
+        results, errors = parallel.query(['SELECT * FROM table2',
+                                          'SELECT * FROM table1',
+                                          'DELETE FROM table1'])
+        self.assertIsNone(results[0])
+        self.assertEqual(len(results[1][1]), 3)
+        self.assertIsNone(results[2])
+        self.assertEqual(sorted(errors), [0, 2])
+        self.assertIsInstance(errors[0], OperationalError)
+        self.assertIsInstance(errors[2], ProgrammingError)
+
+    def test_close(self):
+        parallel = self._makeOne()
+        parallel.query(['SELECT * FROM table1'])
+
+        parallel.close()
+        self.assertEqual(parallel._idle, [])
+        self.assertIsNone(parallel._executor)
+        results, errors = parallel.query(['SELECT * FROM table1'])
+        self.assertEqual(len(results[0][1]), 3)
+
+
+def test_suite():
+    return unittest.TestSuite((
+        unittest.defaultTestLoader.loadTestsFromTestCase(
+            ParallelQueriesTests),))
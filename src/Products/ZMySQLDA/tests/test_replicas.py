@@ -0,0 +1,195 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Tests for the replicas module
+"""
+import threading
+import unittest
+
+from .base import PatchedConnectionTestsBase
+
+
+class ReplicaFunctionsTests(unittest.TestCase):
+
+    def test_parse_hosts(self):
+        from Products.ZMySQLDA.replicas import parse_hosts
+
+        self.assertEqual(parse_hosts('replica1,replica2:3307=3,'),
+                         [{'host': 'replica1'},
+                          {'host': 'replica2', 'port': 3307, 'weight': 3}])
+        self.assertEqual(parse_hosts(''), [])
+
+
+class ReplicaPoolTests(PatchedConnectionTestsBase):
+
+    def _makeOne(self, hosts, **kw):
+        from Products.ZMySQLDA.db import DB
+        from Products.ZMySQLDA.replicas import ReplicaPool
+        return ReplicaPool(DB, {'kw_args': {'db': 'foo_db'}}, hosts, **kw)
+
+    def _choices(self, pool, count):
+        return [pool._choose().name for i in range(count)]
+
+    def test_unknown_strategy(self):
+        self.assertRaises(ValueError, self._makeOne, [{'host': 'replica1'}],
+                          strategy='random')
+
+    def test_weighted_round_robin(self):
+        pool = self._makeOne([{'host': 'replica1'},
+                              {'host': 'replica2', 'weight': 3}])
+
+        self.assertEqual(self._choices(pool, 8),
+                         ['replica2', 'replica1', 'replica2', 'replica2'] * 2)
+
+    def test_least_outstanding(self):
+        pool = self._makeOne([{'host': 'replica1'},
+                              {'host': 'replica2', 'weight': 2}],
+                             strategy='least_outstanding')
+        replica1, replica2 = pool.hosts
+
+        self.assertEqual(set(self._choices(pool, 2)),
+                         {'replica1', 'replica2'})
+        replica1.outstanding = 1
+        replica2.outstanding = 1
+        self.assertEqual(self._choices(pool, 2), ['replica2', 'replica2'])
+        replica2.outstanding = 3
+        self.assertEqual(self._choices(pool, 1), ['replica1'])
+
+    def test_check_hosts(self):
+        pool = self._makeOne([{'host': 'replica1'}, {'host': 'replica2'}],
+                             max_lag=10)
+        lags = {'replica1': 3, 'replica2': 30}
+        pool._replication_lag = lambda host: lags[host.name]
+
+        with pool.connection() as db:
+            pass
+        self.assertEqual(len(pool.hosts[0].idle), 1)
+        with self.assertLogs('ZMySQLDA', 'WARNING'):
+            pool.check_hosts()
+        stats = pool.stats()
+        self.assertEqual([x['lag'] for x in stats], [3, 30])
+        self.assertEqual([x['healthy'] for x in stats], [True, False])
+        self.assertEqual(stats[1]['ejections'], 1)
+        self.assertEqual(self._choices(pool, 2), ['replica1', 'replica1'])
+
+        # A lagging replica is back once it has caught up
+        lags['replica2'] = 5
+        pool.check_hosts()
+        self.assertTrue(pool.stats()[1]['healthy'])
+
+        # Stopped replication or failed checks take it out of rotation
+        lags['replica1'] = None
+        pool._replication_lag = lambda host: lags[host.name]
+        with self.assertLogs('ZMySQLDA', 'WARNING'):
+            pool.check_hosts()
+        self.assertFalse(pool.stats()[0]['healthy'])
+        self.assertEqual(pool.hosts[0].idle, [])
+
+        lags['replica2'] = None
+        with self.assertLogs('ZMySQLDA', 'WARNING'):
+            pool.check_hosts()
+        with pool.connection() as db:
+            self.assertIsNone(db)
+
+    def test_connection_lost(self):
+        from MySQLdb import OperationalError
+        pool = self._makeOne([{'host': 'replica1'}, {'host': 'replica2'}])
+
+        # Errors reported by the server keep the connection
+        with self.assertRaises(OperationalError):
+            with pool.connection() as db:
+                raise OperationalError(1205, 'Lock wait timeout exceeded')
+        self.assertEqual(pool.hosts[0].idle, [db])
+        self.assertTrue(pool.hosts[0].healthy)
+
+        # A lost connection, for example after a failed reconnect, is
+        # closed and takes the replica out of rotation
+        pool._choose = lambda: pool.hosts[0]
+        with self.assertLogs('ZMySQLDA', 'WARNING'):
+            with self.assertRaises(OperationalError):
+                with pool.connection() as db:
+                    raise OperationalError(2003, "Can't connect")
+        self.assertIsNone(db.db)
+        stats = pool.stats()[0]
+        self.assertEqual(stats['idle'], 0)
+        self.assertEqual(stats['failures'], 1)
+        self.assertFalse(stats['healthy'])
+        self.assertEqual(stats['outstanding'], 0)
+
+    def test_replication_lag(self):
+        from MySQLdb import ProgrammingError
+        pool = self._makeOne([{'host': 'replica1'}])
+        host = pool.hosts[0]
+
+        self.assertEqual(pool._replication_lag(host), 4)
+        self.assertEqual(host.check_db.db.host, 'replica1')
+        self.assertTrue(host.check_db.db.autocommit)
+
+        # Older servers only know SHOW SLAVE STATUS
+        fake = host.check_db.db
+        fake_query = fake.query
+
+        def query(sql):
+            if sql == 'SHOW REPLICA STATUS':
+                raise ProgrammingError(1064, 'syntax error')
+            return fake_query(sql)
+
+        fake.query = query
+        with self.assertLogs('ZMySQLDA', 'WARNING'):
+            self.assertIsNone(pool._replication_lag(host))
+        self.assertEqual(host.status_query, 'SHOW SLAVE STATUS')
+
+    def test_start(self):
+        pool = self._makeOne([{'host': 'replica1'}])
+        checked = threading.Event()
+        pool._replication_lag = lambda host: checked.set() or 0
+
+        pool.start()
+        self.assertTrue(checked.wait(5))
+        pool.stop()
+        pool._thread.join(5)
+        self.assertFalse(pool._thread.is_alive())
+        self.assertEqual(pool.stats()[0]['lag'], 0)
+
+    def test_close(self):
+        pool = self._makeOne([{'host': 'replica1'}])
+        checked = threading.Event()
+        replication_lag = pool._replication_lag
+
+        def check(host):
+            lag = replication_lag(host)
+            checked.set()
+            return lag
+
+        pool._replication_lag = check
+
+        pool.start()
+        self.assertTrue(checked.wait(5))
+        with pool.connection() as db:
+            pass
+        thread = pool._thread
+        check_db = pool.hosts[0].check_db
+
+        pool.close()
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(pool._thread)
+        self.assertIsNone(pool.hosts[0].check_db)
+        self.assertIsNone(check_db.db)
+        self.assertIsNone(db.db)
+        self.assertEqual(pool.hosts[0].idle, [])
+
+
+def test_suite():
+    return unittest.TestSuite((
+        unittest.defaultTestLoader.loadTestsFromTestCase(
+            ReplicaFunctionsTests),
+        unittest.defaultTestLoader.loadTestsFromTestCase(ReplicaPoolTests)))
@@ -0,0 +1,162 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Tests for the results module
+"""
+import unittest
+from array import array
+from decimal import Decimal
+
+
+class ColumnBuilderTests(unittest.TestCase):
+
+    def _makeOne(self, type_code):
+        from Products.ZMySQLDA.results import ColumnBuilder
+        return ColumnBuilder(type_code)
+
+    def test_integers(self):
+        column = self._makeOne('i')
+        column.extend([1, 2])
+        column.extend([3])
+        self.assertEqual(column.values, array('q', [1, 2, 3]))
+        self.assertEqual(list(column.result()), [1, 2, 3])
+
+    def test_floats(self):
+        column = self._makeOne('n')
+        column.extend([1.5, 2.5])
+        self.assertEqual(column.values, array('d', [1.5, 2.5]))
+
+    def test_fallback_to_list(self):
+        column = self._makeOne('i')
+        column.extend([1, 2])
+        column.extend([3, None, 4])
+        self.assertEqual(column.result(), [1, 2, 3, None, 4])
+
+        column = self._makeOne('l')
+        column.extend([2 ** 64 - 1])
+        self.assertEqual(column.result(), [2 ** 64 - 1])
+
+        column = self._makeOne('n')
+        column.extend([1.5])
+        column.extend([Decimal('2.5')])
+        self.assertEqual(column.result(), [1.5, Decimal('2.5')])
+
+    def test_other_types(self):
+        column = self._makeOne('t')
+        column.extend(['a', 'b'])
+        self.assertEqual(column.result(), ['a', 'b'])
+
+    def test_numpy(self):
+        from Products.ZMySQLDA import results
+        if results.numpy is None:
+            self.skipTest('NumPy is not installed')
+
+        column = self._makeOne('i')
+        column.extend([1, 2, 3])
+        self.assertIsInstance(column.result(), results.numpy.ndarray)
+        self.assertEqual(column.result().sum(), 6)
+
+
+class LazyRowTests(unittest.TestCase):
+
+    def _makeRows(self, rows):
+        from Products.ZMySQLDA.results import lazy_rows
+        calls = []
+
+        def convert(value):
+            calls.append(value)
+            return int(value)
+
+        return lazy_rows(rows, [convert, None]), calls
+
+    def test_split_converters(self):
+        from Products.ZMySQLDA.results import split_converters
+
+        conv = {1: int, 2: bytes, 3: [(1, str)], 4: None, int: str}
+        fetch_conv, deferred = split_converters(conv)
+        self.assertEqual(fetch_conv, {2: bytes, 3: [(1, str)], 4: None,
+                                      int: str})
+        self.assertEqual(list(deferred), [1])
+        self.assertEqual(deferred[1](b'12'), 12)
+
+    def test_convert_on_access(self):
+        rows, calls = self._makeRows(((b'1', b'a'), (b'2', b'b')))
+        row = rows[0]
+
+        self.assertEqual(calls, [])
+        self.assertEqual(row[1], b'a')
+        self.assertEqual(calls, [])
+        self.assertEqual(row[0], 1)
+        self.assertEqual(row[-2], 1)
+        self.assertEqual(calls, [b'1'])
+        self.assertEqual(rows[1][0], 2)
+        self.assertEqual(calls, [b'1', b'2'])
+
+    def test_convert_shared(self):
+        import threading
+        import time
+
+        from Products.ZMySQLDA.results import lazy_rows
+        calls = []
+
+        def convert(value):
+            calls.append(value)
+            time.sleep(0.01)
+            # Like ``fast_DateTime_or_None``, fails for converted values
+            return int(value.decode())
+
+        rows = lazy_rows(((b'1', b'2'),), [convert, convert])
+        values = []
+        threads = [threading.Thread(target=lambda: values.append(tuple(
+            rows[0]))) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Each value is converted once, although threads read it at once
+        self.assertEqual(sorted(calls), [b'1', b'2'])
+        self.assertEqual(values, [(1, 2)] * 8)
+
+    def test_sequence(self):
+        import pickle
+        rows, calls = self._makeRows(((b'1', b'a'), (None, b'b')))
+
+        self.assertEqual(len(rows[0]), 2)
+        self.assertEqual(tuple(rows[0]), (1, b'a'))
+        self.assertEqual(rows[0][:1], (1,))
+        self.assertEqual(rows, ((1, b'a'), (None, b'b')))
+        self.assertEqual(hash(rows[0]), hash((1, b'a')))
+        self.assertEqual(repr(rows[1]), "(None, b'b')")
+        self.assertEqual(pickle.loads(pickle.dumps(rows[0])), (1, b'a'))
+        self.assertRaises(IndexError, rows[0].__getitem__, 2)
+        self.assertEqual(calls, [b'1'])
+
+    def test_record(self):
+        from Shared.DC.ZRDB.Results import Results
+        rows, calls = self._makeRows(((b'1', b'a'), (b'2', b'b')))
+
+        results = Results(([{'name': 'c_int'}, {'name': 'c_char'}], rows))
+        self.assertEqual(results[1].c_int, 2)
+        self.assertEqual(calls, [b'2'])
+        self.assertEqual(results.tuples(), [(1, b'a'), (2, b'b')])
+
+    def test_no_converters(self):
+        from Products.ZMySQLDA.results import lazy_rows
+        rows = ((b'1', b'a'),)
+
+        self.assertIs(lazy_rows(rows, [None, None]), rows)
+
+
+def test_suite():
+    return unittest.TestSuite((
+        unittest.defaultTestLoader.loadTestsFromTestCase(ColumnBuilderTests),
+        unittest.defaultTestLoader.loadTestsFromTestCase(LazyRowTests)))
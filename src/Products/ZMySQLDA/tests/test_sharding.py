@@ -0,0 +1,252 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Tests for the sharding module
+"""
+import unittest
+from _thread import get_ident
+
+from MySQLdb import ProgrammingError
+
+from .base import PatchedConnectionTestsBase
+
+
+SHARDS = """
+# name connection string
+shard1 db1
+shard2 db2
+
+shard3 db3
+"""
+
+
+class ShardMapTests(unittest.TestCase):
+
+    def test_hint_key(self):
+        from Products.ZMySQLDA.sharding import hint_key
+
+        self.assertEqual(hint_key('SELECT 1'), (None, 'SELECT 1'))
+        key, sql = hint_key('/* shard_key: 42 */ SELECT * FROM t')
+        self.assertEqual(key, '42')
+        self.assertEqual(sql.strip(), 'SELECT * FROM t')
+        key, sql = hint_key("SELECT 1 /*shard_key='o''brien'*/")
+        self.assertEqual(key, "o'brien")
+        self.assertEqual(sql.strip(), 'SELECT 1')
+        # Only the comment naming the key is removed
+        key, sql = hint_key("/* shard_key: 1 */ SELECT '/* shard_key: 2 */'")
+        self.assertEqual(key, '1')
+        self.assertEqual(sql.strip(), "SELECT '/* shard_key: 2 */'")
+
+    def test_hash_map(self):
+        from Products.ZMySQLDA.sharding import HashShardMap
+
+        shard_map = HashShardMap(['a', 'b', 'c'])
+        names = [shard_map(key) for key in range(300)]
+        # Stable across processes and spread over all shards
+        self.assertEqual(names[:3], [shard_map(0), shard_map(1),
+                                     shard_map(2)])
+        self.assertEqual(shard_map(7), shard_map('7'))
+        for name in 'abc':
+            self.assertGreater(names.count(name), 50)
+
+        # The order of the shards does not matter
+        reordered = HashShardMap(['c', 'a', 'b'])
+        self.assertEqual([reordered(key) for key in range(300)], names)
+
+        # A new shard only takes keys over from the others
+        grown = HashShardMap(['a', 'b', 'c', 'd'])
+        moved = [key for key in range(300) if grown(key) != names[key]]
+        self.assertGreater(len(moved), 40)
+        self.assertEqual({grown(key) for key in moved}, {'d'})
+
+    def test_range_map(self):
+        from Products.ZMySQLDA.sharding import RangeShardMap
+
+        shard_map = RangeShardMap(['a', 'b'], '1 a\n1000 b\n')
+        self.assertEqual(shard_map(1), 'a')
+        self.assertEqual(shard_map('999'), 'a')
+        self.assertEqual(shard_map(1000), 'b')
+        self.assertEqual(shard_map(10 ** 9), 'b')
+        with self.assertRaises(ValueError):
+            shard_map(0)
+
+        shard_map = RangeShardMap(['a', 'b'], 'a a\nm b')
+        self.assertEqual(shard_map('foo'), 'a')
+        self.assertEqual(shard_map('zoo'), 'b')
+
+        with self.assertRaises(ValueError):
+            RangeShardMap(['a', 'b'], '1 c')
+        with self.assertRaises(ValueError):
+            RangeShardMap(['a', 'b'], '')
+
+
+class ShardedPoolTests(PatchedConnectionTestsBase):
+
+    def _makeOne(self, shard_map='hash', shard_ranges='', **kw):
+        from Products.ZMySQLDA.db import DB
+        from Products.ZMySQLDA.db import DBPool
+        from Products.ZMySQLDA.sharding import ShardedPool
+
+        pool = ShardedPool(lambda: DBPool(DB, **kw), shard_map, shard_ranges)
+        pool = pool(SHARDS)
+        self.addCleanup(pool.close)
+        return pool
+
+    def _last_query(self, pool, name):
+        db = pool.shards[name]._db_pool.get(get_ident())
+        return db.db.last_query if db is not None else None
+
+    def test_connect(self):
+        pool = self._makeOne()
+        self.assertEqual(list(pool.shards), ['shard1', 'shard2', 'shard3'])
+        self.assertEqual([stats['database'] for stats in pool.shard_stats()],
+                         ['db1', 'db2', 'db3'])
+        self.assertTrue(pool.connected_timestamp)
+        self.assertEqual(pool.connection, SHARDS)
+
+        from Products.ZMySQLDA.sharding import ShardedPool
+        with self.assertRaises(ValueError):
+            ShardedPool(None, 'modulo')
+        with self.assertRaises(ValueError):
+            ShardedPool(None)('# no shards')
+
+    def test_query_routed(self):
+        pool = self._makeOne('range', '0 shard1\n100 shard2\n200 shard3')
+        self.assertEqual(pool.shard_name(150), 'shard2')
+
+        items, rows = pool.query(
+            'SELECT * FROM table1 /* shard_key: 150 */')
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(self._last_query(pool, 'shard2'),
+                         'SELECT * FROM table1 LIMIT 1000')
+        self.assertIsNone(self._last_query(pool, 'shard1'))
+
+        pool.query('SELECT * FROM table1', shard_key=5)
+        self.assertIsNotNone(self._last_query(pool, 'shard1'))
+        self.assertIsNone(self._last_query(pool, 'shard3'))
+
+        # Writes run within the transaction on their shard only
+        pool.query("/* shard_key: '250' */ UPDATE table1 SET c_int = 1")
+        self.assertEqual(self._last_query(pool, 'shard3'),
+                         'UPDATE table1 SET c_int = 1')
+
+    def test_query_without_key(self):
+        pool = self._makeOne()
+
+        with self.assertRaises(ProgrammingError):
+            pool.query('SELECT * FROM table1')
+        with self.assertRaises(ProgrammingError):
+            pool.query('UPDATE table1 SET c_int = 1')
+        for name in pool.shards:
+            self.assertIsNone(self._last_query(pool, name))
+        self.assertEqual(pool.query_stats()['queries']['count'], 0)
+
+    def test_query_shards(self):
+        pool = self._makeOne()
+        db_cls = pool.shards['shard2']._parallel._db_cls
+
+        class FailingDB(db_cls):
+            def query(self, sql_string, max_rows=1000):
+                raise ProgrammingError('Table missing')
+
+        pool.shards['shard2']._parallel._db_cls = FailingDB
+        results, errors = pool.query_shards('SELECT * FROM table1')
+        self.assertEqual(sorted(results), ['shard1', 'shard3'])
+        self.assertEqual(list(errors), ['shard2'])
+        self.assertEqual(results['shard1'][0][0]['name'], 'c_int')
+        self.assertEqual(len(results['shard1'][1]), 3)
+
+        # Queries run outside of the transaction
+        self.assertIsNone(self._last_query(pool, 'shard1'))
+
+    def test_query_parallel(self):
+        pool = self._makeOne()
+        results, errors = pool.query_parallel([
+            'SELECT * FROM table1 /* shard_key: 1 */',
+            'SELECT * FROM table1',
+            'SELECT * FROM table2 /* shard_key: 2 */'])
+        self.assertEqual(len(results[0][1]), 3)
+        self.assertIsNone(results[1])
+        self.assertIsInstance(errors[1], ProgrammingError)
+        self.assertEqual(len(results[2][1]), 2)
+
+    def test_keyed_methods(self):
+        pool = self._makeOne()
+        items, rows = pool.query_stream(
+            'SELECT * FROM table1 /* shard_key: 1 */')
+        self.assertEqual(len(list(rows)), 3)
+        items, columns = pool.query_columns('SELECT * FROM table1',
+                                            shard_key=1)
+        self.assertEqual(list(columns[0]), [1, 2, 3])
+
+        with self.assertRaises(ProgrammingError):
+            pool.query_columns('SELECT * FROM table1')
+        with self.assertRaises(ProgrammingError):
+            pool.bulk_insert('table1', ['c_int'], [(1,)])
+
+    def test_shared_statistics(self):
+        pool = self._makeOne(slow_query_time=0.001)
+        stats = {id(shard._query_stats) for shard in pool.shards.values()}
+        self.assertEqual(len(stats), 1)
+        logs = {id(shard._slow_log) for shard in pool.shards.values()}
+        self.assertEqual(len(logs), 1)
+        self.assertEqual(sorted(pool.pool_stats()),
+                         ['shard1', 'shard2', 'shard3'])
+
+
+class ShardedConnectionTests(PatchedConnectionTestsBase):
+
+    def test_zope_factory(self):
+        from OFS.Folder import Folder
+
+        from Products.ZMySQLDA.DA import manage_addZMySQLShardedConnection
+        from Products.ZMySQLDA.sharding import ShardedPool
+
+        container = Folder('root')
+        manage_addZMySQLShardedConnection(container, 'conn_id', 'Title',
+                                          SHARDS, check=True,
+                                          charset='utf8mb4',
+                                          shard_map='range',
+                                          shard_ranges='0 shard1\n'
+                                                       '10 shard2\n'
+                                                       '20 shard3')
+        self.conn = container.conn_id
+        self.assertTrue(self.conn.sharded)
+        self.assertEqual(self.conn.charset, 'utf8mb4')
+        self.assertEqual(self.conn.shard_map, 'range')
+        self.assertIsInstance(self.conn._v_database_connection, ShardedPool)
+        self.assertEqual(self.conn.shard_name(15), 'shard2')
+
+        items, rows = self.conn.query_shard('SELECT * FROM table1', 25)
+        self.assertEqual(len(rows), 3)
+        results, errors = self.conn.query_shards('SELECT * FROM table2')
+        self.assertEqual(len(results), 3)
+        self.assertEqual(errors, {})
+
+    def test_manage_editSharding(self):
+        from Products.ZMySQLDA.DA import ShardedConnection
+
+        self.conn = ShardedConnection('conn_id', 'Title', SHARDS, True)
+        self.conn._pool_key = lambda: ('conn_id',)
+        self.conn.connect(self.conn.connection_string)
+        old = self.conn._v_database_connection
+        self.assertEqual(old.shard_map, 'hash')
+
+        self.conn.manage_editSharding('range', '0 shard1\n50 shard3')
+        self.assertEqual(self.conn.shard_ranges, '0 shard1\n50 shard3')
+        new = self.conn._v_database_connection
+        self.assertIsNot(new, old)
+        self.assertEqual(new.shard_name(60), 'shard3')
+
+        with self.assertRaises(ValueError):
+            self.conn.manage_editSharding('modulo')
+        self.assertEqual(self.conn.shard_map, 'range')
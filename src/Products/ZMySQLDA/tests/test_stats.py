@@ -0,0 +1,184 @@
+##############################################################################
+#
+# Copyright (c) 2001 Zope Foundation and Contributors.
+#
+# This software is subject to the provisions of the Zope Public License,
+# Version 2.1 (ZPL).  A copy of the ZPL should accompany this distribution.
+# THIS SOFTWARE IS PROVIDED "AS IS" AND ANY AND ALL EXPRESS OR IMPLIED
+# WARRANTIES ARE DISCLAIMED, INCLUDING, BUT NOT LIMITED TO, THE IMPLIED
+# WARRANTIES OF TITLE, MERCHANTABILITY, AGAINST INFRINGEMENT, AND FITNESS
+# FOR A PARTICULAR PURPOSE.
+#
+##############################################################################
+""" Tests for the stats module
+"""
+import unittest
+
+
+class HistogramTests(unittest.TestCase):
+
+    def _makeOne(self):
+        from Products.ZMySQLDA.stats import Histogram
+        return Histogram()
+
+    def test_empty(self):
+        stats = self._makeOne().stats()
+        self.assertEqual(stats['count'], 0)
+        self.assertEqual(stats['mean'], 0.0)
+        self.assertEqual(stats['p95'], 0.0)
+        self.assertEqual(stats['buckets'][-1], (None, 0))
+
+    def test_add(self):
+        histogram = self._makeOne()
+        for seconds in [0.0005] * 90 + [0.03] * 9 + [20.0]:
+            histogram.add(seconds)
+
+        stats = histogram.stats()
+        self.assertEqual(stats['count'], 100)
+        self.assertAlmostEqual(stats['total'], 20.315)
+        self.assertEqual(stats['max'], 20.0)
+        self.assertEqual(stats['p50'], 0.001)
+        self.assertEqual(stats['p95'], 0.05)
+        self.assertEqual(stats['p99'], 0.05)
+        self.assertEqual(histogram.percentile(1.0), 20.0)
+        buckets = dict(stats['buckets'])
+        self.assertEqual(buckets[0.001], 90)
+        self.assertEqual(buckets[0.05], 9)
+        self.assertEqual(buckets[None], 1)
+
+    def test_bucket_bounds_inclusive(self):
+        histogram = self._makeOne()
+        histogram.add(0.001)
+        self.assertEqual(dict(histogram.stats()['buckets'])[0.001], 1)
+
+
+class QueryStatsTests(unittest.TestCase):
+
+    def test_record(self):
+        from Products.ZMySQLDA.stats import QueryStats
+        query_stats = QueryStats()
+        query_stats.record_query(0.01, 3, 30)
+        query_stats.record_statement(0.005)
+        query_stats.record_error(0.002)
+
+        stats = query_stats.stats()
+        self.assertEqual(stats['queries']['count'], 2)
+        self.assertEqual(stats['statements']['count'], 1)
+        self.assertEqual(stats['rows'], 3)
+        self.assertEqual(stats['bytes'], 30)
+        self.assertEqual(stats['errors'], 1)
+
+        query_stats.reset()
+        stats = query_stats.stats()
+        self.assertEqual(stats['queries']['count'], 0)
+        self.assertEqual(stats['errors'], 0)
+
+    def test_result_bytes(self):
+        from Products.ZMySQLDA.results import LazyRow
+        from Products.ZMySQLDA.stats import result_bytes
+
+        self.assertEqual(result_bytes(()), 0)
+        self.assertEqual(result_bytes([(1, 'abc', None)]), 11)
+        self.assertEqual(result_bytes([(b'ab',)] * 100), 200)
+        # Lazy rows are measured without converting them
+        row = LazyRow([b'12', b'x'], (int, None), 1, None)
+        self.assertEqual(result_bytes([row]), 3)
+        self.assertEqual(row._pending, 1)
+
+    def test_column_bytes(self):
+        from Products.ZMySQLDA.stats import column_bytes
+
+        self.assertEqual(column_bytes(()), 0)
+        self.assertEqual(column_bytes([[], []]), 0)
+        self.assertEqual(column_bytes([[1], ['abc'], [None]]), 11)
+        self.assertEqual(column_bytes([[b'ab'] * 100]), 200)
+
+    def test_top(self):
+        from Products.ZMySQLDA.stats import QueryStats
+        query_stats = QueryStats()
+        query_stats.record_query(0.01, 1, 10, 'SELECT * FROM t WHERE id = 1')
+        query_stats.record_query(0.03, 1, 10, 'SELECT * FROM t WHERE id = 2')
+        query_stats.record_query(0.001, 5, 10, 'SELECT * FROM u')
+        query_stats.record_error(0.002, 'SELECT * FROM v')
+
+        top = query_stats.top()
+        self.assertEqual([x['fingerprint'] for x in top],
+                         ['select * from t where id = ?',
+                          'select * from v', 'select * from u'])
+        self.assertEqual(top[0]['count'], 2)
+        self.assertAlmostEqual(top[0]['total'], 0.04)
+        self.assertAlmostEqual(top[0]['mean'], 0.02)
+        self.assertEqual(top[0]['p95'], 0.03)
+        self.assertEqual(top[0]['sample'], 'SELECT * FROM t WHERE id = 1')
+        self.assertEqual(top[1]['errors'], 1)
+        self.assertEqual(query_stats.top(1, 'rows')[0]['fingerprint'],
+                         'select * from u')
+        self.assertRaises(ValueError, query_stats.top, order='sample')
+
+    def test_top_bounded(self):
+        from Products.ZMySQLDA.stats import QueryStats
+        query_stats = QueryStats(max_fingerprints=20)
+        for i in range(21):
+            query_stats.record_query(i / 1000, 1, 10, 'SELECT * FROM t%d' % i)
+
+        stats = query_stats.stats()
+        self.assertEqual(stats['fingerprints'], 19)
+        self.assertEqual(stats['dropped_fingerprints'], 2)
+        self.assertEqual(query_stats.top(1)[0]['fingerprint'],
+                         'select * from t20')
+
+
+class FingerprintTests(unittest.TestCase):
+
+    def test_fingerprint(self):
+        from Products.ZMySQLDA.stats import fingerprint
+
+        self.assertEqual(
+            fingerprint("SELECT  * FROM t1\nWHERE a = 1 AND b IN (1, 2,3) "
+                        "AND c = 'it''s' AND d = \"x\\\"y\" -- comment"),
+            'select * from t1 where a = ? and b in (?+) and c = ? '
+            'and d = ?')
+        self.assertEqual(
+            fingerprint("INSERT INTO `t 2` (a, b) VALUES (1, 'a'), "
+                        "(-2.5e3, NULL),(0x1F, x'1F')"),
+            'insert into `t 2` (a, b) values (?+)')
+        self.assertEqual(fingerprint("SELECT '#1' /* hint */ FROM t3 # x"),
+                         'select ? from t3')
+        self.assertEqual(fingerprint('UPDATE t SET a = a + .5\0\0'
+                                     'SELECT c2 FROM t LIMIT 10'),
+                         'update t set a = a + ?;\nselect c2 from t limit ?')
+
+    def test_query_fingerprint(self):
+        from Products.ZMySQLDA.stats import fingerprint
+        from Products.ZMySQLDA.stats import query_fingerprint
+
+        sql = 'SELECT * FROM t WHERE id = 5'
+        self.assertEqual(query_fingerprint(sql), fingerprint(sql))
+        sql = 'SELECT * FROM t WHERE id IN (%s)' % ', '.join(['1'] * 1000)
+        self.assertEqual(query_fingerprint(sql),
+                         'select * from t where id in (?+)')
+
+
+class SlowQueryLogTests(unittest.TestCase):
+
+    def test_bounded(self):
+        from Products.ZMySQLDA.stats import SlowQueryLog
+        slow_log = SlowQueryLog(1.0, size=2)
+        for i in range(3):
+            slow_log.add('SELECT %d' % i, 1.5, i)
+
+        entries = slow_log.entries()
+        self.assertEqual([x['sql'] for x in entries], ['SELECT 2', 'SELECT 1'])
+        self.assertEqual(entries[0]['thread'], 'MainThread')
+        self.assertIsNone(entries[0]['plans'])
+
+        slow_log.clear()
+        self.assertEqual(slow_log.entries(), [])
+
+
+def test_suite():
+    return unittest.TestSuite((
+        unittest.defaultTestLoader.loadTestsFromTestCase(HistogramTests),
+        unittest.defaultTestLoader.loadTestsFromTestCase(QueryStatsTests),
+        unittest.defaultTestLoader.loadTestsFromTestCase(FingerprintTests),
+        unittest.defaultTestLoader.loadTestsFromTestCase(SlowQueryLogTests)))
@@ -57,6 +57,14 @@ class TableBrowserTests(BrowserTestsBase):
         self.assertEqual(cols[1].table_name, 'table1')
         self.assertEqual(cols[1].icon, 'icon2')
 
+    def test_tpValues_prefetched(self):
+        browser = self._makeOne()
+        browser._d = dict(TABLE, columns=[{'name': 'col3', 'icon': 'icon3',
+                                           'description': 'desc3'}])
+        cols = browser.tpValues()
+        self.assertEqual(cols[0].tpId(), 'col3')
+        self.assertEqual(cols[0].icon, 'icon3')
+
     def test_tpId(self):
         browser = self._makeOne()
         self.assertEqual(browser.tpId(), 'table1')
@@ -52,7 +52,10 @@ class TableBrowser(BrowserBase, Implicit):
     def tpValues_(self):
         r = []
         tname = self._d['table_name']
-        for d in self._c.columns(tname):
+        columns = self._d.get('columns')
+        if columns is None:
+            columns = self._c.columns(tname)
+        for d in columns:
             b = ColumnBrowser()
             b._d = d
             b.icon = d['icon']